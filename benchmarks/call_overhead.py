@@ -0,0 +1,55 @@
+"""Per-call overhead of LazyFuncs over calling the wrapped function directly, for
+the scalar calls made millions of times by `scipy.integrate.quad`.
+
+Cases are timed in interleaved rounds, so that drifts in the speed of the
+machine affect them alike. "leaf, no fast path" is a plain leaf whose fast path
+is cleared, so that it is called like leaves with kwargs or a cache; the
+difference with "leaf" is the time the fast path saves.
+
+Run with `python benchmarks/call_overhead.py`.
+"""
+
+import math
+import timeit
+
+from lazyfunc import LazyFunc
+
+
+def spectrum(energy, *, temperature=300.0):
+    return math.exp(-energy / temperature)
+
+
+def best(funcs, number, repeat=15):
+    """Return the shortest time per call in seconds over repeat rounds, in which
+    each of funcs is timed in turn."""
+    times = {name: [] for name in funcs}
+    for _ in range(repeat):
+        for name, func in funcs.items():
+            times[name].append(timeit.timeit(lambda: func(1e3), number=number))
+    return {name: min(runs) / number for name, runs in times.items()}
+
+
+def main(number=100_000):
+    leaf = LazyFunc(spectrum)
+    without_fast_path = LazyFunc(spectrum)
+    without_fast_path._fast = None
+    cases = {
+        "leaf": leaf,
+        "leaf, no fast path": without_fast_path,
+        "leaf with kwargs": LazyFunc(spectrum, temperature=300.0),
+        "composed": leaf.of(abs),
+        "expression": leaf * 2 + 1,
+        "compiled expression": (leaf * 2 + 1).compile(),
+    }
+    times = best({"raw": spectrum} | cases, number)
+    raw = times.pop("raw")
+    print(f"{'raw':>20}: {raw * 1e9:7.1f} ns per call")
+    for name, t in times.items():
+        print(
+            f"{name:>20}: {t * 1e9:7.1f} ns per call, "
+            f"{(t - raw) * 1e9:7.1f} ns over the raw function"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Per-call time of a composed LazyFunc, its compiled function and the raw
+Python expression, for the scalar calls made by numerical integration.
+
+Run with `python benchmarks/compile.py`.
+"""
+
+import math
+import timeit
+
+from lazyfunc import LazyFunc
+
+
+@LazyFunc
+def spectrum(energy, /, *, temperature):
+    return math.exp(-energy / temperature)
+
+
+@LazyFunc
+def transmission(energy):
+    return 1 - math.exp(-energy / 1e3)
+
+
+@LazyFunc
+def responsivity(energy):
+    return 0.25
+
+
+def raw(energy, *, temperature):
+    return math.exp(-energy / temperature) * (1 - math.exp(-energy / 1e3)) * 0.25 / 50
+
+
+def main(number=20000):
+    f = spectrum * transmission * responsivity / 50
+    compiled = f.compile()
+    for name, func in [("raw", raw), ("LazyFunc", f), ("compiled", compiled)]:
+        assert func(1e3, temperature=100.0) == raw(1e3, temperature=100.0)
+        t = timeit.timeit(lambda: func(1e3, temperature=100.0), number=number)
+        print(f"{name:>10}: {t / number * 1e6:6.2f} us per call")
+
+
+if __name__ == "__main__":
+    main()
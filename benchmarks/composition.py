@@ -0,0 +1,67 @@
+"""Per-call time of deep composition chains f(f(...f(g)...)), as composition
+nodes evaluated in one loop, compiled, as nested closures (how compositions
+were previously built) and as raw nested calls.
+
+Run with `python benchmarks/composition.py`.
+"""
+
+import timeit
+
+from lazyfunc import LazyFunc
+
+
+def increment(x):
+    return x + 1
+
+
+def scaled(x, *, scale=1.0):
+    return scale * x
+
+
+def lazy_chain(depth):
+    chain = LazyFunc(scaled)
+    f = LazyFunc(increment)
+    for _ in range(depth):
+        chain = f.of(chain)
+    return chain
+
+
+def closure_chain(depth):
+    chain = scaled
+    for _ in range(depth):
+
+        def chain(*x, inner=chain):
+            return increment(inner(*x))
+
+    return chain
+
+
+def raw_chain(depth):
+    def raw(x, *, scale=1.0):
+        value = scaled(x, scale=scale)
+        for _ in range(depth):
+            value = increment(value)
+        return value
+
+    return raw
+
+
+def main(number=2000):
+    print(f"{'depth':>6} {'raw':>10} {'closures':>10} {'lazy':>10} {'compiled':>10}")
+    for depth in (1, 10, 100, 1000):
+        lazy = lazy_chain(depth)
+        funcs = [raw_chain(depth), None, lazy, lazy.compile()]
+        if depth < 500:  # deeper closures exceed the recursion limit
+            funcs[1] = closure_chain(depth)
+        times = []
+        for func in funcs:
+            if func is None:
+                times.append(float("nan"))
+                continue
+            assert func(2.0) == depth + 2.0
+            times.append(timeit.timeit(lambda: func(2.0), number=number) / number)
+        print(f"{depth:>6}" + "".join(f" {t * 1e6:>7.2f} us" for t in times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Time and peak memory of evaluating a composed LazyFunc over a large energy
+grid, with and without evaluating operations in reused buffers.
+
+Run with `python benchmarks/fusion.py`.
+"""
+
+import time
+import tracemalloc
+
+import numpy as np
+
+from lazyfunc import LazyFunc
+
+POINTS = 10_000_000
+
+
+@LazyFunc
+def spectrum(energy, *, temperature):
+    return np.exp(-energy / temperature)
+
+
+@LazyFunc
+def transmission(energy):
+    return 1 - np.exp(-energy / 1e3)
+
+
+@LazyFunc
+def responsivity(energy):
+    return np.full_like(energy, 0.25)
+
+
+def measure(func, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    energy = np.linspace(1, 1e4, POINTS)
+    array_bytes = energy.nbytes
+    for depth in (1, 2, 4):
+        model = spectrum * transmission * responsivity / 50
+        for _ in range(depth - 1):
+            model = model * transmission + spectrum / 2
+        for label, call in [
+            ("unfused", model),
+            (
+                "fused",
+                lambda *args, **kwargs: model.evaluate(*args, fuse=True, **kwargs),
+            ),
+        ]:
+            seconds, peak = measure(call, energy, temperature=300)
+            print(
+                f"depth {depth:>2} {label:<8} {seconds * 1e3:8.1f} ms "
+                f"peak {peak / array_bytes:5.1f} arrays"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Time taken by `import lazyfunc` in a fresh interpreter, and the modules
+contributing most to it.
+
+Run with `python benchmarks/import_time.py`.
+"""
+
+import statistics
+import subprocess
+import sys
+
+REPEAT = 20
+
+
+def import_times():
+    """Return the self and cumulative microseconds of each module imported by
+    `import lazyfunc`, from the output of `python -X importtime`."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import lazyfunc"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines()[1:]:
+        self_time, cumulative, module = line.removeprefix("import time:").split("|")
+        times[module.strip()] = int(self_time), int(cumulative)
+    return times
+
+
+def main():
+    runs = [import_times() for _ in range(REPEAT)]
+    total = statistics.median(run["lazyfunc"][1] for run in runs)
+    print(f"import lazyfunc: {total / 1e3:.1f} ms (median of {REPEAT})")
+    modules = {
+        module: statistics.median(run[module][0] for run in runs if module in run)
+        for module in runs[0]
+    }
+    print("slowest modules (self time):")
+    for module, self_time in sorted(modules.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {module:<30} {self_time / 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
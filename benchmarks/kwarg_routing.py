@@ -0,0 +1,44 @@
+"""Per-call overhead of composed LazyFuncs relative to the raw Python expression.
+
+Run with `python benchmarks/kwarg_routing.py`.
+"""
+
+import timeit
+from functools import reduce
+
+from lazyfunc import LazyFunc
+
+
+def leaf(x, *, temperature=1.0):
+    return x / temperature
+
+
+def lazy_chain(depth):
+    return reduce(lambda acc, _: acc + LazyFunc(leaf), range(depth), LazyFunc(leaf))
+
+
+def raw_chain(depth):
+    def raw(x, *, temperature=1.0):
+        total = leaf(x, temperature=temperature)
+        for _ in range(depth):
+            total = total + leaf(x, temperature=temperature)
+        return total
+
+    return raw
+
+
+def main(number=2000):
+    print(f"{'depth':>6} {'raw (us)':>10} {'lazy (us)':>10} {'overhead':>9}")
+    for depth in (1, 10, 100):
+        lazy, raw = lazy_chain(depth), raw_chain(depth)
+        assert lazy(2.0, temperature=3.0) == raw(2.0, temperature=3.0)
+        t_raw = timeit.timeit(lambda: raw(2.0, temperature=3.0), number=number)
+        t_lazy = timeit.timeit(lambda: lazy(2.0, temperature=3.0), number=number)
+        print(
+            f"{depth:>6} {t_raw / number * 1e6:>10.2f} "
+            f"{t_lazy / number * 1e6:>10.2f} {t_lazy / t_raw:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
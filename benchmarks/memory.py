@@ -0,0 +1,59 @@
+"""Memory used per node by large generated expressions, such as the models of
+spectral fits built programmatically from many components.
+
+Run with `python benchmarks/memory.py`.
+"""
+
+import gc
+import tracemalloc
+
+from lazyfunc import LazyFunc
+
+
+def component(energy, *, amplitude=1.0):
+    return amplitude * energy
+
+
+def chain(n):
+    """Sum of n scaled components, all sharing one leaf."""
+    f = LazyFunc(component)
+    model = f
+    for i in range(n):
+        model = model + f * (i + 0.5)
+    return model
+
+
+def distinct_leaves(n):
+    """Sum of n scaled components, each with its own leaf."""
+    model = LazyFunc(component)
+    for i in range(n):
+        model = model + LazyFunc(component) * (i + 0.5)
+    return model
+
+
+def count_nodes(model):
+    return sum(1 for _ in model.walk())
+
+
+def measure(build, n):
+    gc.collect()
+    tracemalloc.start()
+    model = build(n)
+    built = tracemalloc.get_traced_memory()[0]
+    model(1.0)
+    evaluated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return count_nodes(model), built, evaluated
+
+
+def main(n=20_000):
+    for build in (chain, distinct_leaves):
+        nodes, built, evaluated = measure(build, n)
+        print(
+            f"{build.__name__:>16}: {nodes} nodes, {built / nodes:6.1f} bytes per "
+            f"node built, {evaluated / nodes:6.1f} bytes per node after evaluating"
+        )
+
+
+if __name__ == "__main__":
+    main()
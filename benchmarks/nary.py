@@ -0,0 +1,50 @@
+"""Build and evaluation time of sums of many terms, built as a chain of binary
+additions with `functools.reduce` or as a single node with `LazyFunc.sum`.
+
+Run with `python benchmarks/nary.py`.
+"""
+
+import functools
+import operator
+import time
+
+import numpy as np
+
+from lazyfunc import LazyFunc
+
+
+def component(energy, *, amplitude=1.0):
+    return amplitude * energy
+
+
+def chain(terms):
+    return functools.reduce(operator.add, terms)
+
+
+def nary(terms):
+    return LazyFunc.sum(terms)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(sizes=(10, 1_000, 100_000), repeat=5):
+    energy = np.linspace(0, 1, 100)
+    for n in sizes:
+        terms = [LazyFunc(component, amplitude=i + 0.5) for i in range(n)]
+        for build in (chain, nary):
+            model, build_seconds = timed(build, terms)
+            _, first_seconds = timed(model, energy)  # includes building the program
+            evaluate_seconds = min(timed(model, energy)[1] for _ in range(repeat))
+            print(
+                f"{n:>7} terms {build.__name__:>5}: build {build_seconds * 1e3:9.3f} "
+                f"ms, first call {first_seconds * 1e3:9.3f} ms, "
+                f"call {evaluate_seconds * 1e3:9.3f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
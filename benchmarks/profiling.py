@@ -0,0 +1,34 @@
+"""Per-call time of a composed LazyFunc with profiling off and on.
+
+Run with `python benchmarks/profiling.py`.
+"""
+
+import math
+import timeit
+
+import lazyfunc
+from lazyfunc import LazyFunc
+
+
+@LazyFunc
+def spectrum(energy, /, *, temperature):
+    return math.exp(-energy / temperature)
+
+
+@LazyFunc
+def transmission(energy):
+    return 1 - math.exp(-energy / 1e3)
+
+
+def main(number=20000):
+    f = spectrum * transmission / 50
+    t = timeit.timeit(lambda: f(1e3, temperature=100.0), number=number)
+    print(f"{'off':>10}: {t / number * 1e6:6.2f} us per call")
+    with lazyfunc.profile() as p:
+        t = timeit.timeit(lambda: f(1e3, temperature=100.0), number=number)
+    print(f"{'on':>10}: {t / number * 1e6:6.2f} us per call")
+    print(p.tree())
+
+
+if __name__ == "__main__":
+    main()
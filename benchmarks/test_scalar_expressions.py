@@ -0,0 +1,48 @@
+"""Per-call time of small expressions evaluated with scalar arguments, against
+the equivalent raw Python functions.
+
+Run with `pytest benchmarks/test_scalar_expressions.py`, which requires
+pytest-benchmark. Compare against a saved run with `--benchmark-autosave` and
+`--benchmark-compare` to catch regressions.
+"""
+
+import math
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from lazyfunc import LazyFunc  # noqa: E402
+
+
+def spectrum(energy):
+    return math.exp(-energy / 300)
+
+
+def transmission(energy):
+    return 1 - math.exp(-energy / 1e3)
+
+
+f = LazyFunc(spectrum)
+g = LazyFunc(transmission)
+
+EXPRESSIONS = {  # name: (LazyFunc, raw Python equivalent)
+    "leaf": (f, spectrum),
+    "constant right": (f / 50, lambda energy: spectrum(energy) / 50),
+    "constant left": (50 - f, lambda energy: 50 - spectrum(energy)),
+    "unary": (-f, lambda energy: -spectrum(energy)),
+    "both callable": (f * g, lambda energy: spectrum(energy) * transmission(energy)),
+    "chain": (
+        f * g / 50 + 1,
+        lambda energy: spectrum(energy) * transmission(energy) / 50 + 1,
+    ),
+}
+
+
+@pytest.mark.parametrize("name", EXPRESSIONS)
+@pytest.mark.parametrize("implementation", ["lazyfunc", "compiled", "raw"])
+def test_scalar_call(benchmark, name, implementation):
+    lazy, raw = EXPRESSIONS[name]
+    func = {"lazyfunc": lazy, "compiled": lazy.compile(), "raw": raw}[implementation]
+    benchmark.group = name
+    assert benchmark(func, 1e3) == raw(1e3)
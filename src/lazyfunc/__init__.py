@@ -1,6 +1,16 @@
-from importlib.metadata import version
-
+from .evaluation import EvaluationStats
 from .lazy_func import LazyFunc
+from .profiling import profile
+
+__all__ = ["__version__", "EvaluationStats", "LazyFunc", "profile"]
+
+
+def __getattr__(name):
+    # reading the installed metadata is slower than importing lazyfunc itself,
+    # so the version is only looked up when it is first requested
+    if name == "__version__":
+        from importlib.metadata import version
 
-__version__ = version("lazyfunc")
-__all__ = ["__version__", "LazyFunc"]
+        globals()["__version__"] = version("lazyfunc")
+        return globals()["__version__"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
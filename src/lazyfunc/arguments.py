@@ -1,4 +1,10 @@
+import dis
 import inspect
+import threading
+import weakref
+from contextvars import ContextVar
+from functools import lru_cache
+from types import MappingProxyType
 
 ARGUMENT_ORDER = [
     inspect.Parameter.POSITIONAL_ONLY,
@@ -7,3 +13,199 @@ ARGUMENT_ORDER = [
     inspect.Parameter.KEYWORD_ONLY,
     inspect.Parameter.VAR_KEYWORD,
 ]
+
+# default kwargs of the LazyFuncs created without any, shared rather than giving
+# each node its own empty dict
+NO_KWARGS = MappingProxyType({})
+
+# Incremented whenever a leaf callable is swapped. Anything derived from a tree
+# which depends on its callables (descriptions, signatures, digests, memoized
+# results) records the epoch it was built at, and is rebuilt once it is out of
+# date, or kept if none of the swapped leaves belong to its tree.
+_tree_epoch = 0
+
+# Incremented whenever a leaf callable is swapped or memoization is toggled,
+# which also changes evaluation programs and compiled functions.
+_program_epoch = 0
+
+# id(node): [program epoch, tree epoch or None, weak reference] of the nodes
+# changed in place, recording the epochs of their latest change and swap, so
+# that out of date derived data can check whether the changes concern its tree.
+_changes = {}
+
+# Keyword arguments set with LazyFunc.set_kwargs in a with block, as a tuple of
+# (node, kwargs, entered) frames with the most recent last. Being a context
+# variable, every thread and asyncio task sees its own overrides. Frames are not
+# entered between set_kwargs and the __enter__ of their with statement, or when
+# set without a with statement, within a with block of the same node.
+kwargs_overrides = ContextVar("kwargs_overrides", default=())
+
+# Keyword arguments set with LazyFunc.set_kwargs outside any with statement are
+# shared by every thread, like attributes of the node, and held on the node.
+# They never hold the kwargs of a with statement, which only ever go in the
+# context of the thread entering it.
+_shared_lock = threading.Lock()
+_shared_nodes = {}  # id(node): weak reference, for the nodes with shared kwargs
+
+# Incremented whenever shared kwargs change, so that anything they are baked
+# into, such as compiled functions, is rebuilt.
+_shared_version = 0
+
+
+def invalidate_trees(node, swapped):
+    """Mark what is derived from the trees containing node as out of date, after
+    its callable was swapped, or otherwise its memoization toggled."""
+    global _tree_epoch, _program_epoch
+    _program_epoch += 1
+    if swapped:
+        _tree_epoch += 1
+    key = id(node)
+    change = _changes.get(key)
+    if change is None or change[2]() is not node:
+        change = _changes[key] = [
+            None,
+            None,
+            weakref.ref(node, lambda _, key=key: _changes.pop(key, None)),
+        ]
+    change[0] = _program_epoch
+    if swapped:
+        change[1] = _tree_epoch
+
+
+def changed_since(program_epoch):
+    """Return the nodes changed in place after program_epoch."""
+    changes = list(_changes.values())
+    nodes = (change[2]() for change in changes if change[0] > program_epoch)
+    return [node for node in nodes if node is not None]
+
+
+def swapped_since(tree_epoch):
+    """Return the nodes whose callable was swapped after tree_epoch."""
+    changes = list(_changes.values())
+    nodes = (
+        change[2]()
+        for change in changes
+        if change[1] is not None and change[1] > tree_epoch
+    )
+    return [node for node in nodes if node is not None]
+
+
+def shared_kwargs(node):
+    """Return the kwargs of node shared by every context."""
+    kwargs = node._shared_kwargs
+    return node._default_kwargs if kwargs is None else kwargs
+
+
+def current_kwargs(node, frames):
+    """Return the kwargs of node given the override frames of the current
+    context."""
+    for frame in reversed(frames):
+        if frame[0] is node:
+            return frame[1]
+    return shared_kwargs(node)
+
+
+def context_overrides(frames):
+    """Return the kwargs of the nodes overridden by frames, by node id."""
+    return {id(frame[0]): frame[1] for frame in frames}
+
+
+def push_kwargs(node, kwargs):
+    """Set the kwargs of node in the current context, for a with statement of
+    node about to be entered, or within a with block of node. A frame which has
+    not been entered is replaced rather than stacked, so that repeatedly
+    setting kwargs does not accumulate frames."""
+    frames = kwargs_overrides.get()
+    index = _last_frame(node, frames)
+    if index is not None and not frames[index][2]:
+        frames = frames[:index] + frames[index + 1 :]
+    kwargs_overrides.set(frames + ((node, kwargs, False),))
+
+
+def assign_kwargs(node, kwargs):
+    """Set the kwargs of node outside any with statement: in the current context
+    within a with block of node, otherwise for every context."""
+    if _last_frame(node, kwargs_overrides.get()) is not None:
+        push_kwargs(node, kwargs)
+    else:
+        _set_shared(node, kwargs)
+
+
+def enter_kwargs(node):
+    """Enter a with block of node: the kwargs pushed for it are entered, or
+    else the current kwargs of node are kept until the matching
+    `exit_kwargs`."""
+    frames = kwargs_overrides.get()
+    index = _last_frame(node, frames)
+    if index is None or frames[index][2]:
+        frames = frames + ((node, current_kwargs(node, frames), True),)
+    else:
+        frames = (
+            frames[:index] + ((node, frames[index][1], True),) + frames[index + 1 :]
+        )
+    kwargs_overrides.set(frames)
+
+
+def exit_kwargs(node):
+    """Restore the kwargs of node to what they were before the latest entered
+    override, discarding any later overrides of node. Outside any with block
+    of node, the shared kwargs of node are reset to its initial kwargs."""
+    frames = kwargs_overrides.get()
+    entered = [i for i, frame in enumerate(frames) if frame[0] is node and frame[2]]
+    if not entered:
+        _set_shared(node, None)
+    start = entered[-1] if entered else 0
+    kwargs_overrides.set(
+        frames[:start]
+        + tuple(frame for frame in frames[start:] if frame[0] is not node)
+    )
+
+
+def in_with_statement(frame):
+    """Whether the call frame is executing is the context expression of a with
+    statement, whose result is entered next."""
+    return _enters_result(frame.f_code, frame.f_lasti)
+
+
+def shared_nodes():
+    """Return the nodes which have shared kwargs set."""
+    nodes = (ref() for ref in list(_shared_nodes.values()))
+    return [node for node in nodes if node is not None]
+
+
+def _register(node):
+    key = id(node)
+    if key not in _shared_nodes:
+        _shared_nodes[key] = weakref.ref(
+            node, lambda _, key=key: _shared_nodes.pop(key, None)
+        )
+
+
+def _set_shared(node, kwargs):
+    global _shared_version
+    with _shared_lock:
+        node._shared_kwargs = kwargs
+        node._bind_fast_path()
+        if kwargs is None:
+            _shared_nodes.pop(id(node), None)
+        else:
+            _register(node)
+        _shared_version += 1
+
+
+@lru_cache(maxsize=1024)
+def _enters_result(code, offset):
+    for instruction in dis.get_instructions(code):
+        if instruction.offset > offset:
+            # the with statement opcodes of Python 3.9 to 3.13
+            return instruction.opname in _WITH_OPNAMES
+    return False
+
+
+_WITH_OPNAMES = ("SETUP_WITH", "BEFORE_WITH", "SETUP_ASYNC_WITH", "BEFORE_ASYNC_WITH")
+
+
+def _last_frame(node, frames):
+    for index in range(len(frames) - 1, -1, -1):
+        if frames[index][0] is node:
+            return index
@@ -0,0 +1,123 @@
+"""Batched evaluation of LazyFunc expression trees over grids of arguments.
+
+Rather than evaluating the whole expression once per grid point, the program
+is run once with every value stacked along a leading batch axis:
+
+- leaves which do not depend on the batched arguments are evaluated once, and
+  broadcast against the batched values by the operations,
+- leaves marked as `vectorized` are called once with the stacked arguments,
+- other leaves which depend on the batched arguments are called in a loop over
+  the grid, and their results stacked.
+
+Batched values are shaped so that the batch axis is followed by singleton axes
+for each axis of the positional arguments, which lets them broadcast against
+the results of unbatched leaves. Operations are therefore assumed to be
+elementwise, except compositions and matrix multiplications, which are applied
+to each grid point. Vectorized leaves receive batched keyword arguments shaped
+in the same way.
+"""
+
+# names of the operators which are not elementwise, applied to each grid point
+PER_POINT_OPERATORS = ("compose", "__matmul__")
+
+
+def run_batched(program, args, kwargs, args_grid, kwargs_grid):
+    """Evaluate program over the grid, returning the results stacked along the
+    first axis.
+
+    Args:
+        program: The `Program` to evaluate.
+        args: Positional arguments used for every grid point when args_grid is
+            None.
+        kwargs: Keyword arguments used for every grid point.
+        args_grid: Sequence with a tuple of positional arguments per grid point,
+            or None.
+        kwargs_grid: Mapping of keyword argument names to a sequence with a value
+            per grid point.
+    """
+    import numpy as np
+
+    kwargs_grid = {name: np.asarray(values) for name, values in kwargs_grid.items()}
+    lengths = {len(values) for values in kwargs_grid.values()}
+    if args_grid is not None:
+        args_grid = [tuple(grid_args) for grid_args in args_grid]
+        lengths.add(len(args_grid))
+    if not lengths:
+        raise ValueError("either args_grid or kwargs_grid must be given")
+    if len(lengths) != 1:
+        raise ValueError(f"grids must have a single length, not {sorted(lengths)}")
+    (n,) = lengths
+    if n == 0:
+        raise ValueError("cannot evaluate over an empty grid")
+
+    item_args = args_grid[0] if args_grid else args
+    item_ndim = max((np.ndim(arg) for arg in item_args), default=0)
+
+    def expand(value):
+        """Insert singleton axes after the batch axis of a batched value."""
+        value = np.asarray(value)
+        missing = item_ndim + 1 - value.ndim
+        if missing <= 0:
+            return value
+        return value.reshape(value.shape[:1] + (1,) * missing + value.shape[1:])
+
+    def items(values, slot):
+        """Return the values of a slot at each grid point."""
+        value = values[slot]
+        if not batched[slot]:
+            return [value] * n
+        padding = value.ndim - 1 - item_ndims[slot]
+        return value.reshape(value.shape[:1] + value.shape[1 + padding :])
+
+    if args_grid is None:
+        stacked_args = args
+    else:
+        stacked_args = tuple(np.stack(column) for column in zip(*args_grid))
+    vectorized_grid = {
+        name: values.reshape(values.shape[:1] + (1,) * item_ndim + values.shape[1:])
+        for name, values in kwargs_grid.items()
+    }
+
+    grid_ids = {id(values): name for name, values in kwargs_grid.items()}
+    batched = [False] * len(program.template)
+    # number of axes of a single grid point's value, excluding padding axes
+    item_ndims = [np.ndim(value) for value in program.template]
+
+    def evaluate_leaf(index, instruction, scope, values):
+        slot = instruction.slot
+        names = [name for name, value in scope.items() if id(value) in grid_ids]
+        if not names and args_grid is None:
+            result = instruction.func(*args, **scope)
+            item_ndims[slot] = np.ndim(result)
+            return result
+        if instruction.node.vectorized:
+            vectorized_scope = scope | {name: vectorized_grid[name] for name in names}
+            result = np.asarray(instruction.func(*stacked_args, **vectorized_scope))
+        else:
+            results = []
+            for i in range(n):
+                grid_args = args if args_grid is None else args_grid[i]
+                grid_scope = scope | {name: kwargs_grid[name][i] for name in names}
+                results.append(instruction.func(*grid_args, **grid_scope))
+            result = np.stack(results)
+        item_ndims[slot] = result.ndim - 1
+        batched[slot] = True
+        return expand(result)
+
+    def apply_operation(index, instruction, values):
+        slot, operands = instruction.slot, instruction.operands
+        batched[slot] = any(batched[operand] for operand in operands)
+        if batched[slot] and instruction.node.operator.name in PER_POINT_OPERATORS:
+            points = zip(*[items(values, operand) for operand in operands])
+            result = np.stack([instruction.func(*point) for point in points])
+            item_ndims[slot] = result.ndim - 1
+            return expand(result)
+        item_ndims[slot] = max(item_ndims[operand] for operand in operands)
+        return instruction.func(*[values[operand] for operand in operands])
+
+    values = program.execute(args, kwargs | kwargs_grid, evaluate_leaf, apply_operation)
+    result = values[-1]
+    if not batched[-1]:
+        return np.stack([result] * n)
+    padding = result.ndim - 1 - item_ndims[-1]
+    return result.reshape(result.shape[:1] + result.shape[1 + padding :])
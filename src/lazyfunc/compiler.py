@@ -0,0 +1,198 @@
+"""Code generation of flat Python functions from LazyFunc expression trees.
+
+The instructions of the evaluation program are emitted as straight-line Python
+source, one statement per node, which is executed once to define the compiled
+function. Leaf callables and constants are bound as globals of the generated
+function, so calling it involves no closures, per-node dispatch or keyword
+routing dictionaries.
+"""
+
+import inspect
+from functools import partial
+
+from lazyfunc import arguments
+from lazyfunc.evaluation import Program, plain_outer
+from lazyfunc.memoize import call_memoized
+from lazyfunc.operators import Operator
+
+_LITERAL_TYPES = (bool, int, str, type(None))
+_KEYWORD_KINDS = (
+    inspect.Parameter.POSITIONAL_OR_KEYWORD,
+    inspect.Parameter.KEYWORD_ONLY,
+)
+_MISSING = object()
+_REQUIRED = object()
+
+
+def compile_function(root):
+    """Return a flat Python function evaluating the expression rooted at root.
+
+    The compiled function takes the positional arguments shared by every leaf,
+    followed by a keyword-only argument for every parameter which is keyword-only
+    in one of the leaves. The defaults of the keyword arguments are resolved when
+    compiling from the kwargs set on the nodes of the expression and from the
+    signatures of the leaves. Any other keyword arguments are routed through the
+    evaluation program, as when calling root. A memoized root is compiled to a
+    lookup in its cache, which evaluating its program inline would bypass.
+    """
+    program = Program(root)
+    if root._cache is not None:
+        namespace = {
+            "_lf_memoized": partial(call_memoized, root),
+            "_lf_defaults": root._kwargs,
+        }
+        source = "\n".join(
+            [
+                "def compiled(*_lf_args, **_lf_kwargs):",
+                "    return _lf_memoized(*_lf_args, **(_lf_defaults | _lf_kwargs))",
+            ]
+        )
+        return _define(root, program, namespace, source)
+    instructions = program.instructions
+    node_slots = {instruction.slot for instruction in instructions}
+    scopes = program.route(root._kwargs)
+    namespace = {"_lf_MISSING": _MISSING, "_lf_fallback": _fallback(root, program)}
+    signatures = {}
+    keyword_names = {}  # name: {leaf instruction index: resolved default}
+    for index, instruction in enumerate(instructions):
+        if instruction.operands:
+            continue
+        signatures[index] = instruction.node.parameters
+        for name, param in signatures[index].items():
+            if param.kind == inspect.Parameter.KEYWORD_ONLY:
+                keyword_names.setdefault(name, {})
+    for index, parameters in signatures.items():
+        for name in keyword_names.keys() & parameters.keys():
+            keyword_names[name][index] = _resolved_default(
+                scopes[index], name, parameters[name]
+            )
+
+    lines = []
+    routed = {}  # name: source expression passed to the leaves
+    for name, defaults in keyword_names.items():
+        resolved = {id(default) for default in defaults.values()}
+        if id(_REQUIRED) in resolved:
+            lines.append(f"if {name} is _lf_MISSING:")
+            lines.append(
+                f"    raise TypeError(\"missing required keyword argument '{name}'\")"
+            )
+            routed[name] = {index: name for index in defaults}
+        elif len(resolved) == 1:
+            default = _global(namespace, "_lf_d", next(iter(defaults.values())))
+            lines.append(f"if {name} is _lf_MISSING:")
+            lines.append(f"    {name} = {default}")
+            routed[name] = {index: name for index in defaults}
+        else:
+            routed[name] = {
+                index: f"{_global(namespace, '_lf_d', default)} "
+                f"if {name} is _lf_MISSING else {name}"
+                for index, default in defaults.items()
+            }
+
+    for index, instruction in enumerate(instructions):
+        target = f"_lf_t{instruction.slot}"
+        if instruction.operands:
+            operands = [
+                f"_lf_t{slot}" if slot in node_slots else _constant(namespace, value)
+                for slot, value in zip(
+                    instruction.operands,
+                    map(program.template.__getitem__, instruction.operands),
+                )
+            ]
+            operator = instruction.node.operator
+            if isinstance(operator, Operator):
+                expression = operator.format(*operands)
+            else:  # n-ary operations and compositions are called, as long
+                # chains of operators overflow the parser
+                func = operator.func
+                outer = plain_outer(instruction.node)
+                if outer is not None and not outer._kwargs:
+                    func = operator.bind(outer._func)
+                func = _global(namespace, "_lf_c", func)
+                expression = f"{func}({', '.join(operands)})"
+        else:
+            func = _global(namespace, "_lf_c", instruction.func)
+            call_args = ["*_lf_args"]
+            parameters = signatures[index]
+            for name in parameters:
+                if name in keyword_names:
+                    call_args.append(f"{name}={routed[name][index]}")
+                elif parameters[name].kind in _KEYWORD_KINDS and name in scopes[index]:
+                    default = _global(namespace, "_lf_d", scopes[index][name])
+                    call_args.append(f"{name}={default}")
+            expression = f"{func}({', '.join(call_args)})"
+        lines.append(f"{target} = {expression}")
+    lines.append(f"return _lf_t{instructions[-1].slot}")
+
+    params = "".join(f", {name}=_lf_MISSING" for name in keyword_names)
+    fallback_kwargs = "".join(f", {name}={name}" for name in keyword_names)
+    source = "\n".join(
+        [
+            f"def compiled(*_lf_args{params}, **_lf_kwargs):",
+            "    if _lf_kwargs:",
+            f"        return _lf_fallback(_lf_args, _lf_kwargs{fallback_kwargs})",
+        ]
+        + ["    " + line for line in lines]
+    )
+    return _define(root, program, namespace, source)
+
+
+def _define(root, program, namespace, source):
+    """Return the compiled function defined by source in namespace."""
+    exec(compile(source, f"<lazyfunc.compile {root.description}>", "exec"), namespace)
+    function = namespace["compiled"]
+    function.__name__ = function.__qualname__ = root.description
+    function.__doc__ = f"Compiled {root!r}."
+    function.source = source
+    function.program = program
+    function.frames = arguments.kwargs_overrides.get()
+    function.shared_version = arguments._shared_version
+    return function
+
+
+def is_current(function):
+    """Whether the compiled function is up to date with the expression tree and
+    the kwargs set for the current context."""
+    return (
+        function.program.is_current()
+        and function.frames is arguments.kwargs_overrides.get()
+        and function.shared_version == arguments._shared_version
+    )
+
+
+def _global(namespace, prefix, value):
+    name = f"{prefix}{len(namespace)}"
+    namespace[name] = value
+    return name
+
+
+def _constant(namespace, value):
+    """Return constants as literals where possible, since they are faster to
+    load than globals."""
+    if type(value) in _LITERAL_TYPES or (
+        type(value) is float and repr(value) not in ("inf", "-inf", "nan")
+    ):
+        literal = repr(value)
+        return f"({literal})" if literal.startswith("-") else literal
+    return _global(namespace, "_lf_k", value)
+
+
+def _resolved_default(scope, name, parameter):
+    """Return the value a leaf receives for name when it is not passed in the
+    call: the kwargs set on the nodes of the expression if any, or else the
+    default of the leaf signature."""
+    if name in scope:
+        return scope[name]
+    if parameter.default is inspect.Parameter.empty:
+        return _REQUIRED
+    return parameter.default
+
+
+def _fallback(root, program):
+    def fallback(args, kwargs, **keywords):
+        keywords = {
+            key: value for key, value in keywords.items() if value is not _MISSING
+        }
+        return program.run(args, root._kwargs | keywords | kwargs)
+
+    return fallback
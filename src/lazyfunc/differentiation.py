@@ -0,0 +1,206 @@
+"""Differentiation of LazyFunc expression trees with respect to a keyword
+argument.
+
+The derivative of an expression is built as a new expression from the
+derivative rules of its operators, sharing the sub-expressions of the original
+tree, so evaluating it costs about one evaluation of the original expression
+plus the derivatives of its leaves. Each leaf is differentiated
+
+- to zero if it does not accept the argument,
+- with the derivative registered for its callable with `set_derivative`,
+- otherwise by central finite differences, evaluating the leaf twice.
+
+Operations without a derivative rule, such as powers whose exponent depends on
+the argument, are differentiated by finite differences as a whole.
+"""
+
+import weakref
+
+from lazyfunc.simplify import simplify
+
+DEFAULT_STEP = 6e-6  # about the cube root of the float64 machine epsilon
+PIECEWISE_CONSTANT = frozenset(
+    ["__floordiv__", "__lt__", "__le__", "__gt__", "__ge__", "__ne__", "__eq__"]
+)
+
+# callable: {argument name: derivative}, held weakly so that registering a
+# derivative does not keep the callable alive
+_derivatives = weakref.WeakKeyDictionary()
+# the same, for callables which cannot be weakly referenced, such as numpy ufuncs
+_static_derivatives = {}
+
+
+def set_derivative(func, wrt, derivative):
+    """Register the derivative of func with respect to its argument wrt."""
+    try:
+        registered = _derivatives.setdefault(func, {})
+    except TypeError:  # cannot be weakly referenced
+        registered = _static_derivatives.setdefault(func, {})
+    registered[wrt] = derivative
+
+
+def _registered_derivative(func, wrt):
+    """Return the derivative registered for func with respect to wrt, or
+    None."""
+    for derivatives in (_derivatives, _static_derivatives):
+        try:
+            return derivatives[func][wrt]
+        except (KeyError, TypeError):  # TypeError for unhashable callables
+            pass
+    return None
+
+
+def grad(root, wrt, step=DEFAULT_STEP):
+    """Return the LazyFunc evaluating the derivative of root with respect to
+    the keyword argument wrt."""
+    derivatives = {}  # id(node): derivative, or None where it is zero
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in derivatives:
+            continue
+        if node._operator is None:
+            derivatives[id(node)] = _leaf_derivative(node, wrt, step)
+        elif expanded:
+            operand_derivatives = [
+                derivatives[id(operand)] if callable(operand) else None
+                for operand in node._operands
+            ]
+            derivative = _operation_derivative(node, operand_derivatives, wrt, step)
+            kwargs = node._kwargs
+            if derivative is not None and kwargs:
+                # pass the kwargs of node to the sub-expressions it contains
+                derivative = type(node)(derivative, **kwargs)
+            derivatives[id(node)] = derivative
+        else:  # differentiate the operands before the node itself
+            stack.append((node, True))
+            stack.extend(
+                (operand, False) for operand in node._operands if callable(operand)
+            )
+    derivative = derivatives[id(root)]
+    if derivative is None:
+        return type(root)(_zero, description="0")
+    return simplify(derivative)
+
+
+def _leaf_derivative(node, wrt, step):
+    if wrt not in node.parameters:
+        return None
+    func = node._func
+    registered = _registered_derivative(func, wrt)
+    if registered is not None:
+        derivative = type(node)(
+            registered, f"d{node.description}/d{wrt}", **node._kwargs
+        )
+        derivative.vectorized = node.vectorized
+        return derivative
+    if isinstance(func, type(node)):  # a LazyFunc wrapped with kwargs
+        derivative = grad(func, wrt, step)
+        return type(node)(derivative, **node._kwargs) if node._kwargs else derivative
+    return _finite_difference(node, wrt, step)
+
+
+def _operation_derivative(node, derivatives, wrt, step):
+    """Return the derivative of node given the derivatives of its operands, or
+    None if it is zero."""
+    if all(derivative is None for derivative in derivatives):
+        return None
+    name = node._operator.name
+    if name in PIECEWISE_CONSTANT:
+        return None
+    operands = node._operands
+    if name == "__pos__":
+        return derivatives[0]
+    if name == "__neg__":
+        return -derivatives[0]
+    if name in ("sum", "__add__"):
+        return _sum(
+            node, [derivative for derivative in derivatives if derivative is not None]
+        )
+    if name in ("prod", "__mul__", "__matmul__"):
+        # product rule, replacing one factor at a time by its derivative
+        operator = node._operator
+        terms = [
+            type(node).from_operator(
+                operator, *operands[:i], derivative, *operands[i + 1 :]
+            )
+            for i, derivative in enumerate(derivatives)
+            if derivative is not None
+        ]
+        return _sum(node, terms)
+    if len(operands) != 2:  # compositions
+        return _finite_difference(node, wrt, step)
+    u, v = operands
+    du, dv = derivatives
+    if name == "__sub__":
+        if dv is None:
+            return du
+        return -dv if du is None else du - dv
+    if name == "__truediv__":
+        if dv is None:
+            return du / v
+        if du is None:
+            return -u * dv / v**2
+        return (du * v - u * dv) / v**2
+    if name == "__mod__":
+        if dv is None:
+            return du
+        return -(u // v) * dv if du is None else du - (u // v) * dv
+    if name == "__pow__" and dv is None:
+        return v * u ** (v - 1) * du
+    return _finite_difference(node, wrt, step)
+
+
+def _sum(node, terms):
+    if len(terms) == 1:
+        return terms[0]
+    if len(terms) == 2:
+        return terms[0] + terms[1]
+    return type(node).sum(terms)
+
+
+def _finite_difference(node, wrt, step):
+    description = node.description
+    if node._operator is not None:
+        description = f"({description})"
+    derivative = type(node)(FiniteDifference(node, wrt, step), f"d{description}/d{wrt}")
+    derivative.vectorized = node.vectorized
+    return derivative
+
+
+def _zero(*args, **kwargs):
+    return 0
+
+
+class FiniteDifference:
+    """Callable estimating the derivative of a LazyFunc with respect to a
+    keyword argument by central differences, with the signature of the
+    LazyFunc so that it receives the same arguments.
+
+    The step is relative to the value of the argument x, `step * (1 + |x|)`.
+    """
+
+    __slots__ = ("node", "wrt", "step", "__signature__")
+
+    def __init__(self, node, wrt, step):
+        self.node = node
+        self.wrt = wrt
+        self.step = step
+        self.__signature__ = node.__signature__
+
+    def __call__(self, *args, **kwargs):
+        kwargs = self.node._kwargs | kwargs
+        if self.wrt in kwargs:
+            x = kwargs[self.wrt]
+        else:
+            x = self.__signature__.parameters[self.wrt].default
+            if x is self.__signature__.empty:
+                raise TypeError(f"missing required keyword argument '{self.wrt}'")
+        h = self.step * (1 + abs(x))
+        h = (x + h) - x  # exactly representable
+        above = self.node(*args, **(kwargs | {self.wrt: x + h}))
+        below = self.node(*args, **(kwargs | {self.wrt: x - h}))
+        return (above - below) / (2 * h)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.node!r}, {self.wrt!r})"
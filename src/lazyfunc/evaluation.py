@@ -0,0 +1,689 @@
+"""Flattened evaluation of LazyFunc expression trees.
+
+A composed LazyFunc is compiled once into a `Program`: a list of instructions
+in topological (post) order, each of which writes its result into a slot that
+later instructions read their operands from. Evaluating the program is a single
+loop, so deep expressions neither recurse through nested Python frames nor hit
+the recursion limit.
+
+Programs can also be run sharing common sub-expressions, so that a leaf or
+operation appearing several times in the tree is evaluated once per call, or
+with the leaves scheduled concurrently on an executor.
+"""
+
+import inspect
+import threading
+import time
+from contextvars import copy_context
+from functools import partial
+
+from lazyfunc import arguments, serialization
+from lazyfunc.memoize import call_memoized
+from lazyfunc.profiling import active_profile, run_profiled
+
+_NO_KWARGS = {}
+
+# kinds of instructions, which determine how the run loop calls their function
+LEAF = 0
+UNARY = 1  # func(values[a])
+BINARY = 2  # func(values[a], values[b])
+CONSTANT_LEFT = 3  # func(a, values[b]), where a is a constant
+CONSTANT_RIGHT = 4  # func(values[a], b), where b is a constant
+NARY = 5  # func(*values[a]), where a is a tuple of slots
+
+
+class EvaluationStats:
+    """Counters accumulated over the evaluations it is passed to.
+
+    Attributes:
+        evaluations: Number of nodes evaluated.
+        saved: Number of node evaluations avoided by reusing the result of an
+            identical sub-expression.
+        timings: Total seconds spent evaluating each leaf, by description, for
+            evaluations which time their leaves.
+    """
+
+    def __init__(self):
+        self.evaluations = 0
+        self.saved = 0
+        self.timings = {}
+
+    def add_timing(self, description, seconds):
+        self.timings[description] = self.timings.get(description, 0.0) + seconds
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(evaluations={self.evaluations}, "
+            f"saved={self.saved})"
+        )
+
+
+class Instruction:
+    """A single node of the flattened expression tree.
+
+    Attributes:
+        node: The LazyFunc the instruction evaluates.
+        func: The wrapped callable for leaves, otherwise the operator function.
+        slot: Index of the slot the result is written to.
+        operands: Slot indices of the operands, in expression order. Empty for
+            leaves.
+        parent: Index of the instruction consuming the result, or -1 for the
+            root.
+        accepted: Names of the parameters of the node, which determine the
+            keyword arguments routed to it from its parent.
+        step: Tuple of the kind of instruction, func, slot and two arguments,
+            specialised when the program is built so that the run loop needs
+            neither to collect the operands of each operation into a list, nor
+            to load constant operands from their slots.
+    """
+
+    __slots__ = ("node", "func", "slot", "operands", "parent", "accepted", "step")
+
+    def __init__(self, node, slot, operands, constants=(), accepted=None):
+        self.node = node
+        self.slot = slot
+        self.operands = operands
+        self.parent = -1
+        if operands:
+            self.func = node.operator.func
+        elif node._cache is not None:
+            self.func = partial(call_memoized, node)
+        else:
+            self.func = node.func
+        if accepted is None:
+            accepted = frozenset(node.parameters)
+        self.accepted = accepted
+        self.step = self._specialise(constants)
+
+    def _specialise(self, constants):
+        """Return the step of the instruction, given the values of its constant
+        operands by slot."""
+        operands = self.operands
+        if not operands:
+            return LEAF, self.func, self.slot, None, None
+        if len(operands) == 1:
+            return UNARY, self.func, self.slot, operands[0], None
+        if len(operands) > 2:
+            return NARY, self.func, self.slot, operands, None
+        a, b = operands
+        if a in constants:
+            return CONSTANT_LEFT, self.func, self.slot, constants[a], b
+        if b in constants:
+            return CONSTANT_RIGHT, self.func, self.slot, a, constants[b]
+        return BINARY, self.func, self.slot, a, b
+
+
+class Program:
+    """Instruction list for evaluating the expression tree rooted at root.
+
+    Constant operands are stored in their slots of `template` when compiling,
+    so only callable nodes have instructions. Memoized nodes other than the root
+    are evaluated by a single instruction looking up their cache, so that their
+    operands are only evaluated on a cache miss.
+    """
+
+    def __init__(self, root):
+        self.instructions = []
+        self.template = []
+        self.epoch = arguments._program_epoch
+        self.tree_epoch = arguments._tree_epoch
+        self._shared = None
+        self.costs = {}  # instruction index: last measured seconds of a leaf
+        self.steps = []
+        self._accepted = {}  # parameter names: accepted set
+        # args, scopes, leaf results and result of the last incremental evaluation
+        self._previous = None
+        self._incremental_lock = threading.Lock()
+        pending = []  # (slot, instruction index) of results awaiting a consumer
+        stack = [(root, False)]
+        while stack:
+            item, expanded = stack.pop()
+            if not callable(item):  # constant operand
+                pending.append((len(self.template), -1))
+                self.template.append(item)
+            elif item.is_leaf or (item._cache is not None and item is not root):
+                self._emit(item, 0, pending)
+            elif expanded:
+                self._emit(item, len(item.operands), pending)
+            else:  # visit the operands before the node itself
+                stack.append((item, True))
+                stack.extend((operand, False) for operand in reversed(item.operands))
+        # the leaves, which only depend on the arguments, then the operations
+        self._leaves_first = sorted(
+            range(len(self.instructions)),
+            key=lambda index: bool(self.instructions[index].operands),
+        )
+        self._no_scopes = None
+        self._shared_version = self._has_shared = None
+        if not any(
+            instruction.node._default_kwargs for instruction in self.instructions
+        ):
+            # scopes of every call without kwargs or kwargs set in the context
+            self._no_scopes = [_NO_KWARGS] * len(self.instructions)
+        # compositions with an outer callable returning an awaitable, awaited
+        # by run_async after applying them
+        self._async_compositions = {
+            index
+            for index, instruction in enumerate(self.instructions)
+            if instruction.operands and _has_async_outer(instruction.node)
+        }
+        self.is_async = bool(self._async_compositions) or any(
+            instruction.node.is_leaf and is_coroutine_function(instruction.node.func)
+            for instruction in self.instructions
+        )
+        # steps calling the wrapped functions of plain outers directly, used
+        # while no kwargs are set on these outers
+        self._outers = []
+        self._direct_steps = None
+        for index, instruction in enumerate(self.instructions):
+            outer = plain_outer(instruction.node) if instruction.operands else None
+            if outer is not None:
+                if self._direct_steps is None:
+                    self._direct_steps = self.steps.copy()
+                kind, _, slot, a, b = instruction.step
+                func = instruction.node._operator.bind(outer._func)
+                self._direct_steps[index] = kind, func, slot, a, b
+                self._outers.append(outer)
+        self._outers_version = self._outers_shared = None
+
+    def is_current(self):
+        """Whether the program is up to date with its expression tree.
+
+        Programs out of date with the program epoch are kept if the nodes
+        changed since are neither among their instructions nor the outers they
+        call directly, and the leaves swapped since, which may change the
+        parameters of the nodes above them, are not in their tree.
+        """
+        epoch = arguments._program_epoch
+        if self.epoch == epoch:
+            return True
+        if arguments.changed_since(self.epoch):
+            nodes = {id(instruction.node) for instruction in self.instructions}
+            nodes.update(id(outer) for outer in self._outers)
+            changed = arguments.changed_since(self.epoch)
+            if any(id(node) in nodes for node in changed):
+                return False
+            swapped = {id(node) for node in arguments.swapped_since(self.tree_epoch)}
+            root = self.instructions[-1].node
+            if swapped and any(
+                id(node) in swapped for node in root._walk_dependencies()
+            ):
+                return False
+        self.epoch, self.tree_epoch = epoch, arguments._tree_epoch
+        return True
+
+    def _emit(self, node, n, pending):
+        consumed = pending[len(pending) - n :]
+        del pending[len(pending) - n :]
+        index = len(self.instructions)
+        for _, child in consumed:
+            if child >= 0:
+                self.instructions[child].parent = index
+        slot = len(self.template)
+        operands = tuple(operand_slot for operand_slot, _ in consumed)
+        constants = {
+            operand_slot: self.template[operand_slot]
+            for operand_slot, child in consumed
+            if child < 0
+        }
+        names = tuple(node.parameters)
+        accepted = self._accepted.get(names)
+        if accepted is None:  # shared between nodes with the same parameters
+            accepted = self._accepted[names] = frozenset(names)
+        instruction = Instruction(node, slot, operands, constants, accepted)
+        self.instructions.append(instruction)
+        self.steps.append(instruction.step)
+        self.template.append(None)
+        pending.append((slot, index))
+
+    def route(self, kwargs):
+        """Return the keyword arguments each instruction is evaluated with.
+
+        The root receives kwargs, every other node the keyword arguments of its
+        parent that it accepts, on top of its own defaults. Instructions are
+        visited in reverse so that parents are resolved before their operands.
+        """
+        instructions = self.instructions
+        frames = arguments.kwargs_overrides.get()
+        if not kwargs and not frames and self._no_scopes is not None:
+            if self._shared_version != arguments._shared_version:
+                self._shared_version = arguments._shared_version
+                self._has_shared = any(
+                    instruction.node._shared_kwargs is not None
+                    for instruction in instructions
+                )
+            if not self._has_shared:
+                return self._no_scopes
+        overrides = arguments.context_overrides(frames) if frames else None
+        scopes = [_NO_KWARGS] * len(instructions)
+        scopes[-1] = kwargs
+        for i in range(len(instructions) - 2, -1, -1):
+            instruction = instructions[i]
+            parent_kwargs = scopes[instruction.parent]
+            if parent_kwargs:
+                accepted = instruction.accepted
+                routed = {
+                    key: value
+                    for key, value in parent_kwargs.items()
+                    if key in accepted
+                }
+            else:
+                routed = _NO_KWARGS
+            node = instruction.node
+            if overrides is not None and id(node) in overrides:
+                defaults = overrides[id(node)]
+            elif node._shared_kwargs is not None:
+                defaults = node._shared_kwargs
+            else:
+                defaults = node._default_kwargs
+            scopes[i] = defaults | routed if defaults else routed
+        return scopes
+
+    def execute(
+        self,
+        args,
+        kwargs,
+        evaluate_leaf=None,
+        apply_operation=None,
+        leaves_first=False,
+    ):
+        """Evaluate the instructions in a single loop, which the variants of
+        `run` customise through hooks, and return the values of every slot.
+
+        Args:
+            args: Positional arguments passed to every leaf.
+            kwargs: Keyword arguments of the root, routed to the leaves.
+            evaluate_leaf: Called as evaluate_leaf(index, instruction, scope,
+                values) to return the result of each leaf, or None to call the
+                leaf with args and its scope.
+            apply_operation: Called as apply_operation(index, instruction,
+                values) to return the result of each operation, or None to
+                apply it to the values of its operands.
+            leaves_first: If True, evaluate every leaf before the operations,
+                otherwise follow the order of the instructions.
+        """
+        instructions = self.instructions
+        values = self.template.copy()
+        scopes = self.route(kwargs)
+        order = self._leaves_first if leaves_first else range(len(instructions))
+        for index in order:
+            instruction = instructions[index]
+            if instruction.operands:
+                if apply_operation is None:
+                    result = instruction.func(
+                        *[values[operand] for operand in instruction.operands]
+                    )
+                else:
+                    result = apply_operation(index, instruction, values)
+            elif evaluate_leaf is None:
+                result = instruction.func(*args, **scopes[index])
+            else:
+                result = evaluate_leaf(index, instruction, scopes[index], values)
+            values[instruction.slot] = result
+        return values
+
+    def run(self, args, kwargs, stats=None):
+        """Evaluate the program with the positional args shared by all leaves
+        and the keyword arguments of the root.
+
+        This is the hot path of evaluation, so rather than `execute` it loops
+        over steps specialised to the operands of each instruction."""
+        if self.is_async:
+            raise TypeError(
+                "expressions with coroutine function leaves or outer callables "
+                "must be evaluated with acall"
+            )
+        profile = active_profile.get()
+        if profile is not None:
+            return run_profiled(self, profile, args, kwargs, stats)
+        values = self.template.copy()
+        scopes = self.route(kwargs)
+        steps = self.steps
+        if self._direct_steps is not None and self._outers_are_plain():
+            steps = self._direct_steps
+        for (kind, func, slot, a, b), scope in zip(steps, scopes):
+            if kind == CONSTANT_RIGHT:
+                values[slot] = func(values[a], b)
+            elif kind == BINARY:
+                values[slot] = func(values[a], values[b])
+            elif kind == LEAF:
+                values[slot] = func(*args, **scope) if scope else func(*args)
+            elif kind == CONSTANT_LEFT:
+                values[slot] = func(a, values[b])
+            elif kind == NARY:
+                values[slot] = func(*[values[operand] for operand in a])
+            else:
+                values[slot] = func(values[a])
+        if stats is not None:
+            stats.evaluations += len(self.instructions)
+        return values[-1]
+
+    @property
+    def shared(self):
+        """For each instruction, the index of the first instruction computing
+        the same sub-expression and the pairs of operand slots which must hold
+        the same results for the first result to be reused.
+
+        Leaves are identified by their LazyFunc instance, operations by their
+        operator and operands, and constants by value.
+        """
+        if self._shared is None:
+            node_slots = {instruction.slot for instruction in self.instructions}
+            slot_keys = [
+                None if slot in node_slots else _constant_key(value)
+                for slot, value in enumerate(self.template)
+            ]
+            first_index = {}
+            self._shared = []
+            for index, instruction in enumerate(self.instructions):
+                if instruction.operands:
+                    key = (instruction.func,) + tuple(
+                        slot_keys[slot] for slot in instruction.operands
+                    )
+                else:
+                    key = ("leaf", id(instruction.node))
+                first = first_index.setdefault(key, index)
+                slot_keys[instruction.slot] = first
+                pairs = tuple(
+                    (slot, first_slot)
+                    for slot, first_slot in zip(
+                        instruction.operands, self.instructions[first].operands
+                    )
+                    if slot in node_slots
+                )
+                self._shared.append((first, pairs))
+        return self._shared
+
+    def run_shared(self, args, kwargs, stats=None):
+        """Evaluate the program like `run`, but evaluate identical
+        sub-expressions called with the same arguments only once."""
+        instructions = self.instructions
+        shared = self.shared
+        scopes = {}  # instruction index: scope, for the leaves evaluated first
+        saved = 0
+
+        def evaluate_leaf(index, instruction, scope, values):
+            nonlocal saved
+            first = shared[index][0]
+            scopes[index] = scope
+            if first != index and _same_kwargs(scope, scopes[first]):
+                saved += 1
+                return values[instructions[first].slot]
+            return instruction.func(*args, **scope)
+
+        def apply_operation(index, instruction, values):
+            nonlocal saved
+            first, pairs = shared[index]
+            if first != index and all(values[a] is values[b] for a, b in pairs):
+                saved += 1
+                return values[instructions[first].slot]
+            return instruction.func(*[values[slot] for slot in instruction.operands])
+
+        values = self.execute(args, kwargs, evaluate_leaf, apply_operation)
+        if stats is not None:
+            stats.evaluations += len(instructions) - saved
+            stats.saved += saved
+        return values[-1]
+
+    def _outers_are_plain(self):
+        """Whether no kwargs are set on the plain outers of compositions, in
+        which case their wrapped functions can be called directly."""
+        if self._outers_version != arguments._shared_version:
+            self._outers_version = arguments._shared_version
+            self._outers_shared = any(
+                outer._shared_kwargs is not None for outer in self._outers
+            )
+        return not self._outers_shared and not arguments.kwargs_overrides.get()
+
+    def run_parallel(self, args, kwargs, executor, threshold, stats=None):
+        """Evaluate the program like `run`, but submit the leaves to executor so
+        that independent leaves are evaluated concurrently.
+
+        All leaves only depend on the arguments, so they are submitted at once,
+        and each operation is evaluated in the calling thread as soon as its
+        operands are available. Leaves which took less than threshold seconds
+        the last time they were evaluated run inline instead.
+        """
+        submit = _submitter(executor)
+        futures = {}  # slot: (instruction index, future)
+
+        def evaluate_leaf(index, instruction, scope, values):
+            if self.costs.get(index, threshold) < threshold:
+                result, seconds = _timed(instruction.func, args, scope)
+                self._record(index, seconds, stats)
+                return result
+            future = submit(_timed, instruction.func, args, scope)
+            futures[instruction.slot] = (index, future)
+            return None
+
+        def apply_operation(index, instruction, values):
+            for slot in instruction.operands:
+                if slot in futures:
+                    leaf, future = futures.pop(slot)
+                    values[slot], seconds = future.result()
+                    self._record(leaf, seconds, stats)
+            return instruction.func(*[values[slot] for slot in instruction.operands])
+
+        try:
+            values = self.execute(
+                args, kwargs, evaluate_leaf, apply_operation, leaves_first=True
+            )
+        finally:
+            for _, future in futures.values():
+                future.cancel()
+        if stats is not None:
+            stats.evaluations += len(self.instructions)
+        return values[-1]
+
+    def run_incremental(self, args, kwargs, stats=None):
+        """Evaluate the program like `run`, reusing the results of the previous
+        incremental evaluation for the leaves whose inputs are unchanged.
+
+        A leaf is evaluated again when the positional arguments or its keyword
+        arguments changed. Only the results of the leaves and the root are kept
+        between evaluations, so that intermediate results are not held in
+        memory: if any leaf was evaluated again, every operation is applied
+        again, otherwise the previous result is returned.
+        """
+        evaluations = 0
+
+        def evaluate_leaf(index, instruction, scope, values):
+            nonlocal evaluations
+            scopes[index] = scope
+            if (
+                previous is not None
+                and not changed_args
+                and _unchanged_kwargs(scope, previous_scopes[index])
+            ):
+                return leaves[instruction.slot]
+            evaluations += 1
+            return instruction.func(*args, **scope)
+
+        def apply_operation(index, instruction, values):
+            nonlocal evaluations
+            if not evaluations:  # no leaf changed, nor anything above them
+                return None
+            evaluations += 1
+            return instruction.func(*[values[slot] for slot in instruction.operands])
+
+        with self._incremental_lock:
+            previous = self._previous
+            if previous is not None:
+                previous_args, previous_scopes, leaves, result = previous
+                changed_args = len(args) != len(previous_args) or not all(
+                    map(_unchanged, args, previous_args)
+                )
+            scopes = [None] * len(self.instructions)
+            values = self.execute(
+                args, kwargs, evaluate_leaf, apply_operation, leaves_first=True
+            )
+            if evaluations:
+                result = values[-1]
+            leaves = {
+                instruction.slot: values[instruction.slot]
+                for instruction in self.instructions
+                if not instruction.operands
+            }
+            self._previous = args, scopes, leaves, result
+        if stats is not None:
+            stats.evaluations += evaluations
+            stats.saved += len(self.instructions) - evaluations
+        return result
+
+    async def run_async(self, args, kwargs, to_thread=False, stats=None):
+        """Evaluate the program like `run`, awaiting the results of leaves which
+        are awaitable concurrently with `asyncio.gather`.
+
+        All leaves only depend on the arguments, so every leaf is started
+        before any is awaited. If to_thread is True, synchronous leaves are run
+        in threads with `asyncio.to_thread`, concurrently with the others.
+        """
+        import asyncio
+
+        values = self.template.copy()
+        scopes = self.route(kwargs)
+        slots = []
+        awaitables = []
+        for instruction, scope in zip(self.instructions, scopes):
+            if instruction.operands:
+                continue
+            if to_thread and not is_coroutine_function(instruction.node.func):
+                result = asyncio.to_thread(instruction.func, *args, **scope)
+            else:
+                result = instruction.func(*args, **scope)
+            if inspect.isawaitable(result):
+                slots.append(instruction.slot)
+                awaitables.append(result)
+            else:
+                values[instruction.slot] = result
+        for slot, result in zip(slots, await asyncio.gather(*awaitables)):
+            values[slot] = result
+        for index, instruction in enumerate(self.instructions):
+            if not instruction.operands:
+                continue
+            operands = [values[slot] for slot in instruction.operands]
+            if index in self._async_compositions:
+                operator = instruction.node._operator
+                func = instruction.func
+                if getattr(operator.outer, "acall", None) is not None:  # a LazyFunc
+                    func = operator.bind(
+                        partial(operator.outer.acall, to_thread=to_thread)
+                    )
+                values[instruction.slot] = await func(*operands)
+            else:
+                values[instruction.slot] = instruction.func(*operands)
+        if stats is not None:
+            stats.evaluations += len(self.instructions)
+        return values[-1]
+
+    def _record(self, index, seconds, stats):
+        self.costs[index] = seconds
+        if stats is not None:
+            stats.add_timing(self.instructions[index].node.description, seconds)
+
+
+def is_coroutine_function(func):
+    """Whether calling func returns a coroutine, including for instances of
+    classes with an `async def __call__`."""
+    return inspect.iscoroutinefunction(func) or inspect.iscoroutinefunction(
+        getattr(func, "__call__", None)
+    )
+
+
+def _has_async_outer(node):
+    """Whether node is a composition whose outer callable is a coroutine
+    function, or a LazyFunc with leaves or outer callables which are."""
+    outer = getattr(node._operator, "outer", None)
+    if getattr(outer, "_walk_dependencies", None) is None:  # not a LazyFunc
+        return outer is not None and is_coroutine_function(outer)
+    return any(
+        is_coroutine_function(other.func) if other.is_leaf else _has_async_outer(other)
+        for other in outer._walk_dependencies()
+    )
+
+
+def _timed(func, args, kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _submitter(executor):
+    """Return a function submitting calls of `_timed` to executor. Calls
+    submitted to threads run in a copy of the current context, so that they see
+    the kwargs set on LazyFuncs in the calling thread. Other executors pickle
+    the calls, so functions decorated with LazyFunc are sent by reference."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    if isinstance(executor, ThreadPoolExecutor):
+
+        def submit(func, leaf, *args):
+            return executor.submit(copy_context().run, func, leaf, *args)
+
+    else:
+
+        def submit(func, leaf, *args):
+            return executor.submit(func, serialization.by_reference(leaf), *args)
+
+    return submit
+
+
+def _constant_key(value):
+    try:
+        hash(value)
+    except TypeError:  # unhashable, e.g. arrays
+        return ("constant", id(value))
+    return ("constant", type(value), value)
+
+
+def _unchanged(a, b):
+    """Whether argument a is unchanged from b: equal if hashable, such as
+    numbers and strings, otherwise the same object."""
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    try:
+        hash(a)
+    except TypeError:
+        return False
+    return a == b
+
+
+def _unchanged_kwargs(a, b):
+    if a is b:
+        return True
+    return a.keys() == b.keys() and all(_unchanged(a[key], b[key]) for key in a)
+
+
+def _same_kwargs(a, b):
+    if a is b:
+        return True
+    return a.keys() == b.keys() and all(a[key] is b[key] for key in a)
+
+
+def plain_outer(node):
+    """Return the outer LazyFunc of a composition node if it is a leaf which is
+    neither memoized nor has kwargs set at initialisation, otherwise None.
+
+    Until kwargs are set on it, calling a plain outer is equivalent to calling
+    its wrapped function, as tree changes such as memoizing it or swapping its
+    function rebuild the programs.
+    """
+    outer = getattr(node._operator, "outer", None)
+    if (
+        getattr(outer, "_apply", None) is None  # not a LazyFunc
+        or outer._operator is not None
+        or outer._cache is not None
+        or outer._default_kwargs
+    ):
+        return None
+    return outer
+
+
+def get_program(root):
+    """Return the cached program of root, compiling it if required."""
+    program = root._program
+    if program is None or not program.is_current():
+        program = root._program = Program(root)
+    return program
@@ -0,0 +1,128 @@
+"""Evaluation of LazyFunc expression trees over large arrays in reused buffers.
+
+Evaluating `a * b * c / 50` with arrays allocates a new array for every
+operation. Here, operations with ndarray operands are instead applied with the
+equivalent NumPy ufunc, writing into a buffer owned by the evaluation:
+
+- the buffer of an operand computed by a previous operation, when it has the
+  shape and dtype of the result,
+- otherwise a buffer released by an earlier operation, or a new array.
+
+Every result in the expression tree is consumed by a single operation, so once
+an operation has been applied, the buffers of its operands are free to reuse.
+The results of leaves are never written into, since they may be the arguments
+themselves or cached results. Operations on anything other than ndarrays and
+scalars are evaluated as usual.
+"""
+
+import numbers
+
+# operators which apply elementwise, by the name of the equivalent ufunc
+UFUNC_NAMES = {
+    "__pow__": "power",
+    "__pos__": "positive",
+    "__neg__": "negative",
+    "__invert__": "invert",
+    "__mul__": "multiply",
+    "__truediv__": "true_divide",
+    "__floordiv__": "floor_divide",
+    "__mod__": "remainder",
+    "__add__": "add",
+    "__sub__": "subtract",
+    "__rshift__": "right_shift",
+    "__lshift__": "left_shift",
+    "__and__": "bitwise_and",
+    "__xor__": "bitwise_xor",
+    "__or__": "bitwise_or",
+    "__lt__": "less",
+    "__le__": "less_equal",
+    "__gt__": "greater",
+    "__ge__": "greater_equal",
+    "__ne__": "not_equal",
+    "__eq__": "equal",
+}
+
+
+def run_fused(program, args, kwargs, stats=None):
+    """Evaluate program like `Program.run`, applying operations between arrays
+    in reused buffers.
+
+    Args:
+        program: The `Program` to evaluate.
+        args: Positional arguments passed to every leaf.
+        kwargs: Keyword arguments of the root.
+        stats: Optional `EvaluationStats` the number of evaluated nodes is
+            added to.
+    """
+    import numpy as np
+
+    ufuncs = [
+        (
+            getattr(np, UFUNC_NAMES[instruction.node.operator.name], None)
+            if instruction.operands and instruction.node.operator.name in UFUNC_NAMES
+            else None
+        )
+        for instruction in program.instructions
+    ]
+    owned = [False] * len(program.template)  # whether a value is a buffer of this call
+    free = []  # buffers released by the operations
+
+    def apply_operation(index, instruction, values):
+        operands = [values[operand] for operand in instruction.operands]
+        # drop the references to consumed values, so that leaf results are freed
+        for operand in instruction.operands:
+            values[operand] = None
+        ufunc = ufuncs[index]
+        if ufunc is None or not _fusible(np, operands):
+            return instruction.func(*operands)
+        shape = np.broadcast_shapes(*[np.shape(operand) for operand in operands])
+        # apply the ufunc to empty arrays to resolve the dtype of the result
+        dtype = ufunc(
+            *[
+                (
+                    np.empty(0, operand.dtype)
+                    if isinstance(operand, np.ndarray)
+                    else operand
+                )
+                for operand in operands
+            ]
+        ).dtype
+        released = [
+            operand
+            for slot, operand in zip(instruction.operands, operands)
+            if owned[slot]
+        ]
+        out = _take(released, shape, dtype)
+        if out is None:
+            out = _take(free, shape, dtype)
+        if out is None:
+            out = np.empty(shape, dtype)
+        result = ufunc(*operands, out=out)
+        owned[instruction.slot] = True
+        free.extend(released)
+        return result
+
+    values = program.execute(args, kwargs, apply_operation=apply_operation)
+    if stats is not None:
+        stats.evaluations += len(program.instructions)
+    return values[-1]
+
+
+def _fusible(np, operands):
+    """Whether all operands are ndarrays or scalars, and at least one of them is
+    an ndarray."""
+    has_array = False
+    for operand in operands:
+        if type(operand) is np.ndarray:
+            has_array = True
+        elif not isinstance(operand, (numbers.Number, np.generic)):
+            return False
+    return has_array
+
+
+def _take(buffers, shape, dtype):
+    """Remove and return a buffer of the given shape and dtype from buffers."""
+    for i, buffer in enumerate(buffers):
+        if buffer.shape == shape and buffer.dtype == dtype:
+            return buffers.pop(i)
+    return None
@@ -0,0 +1,123 @@
+"""Structural hashing of LazyFunc expression trees.
+
+The digest of a leaf is computed from the identity of its callable, and the
+digest of an operation from its operator and the digests of its operands, in
+expression order. Constant operands contribute their type and representation if
+hashable, otherwise their identity, like arrays, and compositions their outer
+callable like a leaf. Descriptions and default kwargs
+given by the user are included too, while kwargs set with `set_kwargs` are not.
+Digests are 128 bit BLAKE2b hashes, so trees with equal digests are taken to be
+equal.
+
+Digests are computed when first needed, from the bottom up, and cached on the
+nodes along with the tree epoch, so comparing two trees again takes constant
+time, and hashing a tree extended from hashed ones only computes the new nodes.
+Trees are not hashed as they are built, which would use memory for every node of
+large generated expressions. Cached digests are recomputed after a leaf callable
+is swapped, which changes the digest of the trees containing the leaf, so the
+leaves of trees used as dict keys must not be swapped.
+
+With commutative set, the operands of additions and multiplications are sorted,
+so that `f + g` and `g + f` have the same digest. This assumes they commute for
+the values the leaves return, as for numbers and arrays but not strings.
+"""
+
+from hashlib import blake2b
+
+from lazyfunc import arguments
+
+COMMUTATIVE = ("__add__", "__mul__", "sum", "prod")
+# cached digests are the bytes of the tree epoch they were computed at, followed
+# by the plain digest, and the commutative digest once computed, with missing
+# digests zeroed
+_PLAIN, _COMMUTATIVE = 8, 24  # offsets of the digests in the cached bytes
+_SIZE = 16
+_MISSING = bytes(_SIZE)
+
+
+def digest(root, commutative=False):
+    """Return the digest of the expression tree rooted at root, computing the
+    digests of the nodes which are not cached from the bottom up."""
+    field = _COMMUTATIVE if commutative else _PLAIN
+    prefix = arguments._tree_epoch.to_bytes(8, "little")
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if _cached(node, field, prefix) is not None:
+            continue
+        if expanded or node._operator is None:
+            _store(node, field, prefix, _compute(node, field, prefix))
+        else:  # compute the digests of the operands first
+            stack.append((node, True))
+            stack.extend(
+                (operand, False) for operand in node._operands if callable(operand)
+            )
+    return _cached(root, field, prefix)
+
+
+def _cached(node, field, prefix):
+    cached = node._digest
+    if cached is None or not cached.startswith(prefix):
+        return None
+    value = cached[field : field + _SIZE]
+    return value if value and value != _MISSING else None
+
+
+def _store(node, field, prefix, value):
+    cached = node._digest
+    if cached is None or not cached.startswith(prefix):
+        cached = prefix + _MISSING
+    if field == _PLAIN:
+        node._digest = prefix + value + cached[_COMMUTATIVE:]
+    else:
+        node._digest = cached[:_COMMUTATIVE] + value
+
+
+def _compute(node, field, prefix):
+    """Return the digest of node, given the cached digests of its operands."""
+    if node._operator is None:
+        parts = [b"leaf %d;" % id(node._func)]
+    else:
+        operator = node._operator
+        parts = [operator.name.encode()]
+        if operator.name == "compose":  # the outer callable and its arguments
+            outer = operator.outer
+            if hasattr(outer, "_digest"):  # a LazyFunc
+                parts.append(b"outer" + digest(outer))
+            else:
+                parts.append(b"outer %d;" % id(outer))
+            parts.extend(_constant(arg) for arg in operator.args)
+            for name, value in sorted(operator.kwargs.items()):
+                parts.append(_sized(b"k", name.encode()))
+                parts.append(_constant(value))
+        for operand in node._operands:
+            if callable(operand):
+                parts.append(b"n" + _cached(operand, field, prefix))
+            else:
+                parts.append(_constant(operand))
+        if field == _COMMUTATIVE and operator.name in COMMUTATIVE:
+            parts[1:] = sorted(parts[1:])
+    if node._description is not None:
+        parts.append(_sized(b"d", node._description.encode()))
+    if node._default_kwargs:
+        for name, value in sorted(node._default_kwargs.items()):
+            parts.append(_sized(b"k", name.encode()))
+            parts.append(_constant(value))
+    return blake2b(b"".join(parts), digest_size=_SIZE).digest()
+
+
+def _constant(value):
+    """Return the bytes identifying a constant: its type and representation if
+    hashable, otherwise its identity."""
+    if type(value) is int:  # the most common constants
+        return b"int %d;" % value
+    try:
+        hash(value)
+    except TypeError:  # unhashable, e.g. arrays
+        return b"id %d;" % id(value)
+    return _sized(b"%d" % id(type(value)), repr(value).encode())
+
+
+def _sized(tag, data):
+    """Return data prefixed by tag and its length, to keep parts unambiguous."""
+    return b"%s%d:%s" % (tag, len(data), data)
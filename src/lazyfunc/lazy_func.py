@@ -1,9 +1,32 @@
+import copy
 import inspect
+import sys
+import weakref
+from functools import lru_cache, partial
 from warnings import warn
 
-from lazyfunc.arguments import ARGUMENT_ORDER
-from lazyfunc.operators import operators
-from lazyfunc.utils import add_parentheses, callable_name, insert
+from lazyfunc import arguments, differentiation, hashing, serialization, streaming
+from lazyfunc.arguments import (
+    ARGUMENT_ORDER,
+    NO_KWARGS,
+    assign_kwargs,
+    current_kwargs,
+    enter_kwargs,
+    exit_kwargs,
+    in_with_statement,
+    invalidate_trees,
+    kwargs_overrides,
+    push_kwargs,
+    shared_kwargs,
+)
+from lazyfunc.batch import run_batched
+from lazyfunc.compiler import compile_function, is_current
+from lazyfunc.evaluation import get_program, is_coroutine_function
+from lazyfunc.fusion import run_fused
+from lazyfunc.memoize import ResultCache, call_memoized
+from lazyfunc.operators import Composition, nary_operators, operators
+from lazyfunc.simplify import simplify
+from lazyfunc.utils import callable_name
 
 
 class LazyFuncMeta(type):
@@ -11,8 +34,7 @@ class LazyFuncMeta(type):
         for operator in operators:
             attrs[operator.name] = mcs.lazy_func_method_factory(operator)
             if operator.has_reverse:
-                reverse_operator_name = insert(operator.name, "r", index=2)
-                attrs[reverse_operator_name] = mcs.lazy_func_method_factory(
+                attrs[operator.reverse_name] = mcs.lazy_func_method_factory(
                     operator, reverse=True
                 )
         return super().__new__(mcs, name, bases, attrs)
@@ -23,14 +45,9 @@ class LazyFuncMeta(type):
         are bound to LazyFunc."""
 
         def inner(*instances):
-            new_func = LazyFuncMeta.new_function(operator, *instances)
-            new_func.__signature__ = LazyFuncMeta.build_new_signature(instances)
-            new_desc = LazyFuncMeta.description_from_operator(
-                operator, *instances, reverse=reverse
-            )
-            mf = LazyFunc(func=new_func, description=new_desc)
-            mf._precedence = operator.precedence
-            return mf
+            if reverse:
+                instances = instances[::-1]
+            return LazyFunc.from_operator(operator, *instances)
 
         if operator.number_of_operands == 1:
             operation_description = operator.format("self")
@@ -49,100 +66,391 @@ class LazyFuncMeta(type):
         return inner
 
     @staticmethod
-    def new_function(operator, *instances):
-        def inner(*args, **kwargs):
-            operator_args = []
-            for obj in instances:
-                if not callable(obj):
-                    operator_args.append(obj)
-                else:
-                    callable_kwargs = {}
-                    for key in kwargs:
-                        if key in inspect.signature(obj).parameters:
-                            callable_kwargs[key] = kwargs[key]
-                    operator_args.append(obj(*args, **callable_kwargs))
-            return operator.func(*operator_args)
+    def describe(node):
+        """Returns a string describing the expression tree rooted at node.
 
-        return inner
+        The precedence of each operation is compared to the precedence of the
+        last operation on each of its operands to determine whether
+        parentheses are required. The tree is traversed iteratively, writing
+        each part of the description once, so describing a tree takes linear
+        time in its size regardless of its depth.
+        """
+        parts = []
+        stack = [(False, node)]  # (is text, text or operand)
+        while stack:
+            is_text, item = stack.pop()
+            if is_text:
+                parts.append(item)
+            elif not isinstance(item, LazyFunc):
+                parts.append(str(item))
+            elif item._operator is None or item._has_description():
+                parts.append(item.description)
+            else:
+                precedence = item._operator.precedence
+                template = item._operator.layout(len(item._operands))
+                for part in reversed(template):
+                    if isinstance(part, str):
+                        stack.append((True, part))
+                        continue
+                    operand = item._operands[part]
+                    operand_precedence = getattr(operand, "_precedence", None)
+                    if (
+                        operand_precedence is not None
+                        and operand_precedence < precedence
+                        and item._operator.name != "compose"
+                    ):
+                        stack.extend([(True, ")"), (False, operand), (True, "(")])
+                    else:
+                        stack.append((False, operand))
+        return "".join(parts)
 
     @staticmethod
-    def description_from_operator(operator, *instances, reverse):
-        """Returns a string describing the function resulting from combining
-        self and other through the specified operation.
+    def build_new_signature(instances):
+        """Return the signature of an operation on instances, merged from the
+        cached signatures of its callable operands."""
+        signatures = [obj.__signature__ for obj in instances if callable(obj)]
+        first, *others = signatures
+        first_params = first.parameters
+        if all(
+            name in first_params
+            for signature in others
+            for name in signature.parameters
+        ):  # nothing to merge, as for most operations in large expressions
+            return first
+        combined_params = {}
+        for kind in ARGUMENT_ORDER:  # positional arguments must come first
+            for signature in signatures:  # parameters of earlier operands first
+                for name, param in signature.parameters.items():
+                    if param.kind == kind and name not in combined_params:
+                        combined_params[name] = param
+        # share the signature of an operand when it is unchanged by merging
+        for signature in others:
+            params = signature.parameters
+            if len(params) == len(combined_params) and all(
+                a is b for a, b in zip(params.values(), combined_params.values())
+            ):
+                return signature
+        return intern_signature(inspect.Signature(parameters=combined_params.values()))
 
-        The precedence of the operation is compared to the precedence of
-        the last operation on self and other to determine whether
-        parentheses are required.
-        """
-        descriptions = [
-            LazyFuncMeta._get_desc(instance, operator.precedence)
-            for instance in instances
-        ]
 
-        if reverse:
-            descriptions = reversed(descriptions)
-        return operator.format(*descriptions)
+def intern_signature(signature):
+    """Return the first of the recently seen signatures equal to signature, so
+    that leaves wrapping the same function share one signature object."""
+    try:
+        return _interned_signature(signature)
+    except TypeError:  # unhashable default values
+        return signature
 
-    @staticmethod
-    def _get_desc(instance, operator_precedence):
-        if callable(instance):
-            desc = callable_name(instance)
-        else:
-            desc = str(instance)
 
-        precedence = getattr(instance, "_precedence", None)
-        if precedence is None:
-            pass
-        elif precedence < operator_precedence:
-            desc = add_parentheses(desc)
+@lru_cache(maxsize=1024)
+def _interned_signature(signature):
+    return signature
 
-        return desc
 
-    @staticmethod
-    def build_new_signature(instances):
-        callables = [obj for obj in instances if callable(obj)]
-        if len(callables) == 1:
-            return instances[0].__signature__
-        else:  # build new signature merging any duplicated arguments
-            combined_params = {}
-            instance_parameters = [
-                inspect.signature(obj).parameters for obj in callables
-            ]
-            for (
-                kind
-            ) in (
-                ARGUMENT_ORDER
-            ):  # positional arguments must come first, default arguments must come last
-                for (
-                    params
-                ) in (
-                    instance_parameters
-                ):  # arguments of same kind from first instance come before last
-                    # instance
-                    for name, param in params.items():
-                        if param.kind == kind and name not in combined_params:
-                            combined_params[name] = param
-            return inspect.Signature(parameters=combined_params.values())
+def leaf_signature(func):
+    """Return the interned signature of func, cached by func since the leaves of
+    large models often wrap the same few functions. The cache only holds weak
+    references, so that it does not keep the functions of deleted models alive,
+    except for callables which cannot be weakly referenced, such as builtins and
+    numpy ufuncs, of which the most recent are kept."""
+    try:
+        return _leaf_signatures[func]
+    except KeyError:
+        signature = _signature(func)
+        _leaf_signatures[func] = signature
+        return signature
+    except TypeError:  # unhashable, or cannot be weakly referenced
+        pass
+    try:
+        return _static_leaf_signature(func)
+    except TypeError:  # unhashable callables
+        return _signature(func)
+
+
+@lru_cache(maxsize=256)
+def _static_leaf_signature(func):
+    return _signature(func)
+
+
+def _signature(func):
+    """Return the interned signature of func, or a signature taking any
+    arguments for callables without one, such as some builtins. No keyword
+    arguments are routed to these, as they have no named parameters."""
+    try:
+        return intern_signature(inspect.signature(func))
+    except ValueError:
+        return ANY_ARGUMENTS
+
+
+ANY_ARGUMENTS = inspect.Signature(
+    [
+        inspect.Parameter("args", inspect.Parameter.VAR_POSITIONAL),
+        inspect.Parameter("kwargs", inspect.Parameter.VAR_KEYWORD),
+    ]
+)
+
+
+_leaf_signatures = weakref.WeakKeyDictionary()  # func: interned signature
+
+
+# attributes of every node, held in slots since models may have very many nodes
+NODE_ATTRIBUTES = (
+    "_func",
+    "_description",
+    "_default_kwargs",
+    "_shared_kwargs",
+    "_precedence",
+    "_operator",
+    "_operands",
+    "_signature",
+    "_signature_epoch",
+    "_generated_description",
+    "_digest",
+    "_program",
+    "_compiled",
+    "_cache",
+    "_fast",
+    "vectorized",
+)
 
 
 class LazyFunc(metaclass=LazyFuncMeta):
-    """Operations between callables, with lazy evaluation."""
+    """Operations between callables, with lazy evaluation.
+
+    Attributes:
+        vectorized: Whether the wrapped callable accepts arrays of arguments,
+            stacked along a leading axis, when evaluated with `map`. Defaults
+            to False.
+
+    A LazyFunc is a node in an expression tree. Leaves wrap a callable, while
+    nodes produced by operations hold the operator and its operands (other
+    LazyFunc instances or constants) in expression order. Composed nodes are
+    evaluated iteratively from a flattened program, see `lazyfunc.evaluation`.
+    """
+
+    __slots__ = NODE_ATTRIBUTES + ("__weakref__",)
 
     def __init__(self, func, description=None, **kwargs):
-        self.func = func
+        self._func = func
+        if type(description) is str:
+            description = sys.intern(description)
         self._description = description
-        self._kwargs = self._default_kwargs = kwargs
+        self._default_kwargs = kwargs if kwargs else NO_KWARGS
+        self._shared_kwargs = None  # set with set_kwargs, see lazyfunc.arguments
         self._precedence = None
+        self._operator = None
+        self._operands = ()
+        self._signature = None  # cached signature, merged for operations
+        self._signature_epoch = None  # tree epoch the signature was cached at
+        self._generated_description = None  # (tree epoch, description)
+        self._digest = None  # cached digests, see lazyfunc.hashing
+        self._program = None
+        self._compiled = None
+        self._cache = None
+        self._fast = None if kwargs else func  # see _bind_fast_path
+        self.vectorized = False
+
+    @classmethod
+    def from_operator(cls, operator, *operands):
+        """Return the node applying operator to the operands, which are given in
+        expression order. Callable operands which are not already LazyFunc
+        instances are wrapped as leaves."""
+        operands = tuple(
+            LazyFunc(obj) if callable(obj) and not isinstance(obj, LazyFunc) else obj
+            for obj in operands
+        )
+        mf = cls(func=None)
+        mf._operator = operator
+        mf._operands = operands
+        mf._signature = LazyFuncMeta.build_new_signature(operands)
+        mf._signature_epoch = arguments._tree_epoch
+        mf._precedence = operator.precedence
+        return mf
+
+    @classmethod
+    def sum(cls, terms):
+        """Return the sum of terms as a single node, rather than the chain of
+        additions built by the builtin `sum`, so that models with many terms
+        are built and evaluated in time linear in the number of terms.
+
+        Terms are added from left to right, in a single buffer when they are
+        all arrays of the same shape and dtype.
+
+        Examples:
+            >>> def line(energy, *, index):
+            ...     return index * energy
+            >>> terms = [LazyFunc(line, index=i) for i in range(1, 4)]
+            >>> f = LazyFunc.sum(terms)
+            >>> f(2)
+            12
+
+        Args:
+            terms: Iterable of callables and constants, including at least one
+                callable.
+        """
+        return cls._nary(nary_operators[0], terms)
+
+    @classmethod
+    def prod(cls, factors):
+        """Return the product of factors as a single node, like `sum`.
+
+        Examples:
+            >>> @LazyFunc
+            ... def spectrum(energy):
+            ...     return energy
+            >>> LazyFunc.prod([spectrum, 2, spectrum])(3)
+            18
+
+        Args:
+            factors: Iterable of callables and constants, including at least
+                one callable.
+        """
+        return cls._nary(nary_operators[1], factors)
+
+    @classmethod
+    def _nary(cls, operator, operands):
+        operands = tuple(operands)
+        if not any(callable(operand) for operand in operands):
+            raise ValueError(f"{operator.name} requires at least one callable")
+        if len(operands) == 1:
+            (operand,) = operands
+            return operand if isinstance(operand, LazyFunc) else cls(operand)
+        return cls.from_operator(operator, *operands)
+
+    @property
+    def is_leaf(self) -> bool:
+        """Whether the LazyFunc wraps a callable rather than an operation."""
+        return self._operator is None
+
+    @property
+    def operator(self):
+        """The `lazyfunc.operators.Operator` applied by this node, or None for
+        leaves."""
+        return self._operator
+
+    @property
+    def operands(self) -> tuple:
+        """The operands of this node in expression order, empty for leaves."""
+        return self._operands
+
+    @property
+    def func(self):
+        """The wrapped callable. For nodes produced by operations, a callable
+        evaluating the expression tree."""
+        if self._operator is None:
+            return self._func
+        return self._evaluate
+
+    @func.setter
+    def func(self, func):
+        self._func = func
+        self._operator = None
+        self._operands = ()
+        self._signature = None
+        self._program = None
+        self._bind_fast_path()
+        invalidate_trees(self, swapped=True)
+
+    def walk(self):
+        """Yield every distinct LazyFunc in the expression tree, starting from
+        self, with each node before its operands."""
+        seen = set()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            yield node
+            stack.extend(
+                operand
+                for operand in reversed(node._operands)
+                if isinstance(operand, LazyFunc)
+            )
+
+    def _walk_dependencies(self):
+        """Yield every distinct LazyFunc the results of self depend on: the
+        nodes of its tree, and of the trees of the outer LazyFuncs of its
+        compositions."""
+        seen = set()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            yield node
+            stack.extend(
+                operand for operand in node._operands if isinstance(operand, LazyFunc)
+            )
+            outer = getattr(node._operator, "outer", None)
+            if isinstance(outer, LazyFunc):
+                stack.append(outer)
+
+    def _copy(self):
+        """Return a new LazyFunc with the same state as self."""
+        copy = object.__new__(type(self))
+        for name in NODE_ATTRIBUTES:
+            setattr(copy, name, getattr(self, name))
+        if hasattr(self, "__dict__"):  # instances of subclasses
+            copy.__dict__.update(self.__dict__)
+        return copy
+
+    def _evaluate(self, *args, **kwargs):
+        return get_program(self).run(args, kwargs)
 
     @property
     def __signature__(self):
-        return inspect.signature(self.func)
+        if self._signature_epoch == arguments._tree_epoch:
+            return self._signature
+        if self._operator is None:
+            self._signature = leaf_signature(self._func)
+            self._signature_epoch = arguments._tree_epoch
+        else:
+            # merge the signatures of out of date operations from the bottom up,
+            # rather than recursing from the top down
+            stale = [
+                node
+                for node in self.walk()
+                if node._operator is not None
+                and node._signature_epoch != arguments._tree_epoch
+            ]
+            for node in reversed(stale):
+                node._signature = LazyFuncMeta.build_new_signature(node._operands)
+                node._signature_epoch = arguments._tree_epoch
+        return self._signature
+
+    @property
+    def parameters(self):
+        """Read-only mapping of the names of the parameters of the LazyFunc to
+        their `inspect.Parameter`, merged from the leaves for operations.
+
+        The signature of each node is computed once, from the cached
+        signatures of its operands, and shared with other nodes where equal.
+
+        Examples:
+            >>> @LazyFunc
+            ... def spectrum(energy, *, temperature):
+            ...     return energy / temperature
+            >>> scale = LazyFunc(lambda energy, scale=1: scale)
+            >>> list((spectrum * 2 + scale).parameters)
+            ['energy', 'scale', 'temperature']
+        """
+        return self.__signature__.parameters
+
+    def _has_description(self):
+        """Whether the description of self is known without generating it."""
+        return self._description is not None or (
+            self._generated_description is not None
+            and self._generated_description[0] == arguments._tree_epoch
+        )
 
     @property
     def description(self) -> str:
         """Defaults to the name of the wrapped callable, but can be set by the
         user at object initialisation. Also updated when operations are applied
-        with other callables.
+        with other callables, in which case it is generated from the
+        expression tree when first accessed.
 
         Examples:
             >>> def my_function(x):
@@ -157,10 +465,16 @@ class LazyFunc(metaclass=LazyFuncMeta):
         Returns:
             A string describing the wrapped function.
         """
-        if self._description is None:
-            return callable_name(self.func)
-        else:
+        if self._description is not None:
             return self._description
+        if self._operator is None:
+            return callable_name(self.func)
+        if not self._has_description():
+            self._generated_description = (
+                arguments._tree_epoch,
+                LazyFuncMeta.describe(self),
+            )
+        return self._generated_description[1]
 
     @property
     def __name__(self) -> str:
@@ -173,7 +487,11 @@ class LazyFunc(metaclass=LazyFuncMeta):
     def __call__(self, *args, **kwargs) -> object:
         """Either calls the wrapped function with the provided args and kwargs,
         or if the first argument is a callable, returns a new LazyFunc object
-        of LazyFunc(args[0](self)).
+        of LazyFunc(args[0](self)), see `of`.
+
+        Evaluation checks for kwargs set at initialisation or with
+        `set_kwargs` before merging them with kwargs, so that calls of leaves
+        without any cost little more than calling the wrapped function.
 
         When calling a LazyFunc instance, if the first argument is NOT a callable, it
         behaves exactly as the unwrapped callable.
@@ -204,44 +522,643 @@ class LazyFunc(metaclass=LazyFuncMeta):
         Returns: Either the result of the wrapped function evaluated with the
         supplied args and _kwargs, or a new LazyFunc instance.
         """
-        if callable(args[0]):
-            operator_precedence = 17
-            other_func, *args = args
-
-            def new_func(*x):
-                return self.func(other_func(*x), *args, **kwargs)
-
-            new_desc = (
-                LazyFuncMeta._get_desc(self, operator_precedence)
-                + "("
-                + callable_name(other_func)
-                + ")"
+        if args and callable(args[0]):
+            return self.of(*args, **kwargs)
+        fast = self._fast
+        if fast is not None and not kwargs_overrides.get():
+            return fast(*args, **kwargs)
+        return self._call(args, kwargs)
+
+    def _apply(self, *args, **kwargs):
+        """Evaluate self like `__call__`, but never compose with a callable
+        first argument, for compositions with self as the outer callable."""
+        fast = self._fast
+        if fast is not None and not kwargs_overrides.get():
+            return fast(*args, **kwargs)
+        return self._call(args, kwargs)
+
+    def _call(self, args, kwargs):
+        """Evaluate self past the fast path of `__call__` and `_apply`."""
+        # the kwargs supplied to the call take precedence over those set
+        # elsewhere, which are only merged in when there are any
+        if (
+            self._default_kwargs is not NO_KWARGS
+            or self._shared_kwargs is not None
+            or kwargs_overrides.get()
+        ):
+            kwargs = self._kwargs | kwargs
+        if self._cache is not None:
+            return call_memoized(self, *args, **kwargs)
+        if self._operator is None:
+            return self._func(*args, **kwargs)
+        program = self._program
+        if program is None or program.epoch != arguments._program_epoch:
+            program = get_program(self)
+        return program.run(args, kwargs)
+
+    def _bind_fast_path(self):
+        """Bind the callable that calls of self hand their arguments to
+        directly, when no kwargs are set with a with statement in the current
+        context: the wrapped callable of leaves without kwargs or cache, or
+        otherwise None. Rebound whenever any of them changes."""
+        if (
+            self._operator is None
+            and self._cache is None
+            and self._default_kwargs is NO_KWARGS
+            and self._shared_kwargs is None
+        ):
+            self._fast = self._func
+        else:
+            self._fast = None
+
+    def of(self, func, *args, **kwargs):
+        """Return a new LazyFunc composing self with func, which evaluates
+        self(func(*x, **y), *args, **kwargs) when called with the arguments x
+        and keyword arguments y.
+
+        The composition is a node of the expression tree like an operation, so
+        the keyword arguments of calls are routed to func, and chains such as
+        f(g(h)) are evaluated in a single loop. Calling a LazyFunc with a
+        callable first argument composes them the same way, but `of` composes
+        explicitly, whatever the type of func.
+
+        Examples:
+            >>> @LazyFunc
+            ... def double(x):
+            ...     return 2 * x
+            >>> f = double.of(abs)
+            >>> f
+            LazyFunc(double(abs))
+            >>> f(-3)
+            6
+            >>> scaled = double.of(lambda x, *, scale: scale * x)
+            >>> scaled(3, scale=2)
+            12
+
+        Args:
+            func: The inner callable.
+            args: Positional arguments passed to self after the result of func.
+            kwargs: Keyword arguments passed to self.
+        """
+        return LazyFunc.from_operator(Composition(self, args, kwargs), func)
+
+    def evaluate(
+        self,
+        *args,
+        cse=False,
+        executor=None,
+        threshold=1e-4,
+        fuse=False,
+        incremental=False,
+        stats=None,
+        **kwargs,
+    ):
+        """Evaluate the LazyFunc with the given arguments, like calling it, but
+        with control over how the expression is evaluated.
+
+        Examples:
+            >>> from lazyfunc import EvaluationStats
+            >>> @LazyFunc
+            ... def spectrum(x):
+            ...     return 2 * x
+            >>> f = spectrum * 3 + spectrum * 4
+            >>> stats = EvaluationStats()
+            >>> f.evaluate(1, cse=True, stats=stats)
+            14
+            >>> stats
+            EvaluationStats(evaluations=4, saved=1)
+
+            In a sweep over one keyword argument, only the leaves depending on
+            it are evaluated again, along with the operations:
+
+            >>> @LazyFunc
+            ... def shape(x, *, temperature):
+            ...     return x / temperature
+            >>> g = spectrum * shape
+            >>> g.evaluate(1, incremental=True, temperature=2)
+            1.0
+            >>> stats = EvaluationStats()
+            >>> g.evaluate(1, incremental=True, temperature=4, stats=stats)
+            0.5
+            >>> stats
+            EvaluationStats(evaluations=2, saved=1)
+
+        Args:
+            args: Positional arguments passed to every leaf.
+            cse: If True, sub-expressions occurring several times in the
+                expression (the same leaf, or the same operation on the same
+                operands) are only evaluated once per call.
+            executor: A `concurrent.futures.Executor` the leaves are submitted
+                to, so that independent leaves which release the GIL, or run in
+                other processes, are evaluated concurrently. Operations are
+                evaluated in the calling thread as their operands complete. The
+                leaves must be picklable for process pools.
+            threshold: When using an executor, leaves which took less than
+                threshold seconds on the previous evaluation run inline.
+            fuse: If True, operations on NumPy arrays are applied with ufuncs
+                writing into a small pool of buffers reused across the
+                expression, rather than allocating a new array per operation.
+                Requires numpy.
+            incremental: If True, the results of the leaves and the result of
+                the previous incremental evaluation are kept, and only the
+                leaves depending on arguments which changed since are evaluated
+                again, followed by the operations. Intermediate results are not
+                kept. A leaf depends only on the positional arguments and the
+                keyword arguments it accepts.
+                Arguments are compared by equality if hashable, otherwise by
+                identity, so arrays modified in place are not detected. The
+                leaves must always return the same result for the same
+                arguments.
+            stats: An `EvaluationStats` instance in which the number of
+                evaluated and saved nodes, and the time spent in each leaf when
+                using an executor, is accumulated.
+            kwargs: Keyword arguments routed to the leaves which accept them.
+
+        Returns:
+            The result of the evaluated expression.
+        """
+        final_kwargs = self._kwargs | kwargs
+        if self._operator is None or self._cache is not None:
+            if stats is not None:
+                stats.evaluations += 1
+            return self(*args, **final_kwargs)
+        program = get_program(self)
+        if cse + fuse + incremental + (executor is not None) > 1:
+            raise ValueError(
+                "only one of cse, executor, fuse and incremental can be used"
             )
-            mf = LazyFunc(func=new_func, description=new_desc)
-            mf._precedence = operator_precedence
-            return mf
-        else:  # when the function is called the kwargs supplied to the call take
-            # precedence over those set elsewhere
-            final_kwargs = self._kwargs | kwargs
-            return self.func(*args, **final_kwargs)
+        if incremental:
+            return program.run_incremental(args, final_kwargs, stats)
+        if fuse:
+            return run_fused(program, args, final_kwargs, stats)
+        if executor is not None:
+            return program.run_parallel(args, final_kwargs, executor, threshold, stats)
+        if cse:
+            return program.run_shared(args, final_kwargs, stats)
+        return program.run(args, final_kwargs, stats)
+
+    async def acall(self, *args, to_thread=False, stats=None, **kwargs):
+        """Evaluate the LazyFunc in an asyncio event loop, for expressions with
+        leaves which are coroutine functions.
+
+        Every leaf is started before any is awaited, and the awaitable results
+        are gathered with `asyncio.gather`, so independent leaves waiting on
+        I/O run concurrently. Operations are then applied in the event loop.
+
+        Examples:
+            >>> import asyncio
+            >>> @LazyFunc
+            ... async def calibration(energy):
+            ...     await asyncio.sleep(0.01)
+            ...     return 2 * energy
+            >>> f = calibration * 3 + 1
+            >>> asyncio.run(f.acall(2))
+            13
+
+        Args:
+            args: Positional arguments passed to every leaf.
+            to_thread: If True, synchronous leaves are run in threads with
+                `asyncio.to_thread`, concurrently with the other leaves, rather
+                than blocking the event loop.
+            stats: An `EvaluationStats` instance in which the number of
+                evaluated nodes is accumulated.
+            kwargs: Keyword arguments routed to the leaves which accept them.
+
+        Returns:
+            The result of the evaluated expression.
+        """
+        program = get_program(self)
+        return await program.run_async(args, self._kwargs | kwargs, to_thread, stats)
+
+    def map(self, args_grid=None, kwargs_grid=None, *, args=(), **kwargs):
+        """Evaluate the LazyFunc at every point of a grid of arguments, and
+        return the results stacked along the first axis. Requires numpy.
+
+        Instead of evaluating the whole expression per grid point, leaves which
+        do not accept any batched argument are evaluated once, leaves marked as
+        `vectorized` are evaluated once with the stacked arguments, and only
+        the remaining leaves are evaluated per grid point.
+
+        Examples:
+            >>> import numpy as np
+            >>> @LazyFunc
+            ... def spectrum(energy, *, temperature):
+            ...     return np.exp(-energy / temperature)
+            >>> @LazyFunc
+            ... def transmission(energy):
+            ...     return energy / 10
+            >>> spectrum.vectorized = True
+            >>> f = spectrum * transmission
+            >>> energy = np.linspace(0, 10, 5)
+            >>> result = f.map(kwargs_grid={"temperature": [1, 2, 3]}, args=(energy,))
+            >>> result.shape
+            (3, 5)
+            >>> np.allclose(result[1], f(energy, temperature=2))
+            True
+
+        Args:
+            args_grid: Sequence with a tuple of positional arguments per grid
+                point. If None, args are used for every grid point.
+            kwargs_grid: Mapping of keyword argument names to sequences with a
+                value per grid point.
+            args: Positional arguments used for every grid point, when
+                args_grid is None.
+            kwargs: Keyword arguments used for every grid point.
+
+        Returns:
+            Array of the results, with the grid points along the first axis.
+        """
+        final_kwargs = self._kwargs | kwargs
+        return run_batched(
+            get_program(self), args, final_kwargs, args_grid, kwargs_grid or {}
+        )
+
+    def stream(self, source, chunk_size=65536, out=None, **kwargs):
+        """Evaluate the LazyFunc chunk by chunk over a large input, such as a
+        memory-mapped array, so that memory use is bounded by the chunk size.
+
+        Examples:
+            >>> import numpy as np
+            >>> @LazyFunc
+            ... def spectrum(energy, *, temperature):
+            ...     return np.exp(-energy / temperature)
+            >>> f = spectrum * 2
+            >>> energy = np.linspace(0, 10, 1000)
+            >>> chunks = list(f.stream(energy, chunk_size=300, temperature=5))
+            >>> [len(chunk) for chunk in chunks]
+            [300, 300, 300, 100]
+            >>> out = f.stream(energy, 300, out=np.empty(1000), temperature=5)
+            >>> np.array_equal(out, f(energy, temperature=5))
+            True
+
+        Args:
+            source: An array, such as a `numpy.memmap`, split into chunks of
+                chunk_size along its first axis, or any other iterable yielding
+                chunks, such as a generator.
+            chunk_size: Number of rows of array sources per chunk.
+            out: None to yield the result of each chunk, or an array the
+                results are written into along its first axis, or the path
+                of a `.npy` file to create as a memory-mapped array of the
+                length of source for the results, for array sources only.
+                Requires numpy.
+            kwargs: Keyword arguments the LazyFunc is called with, on top of
+                those set with `set_kwargs` when stream is called.
+
+        Returns:
+            A generator of the results of each chunk if out is None, otherwise
+            the array the results were written into.
+        """
+        final_kwargs = self._kwargs | kwargs
+        if out is None:
+            return streaming.stream(self, source, chunk_size, final_kwargs)
+        return streaming.write(self, source, chunk_size, final_kwargs, out)
+
+    def grad(self, wrt, step=differentiation.DEFAULT_STEP):
+        """Return a new LazyFunc evaluating the derivative of self with respect
+        to a keyword argument, see `lazyfunc.differentiation`.
+
+        The derivative is built from the derivative rules of the operators and
+        shares the sub-expressions of self, so evaluating it with
+        `evaluate(cse=True)` computes each of them once. Leaves are
+        differentiated with the derivatives registered with `set_derivative`,
+        or else by central finite differences.
+
+        Examples:
+            >>> import math
+            >>> @LazyFunc
+            ... def spectrum(energy, *, temperature):
+            ...     return math.exp(-energy / temperature)
+            >>> @spectrum.set_derivative("temperature")
+            ... def spectrum_temperature(energy, *, temperature):
+            ...     return energy / temperature**2 * math.exp(-energy / temperature)
+            >>> @LazyFunc
+            ... def transmission(energy):
+            ...     return 0.5
+            >>> f = 3 * spectrum * transmission
+            >>> df = f.grad("temperature")
+            >>> df
+            LazyFunc(3 * dspectrum/dtemperature * transmission)
+            >>> round(df(2, temperature=1), 6)
+            0.406006
+
+        Args:
+            wrt: Name of the keyword argument to differentiate with respect to.
+            step: Relative step of finite differences.
+
+        Returns:
+            A new LazyFunc, with the kwargs set on the nodes of self.
+        """
+        return differentiation.grad(self, wrt, step)
+
+    def set_derivative(self, wrt, derivative=None):
+        """Register the derivative of the callable wrapped by this leaf with
+        respect to its keyword argument wrt, used by `grad` for every leaf
+        wrapping the callable. Can be used as a decorator.
+
+        Args:
+            wrt: Name of the keyword argument.
+            derivative: Callable taking the same arguments as the wrapped
+                callable and returning its derivative.
+
+        Returns:
+            The derivative, or if it is not given, a decorator registering the
+            function it is applied to.
+        """
+        if self._operator is not None:
+            raise TypeError(
+                "derivatives can only be set on leaves, those of operations "
+                "follow from their operands"
+            )
+        if derivative is None:
+            return partial(self.set_derivative, wrt)
+        differentiation.set_derivative(self._func, wrt, derivative)
+        return derivative
+
+    def memoize(self, maxsize=128, maxbytes=None, arrays="content", tree=False):
+        """Cache the results of the LazyFunc, keyed on the positional arguments
+        and the keyword arguments it is evaluated with, including those set
+        with `set_kwargs` on any node of its expression tree. Cached results
+        are discarded when a leaf callable is swapped.
+
+        When a memoized node is part of a larger expression, a cache hit skips
+        evaluating all of its operands. Memoizing the whole tree therefore
+        turns repeated evaluations of any unchanged sub-expression into
+        lookups.
+
+        Examples:
+            >>> @LazyFunc
+            ... def model(energy, *, temperature):
+            ...     return energy / temperature
+            >>> f = (model * 2).memoize(maxsize=2)
+            >>> f(1, temperature=4), f(1, temperature=4), f(2, temperature=4)
+            (0.5, 0.5, 1.0)
+            >>> info = f.cache_info()
+            >>> info.hits, info.misses, info.currsize
+            (1, 2, 2)
+
+        Args:
+            maxsize: Maximum number of cached results per node, or None for no
+                limit. Least recently used results are evicted first.
+            maxbytes: Maximum total size in bytes of the cached results per
+                node, or None for no limit.
+            arrays: "content" to key array arguments on a digest of their
+                data, or "identity" to key them on the array object.
+            tree: If True, memoize every node of the expression tree rather
+                than only self, each with its own cache.
+
+        Returns:
+            self
+        """
+        nodes = list(self.walk()) if tree else [self]
+        if any(node.is_leaf and is_coroutine_function(node.func) for node in nodes):
+            raise TypeError("coroutine function leaves cannot be memoized")
+        for node in nodes:
+            node._cache = ResultCache(maxsize, maxbytes, arrays)
+            node._bind_fast_path()
+            invalidate_trees(node, swapped=False)
+        return self
+
+    def unmemoize(self, tree=False):
+        """Stop caching the results of the LazyFunc, or of every node of the
+        expression tree if tree is True, and discard the cached results."""
+        for node in list(self.walk()) if tree else [self]:
+            node._cache = None
+            node._bind_fast_path()
+            invalidate_trees(node, swapped=False)
+        return self
+
+    def cache_info(self):
+        """Return the hits, misses, evictions and size of the cache of a
+        memoized LazyFunc, or None if it is not memoized."""
+        if self._cache is not None:
+            return self._cache.info()
+
+    def cache_clear(self):
+        """Discard the cached results and statistics of a memoized LazyFunc."""
+        if self._cache is not None:
+            self._cache.clear()
+
+    def to_json(self):
+        """Return the expression graph of the LazyFunc as compact JSON.
+
+        Leaves are stored by the import path of their callable, so they must be
+        importable functions or classes, and constants and kwargs must be
+        numbers, strings, None, complex numbers, lists, tuples or numpy values.
+        Models only need to be picklable to be sent to other processes, since
+        pickling also serializes the expression graph, with leaf callables
+        pickled by reference. Kwargs set with `set_kwargs` are those of the
+        context the LazyFunc is serialized in, which for executors is not
+        the thread submitting it.
+
+        Examples:
+            >>> from math import exp
+            >>> f = LazyFunc(exp) * 2 + 1
+            >>> f.to_json()
+            '{"version":1,"nodes":[{"leaf":"math:exp"},{"op":"__mul__","args":[0,{"c":2}]},{"op":"__add__","args":[1,{"c":1}]}]}'
+            >>> LazyFunc.from_json(f.to_json())(0)
+            3.0
+
+        Returns:
+            The JSON string.
+        """
+        return serialization.dumps(self)
+
+    @classmethod
+    def from_json(cls, text, cache=True):
+        """Return the LazyFunc serialized by `to_json`.
+
+        Args:
+            text: The JSON string.
+            cache: If True, decoded graphs are cached by a digest of text, so
+                loading the same model again only builds a new LazyFunc from
+                the cached graph. Unpickled graphs are always cached.
+
+        Returns:
+            The deserialized LazyFunc.
+        """
+        return serialization.loads(text, cache)
+
+    def __reduce__(self):
+        return serialization.reduce(self)
+
+    def __copy__(self):
+        return self._copy()
+
+    def __deepcopy__(self, memo):
+        graph = copy.deepcopy(serialization.to_graph(self), memo)
+        return serialization.from_graph(graph)
+
+    def simplify(self):
+        """Return an equivalent LazyFunc with redundant operations removed.
+
+        Operations on constants only are folded, numeric constants of nested
+        additions and multiplications are combined, identities such as `f * 1`
+        or `f + 0` and unary plus are removed and double negations collapsed.
+        The description is rebuilt from the simplified expression. The
+        rewrites assume the leaves return numbers or arrays of numbers, and
+        combining constants may round float results differently, so they are
+        only applied when asked for. Memoized nodes are left as they are.
+
+        Examples:
+            >>> @LazyFunc
+            ... def spectrum(energy):
+            ...     return 2 * energy
+            >>> f = -(-(2 * (3 * spectrum) + 0)) * 1
+            >>> f.simplify()
+            LazyFunc(6 * spectrum)
+            >>> f.simplify()(4) == f(4)
+            True
+
+        Returns:
+            The simplified LazyFunc, sharing unchanged sub-expressions with
+            self, or self if nothing can be simplified.
+        """
+        return simplify(self)
+
+    def compile(self):
+        """Return a single flat Python function equivalent to calling self.
+
+        The source of the function is generated from the expression tree, with
+        one statement per node, and executed once. Compared to calling the
+        LazyFunc this avoids all per-node dispatch, which matters in tight
+        loops such as numerical integration. The operations are applied
+        exactly as in the expression, call `simplify` first to remove redundant
+        ones. A memoized LazyFunc compiles to a lookup in its cache. The
+        compiled function is cached until a leaf is swapped or kwargs are set
+        on any LazyFunc.
+
+        Examples:
+            >>> @LazyFunc
+            ... def spectrum(energy, *, temperature):
+            ...     return energy / temperature
+            >>> f = spectrum * 3 / 50
+            >>> compiled = f.compile()
+            >>> print(compiled.source)
+            def compiled(*_lf_args, temperature=_lf_MISSING, **_lf_kwargs):
+                if _lf_kwargs:
+                    return _lf_fallback(_lf_args, _lf_kwargs, temperature=temperature)
+                if temperature is _lf_MISSING:
+                    raise TypeError("missing required keyword argument 'temperature'")
+                _lf_t0 = _lf_c2(*_lf_args, temperature=temperature)
+                _lf_t2 = _lf_t0 * 3
+                _lf_t4 = _lf_t2 / 50
+                return _lf_t4
+            >>> compiled(100, temperature=2) == f(100, temperature=2)
+            True
+
+        Returns:
+            The compiled function, taking the positional arguments of the leaves
+            and their keyword-only arguments. Defaults set with kwargs or
+            `set_kwargs` when compiling are baked in.
+        """
+        compiled = self._compiled
+        if compiled is None or not is_current(compiled):
+            compiled = self._compiled = compile_function(self)
+        return compiled
+
+    @property
+    def _kwargs(self):
+        frames = kwargs_overrides.get()
+        if frames:
+            return current_kwargs(self, frames)
+        return shared_kwargs(self)
 
     def set_kwargs(self, **kwargs):
-        self._kwargs = kwargs
+        """Set the keyword arguments the LazyFunc is called with by default,
+        replacing those given at initialisation.
+
+        Called in a with statement, the kwargs are only ever held in a context
+        variable, so they only apply to the current thread or asyncio task
+        within the block, and one shared LazyFunc can be evaluated concurrently
+        with different kwargs. The previous kwargs are restored on exit, and
+        contexts may be nested. Otherwise, the kwargs are set for every thread,
+        like an attribute of the LazyFunc, unless they are set within a with
+        block of the same LazyFunc, in which case they last until its end.
+        Whether the call is the context expression of a with statement is read
+        from the calling code, so `with f.set_kwargs(...)` scopes the kwargs
+        to the block while `cm = f.set_kwargs(...)` sets them for every thread.
+
+        Examples:
+            >>> @LazyFunc
+            ... def spectrum(energy, *, temperature=1):
+            ...     return energy / temperature
+            >>> with spectrum.set_kwargs(temperature=2):
+            ...     with spectrum.set_kwargs(temperature=4):
+            ...         print(spectrum(8))
+            ...     print(spectrum(8))
+            2.0
+            4.0
+            >>> spectrum(8)
+            8.0
+            >>> spectrum.set_kwargs(temperature=8)(8)
+            1.0
+
+        Returns:
+            self
+        """
+        if in_with_statement(sys._getframe(1)):
+            push_kwargs(self, kwargs)
+        else:
+            assign_kwargs(self, kwargs)
         return self
 
     def __enter__(self):
+        enter_kwargs(self)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._kwargs = self._default_kwargs
+        exit_kwargs(self)
+
+    def digest(self, commutative=False) -> bytes:
+        """Return the structural hash of the expression tree, see
+        `lazyfunc.hashing`.
+
+        Digests are equal for trees applying the same operators to the same
+        leaf callables and constants, even if the nodes are distinct objects.
+        The digest of each node is computed the first time it is needed, and
+        cached until a leaf callable is swapped.
+
+        Examples:
+            >>> @LazyFunc
+            ... def spectrum(energy):
+            ...     return energy
+            >>> (spectrum * 2 + 1).digest() == (spectrum * 2 + 1).digest()
+            True
+            >>> (1 + spectrum * 2).digest() == (spectrum * 2 + 1).digest()
+            False
+            >>> (1 + 2 * spectrum).digest(commutative=True) == (
+            ...     spectrum * 2 + 1
+            ... ).digest(commutative=True)
+            True
+
+        Args:
+            commutative: If True, the operands of additions and
+                multiplications are sorted, so that their order does not
+                change the digest.
+
+        Returns:
+            A 16 byte digest.
+        """
+        return hashing.digest(self, commutative)
 
-    def is_equal(self, other: callable) -> bool:
+    def __hash__(self):
+        """Hash of the structure of the expression tree, so that LazyFuncs can
+        be used as dict keys: equal structures map to the same entry.
+
+        Like the digest, the hash changes if a leaf callable of the tree is
+        swapped, so the leaves of trees used as dict keys must not be swapped.
+        """
+        return hash(hashing.digest(self))
+
+    def is_equal(self, other: callable, commutative=False) -> bool:
         """Checks for equality between self and other.
 
         To stay consistent with LazyFunc's other dunder methods, the `__eq__` method
         lazily compares equality between the wrapped LazyFunc and other. Therefore,
         this method exists to check whether two unevaluated LazyFunc objects are
-        equal, without calling them and comparing the results.
+        equal, without calling them and comparing the results. They are equal if
+        their expression trees have the same structure, compared by their
+        cached `digest`.
 
         Examples:
             >>> def my_function(x):
@@ -253,16 +1170,20 @@ class LazyFunc(metaclass=LazyFuncMeta):
             True
             >>> lf_auto_1.is_equal(lf_named)
             False
+
+        Args:
+            other: The LazyFunc to compare with.
+            commutative: If True, the order of the operands of additions and
+                multiplications is ignored.
         """
-        try:
-            equal = self.description == other.description
-        except AttributeError:
+        if not isinstance(other, LazyFunc):
             msg = "Can only compare a LazyFunc instance with another LazyFunc"
             raise TypeError(msg)
 
+        equal = self.digest(commutative) == other.digest(commutative)
         if not equal:
             msg = (
-                "LazyFunc descriptions found to be not equal though may still be "
+                "LazyFunc structures found to be not equal though may still be "
                 "equivalent. "
             )
             warn(msg)
@@ -0,0 +1,197 @@
+"""Bounded caches of LazyFunc results.
+
+Results are keyed on the positional arguments and the keyword arguments a node
+is evaluated with, after merging its kwargs, and on the kwargs set with
+`set_kwargs` on the nodes of its expression tree, which are not part of the
+call. Arrays, which are unhashable, are keyed either by a digest of their
+contents or by their identity. Cached results are discarded once a leaf
+callable is swapped.
+"""
+
+import sys
+import threading
+import weakref
+from collections import OrderedDict, namedtuple
+
+from lazyfunc import arguments
+
+CacheInfo = namedtuple(
+    "CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize", "nbytes"]
+)
+
+ARRAY_KEYS = ("content", "identity")
+
+
+class ResultCache:
+    """Least recently used cache of results, bounded by the number of entries
+    and by their total size in bytes.
+
+    Args:
+        maxsize: Maximum number of entries, or None for no limit.
+        maxbytes: Maximum total size of the cached results, or None for no
+            limit. The size of results with an `nbytes` attribute, such as
+            arrays, is taken from it, otherwise from `sys.getsizeof`.
+        arrays: How array arguments are keyed, either "content" to hash their
+            data, or "identity" to use the array object itself, which is faster
+            but misses in-place modifications.
+    """
+
+    def __init__(self, maxsize=128, maxbytes=None, arrays="content"):
+        if arrays not in ARRAY_KEYS:
+            raise ValueError(f"arrays must be one of {ARRAY_KEYS}, not {arrays!r}")
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.arrays = arrays
+        self._entries = OrderedDict()  # key: (result, nbytes, referenced arrays)
+        self._lock = threading.RLock()
+        self._nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self.epoch = arguments._tree_epoch
+        self._members = {}  # id(node): (weak reference, whether in the tree)
+
+    def lookup(self, func, args, kwargs, overrides=()):
+        """Return func(*args, **kwargs), from the cache if possible.
+
+        Args:
+            overrides: Sequence of (identifier, kwargs) pairs of other kwargs
+                the result depends on, which are part of the key.
+        """
+        references = []
+        try:
+            key = (
+                tuple(self._key(arg, references) for arg in args),
+                tuple((name, self._key(kwargs[name], references)) for name in kwargs),
+            )
+            if overrides:
+                key += tuple(
+                    (identifier, self._kwargs_key(values, references))
+                    for identifier, values in overrides
+                )
+        except TypeError:  # unhashable argument which is not an array
+            with self._lock:
+                self.misses += 1
+            return func(*args, **kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        result = func(*args, **kwargs)
+        self._store(key, result, references)
+        return result
+
+    def _kwargs_key(self, kwargs, references):
+        return tuple((name, self._key(kwargs[name], references)) for name in kwargs)
+
+    def _key(self, value, references):
+        try:
+            hash(value)
+        except TypeError:
+            if not hasattr(value, "nbytes"):
+                raise
+        else:
+            return type(value), value
+        if self.arrays == "identity":
+            references.append(value)  # keep the id unique while cached
+            return "array", id(value)
+        import hashlib  # deferred, since it is slow to import
+
+        try:
+            data = memoryview(value).cast("B")
+        except (TypeError, ValueError):  # not C-contiguous
+            data = value.tobytes()
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        return "array", type(value), value.shape, str(value.dtype), digest
+
+    def _store(self, key, result, references):
+        nbytes = getattr(result, "nbytes", None)
+        if not isinstance(nbytes, int):
+            nbytes = sys.getsizeof(result)
+        if self.maxsize == 0 or (self.maxbytes is not None and nbytes > self.maxbytes):
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (result, nbytes, references)
+            self._nbytes += nbytes
+            while (self.maxsize is not None and len(self._entries) > self.maxsize) or (
+                self.maxbytes is not None and self._nbytes > self.maxbytes
+            ):
+                _, (_, evicted_nbytes, _) = self._entries.popitem(last=False)
+                self._nbytes -= evicted_nbytes
+                self.evictions += 1
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(
+                self.hits,
+                self.misses,
+                self.evictions,
+                self.maxsize,
+                len(self._entries),
+                self._nbytes,
+            )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def discard(self):
+        """Discard the cached results, keeping the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self._members.clear()
+
+
+def call_memoized(node, /, *args, **kwargs):
+    """Evaluate the memoized node with args and its merged kwargs, from its
+    cache if possible.
+
+    The kwargs set with `set_kwargs` on the nodes below node are part of the
+    key, and the cached results are discarded when a leaf callable of the tree
+    is swapped.
+    """
+    cache = node._cache
+    if cache.epoch != arguments._tree_epoch:
+        swapped = arguments.swapped_since(cache.epoch)
+        if swapped and _in_tree(node, swapped):
+            cache.discard()
+        cache.epoch = arguments._tree_epoch
+    frames = arguments.kwargs_overrides.get()
+    overridden = [frame[0] for frame in frames]
+    if arguments._shared_nodes:
+        overridden.extend(arguments.shared_nodes())
+    overrides = ()
+    if overridden:
+        overrides = [
+            (id(other), arguments.current_kwargs(other, frames))
+            for other in _in_tree(node, overridden)
+            if other is not node  # its kwargs are merged into kwargs already
+        ]
+        overrides.sort(key=lambda override: override[0])
+    return cache.lookup(node.func, args, kwargs, overrides)
+
+
+def _in_tree(root, nodes):
+    """Return the distinct nodes which belong to the expression tree of root,
+    including the outer LazyFuncs of its compositions, walking the tree only for
+    nodes which were not seen before."""
+    members = root._cache._members
+    unknown = {
+        id(node): node
+        for node in nodes
+        if id(node) not in members or members[id(node)][0]() is not node
+    }
+    if unknown:
+        found = {
+            id(other) for other in root._walk_dependencies() if id(other) in unknown
+        }
+        for key, node in unknown.items():
+            members[key] = weakref.ref(node), key in found
+    distinct = {id(node): node for node in nodes}
+    return [node for key, node in distinct.items() if members[key][1]]
@@ -1,61 +1,104 @@
-import inspect
 import operator
-from functools import cached_property
-from string import ascii_lowercase
+import sys
+from functools import reduce
+from string import Formatter, ascii_lowercase
 
-from lazyfunc.utils import insert
+from lazyfunc.utils import add_parentheses, callable_name, insert
 
 
 def has_dunder(name):
     return name.startswith("__") and name.endswith("__")
 
 
-DUNDER_METHODS = [
-    func_name
-    for func_name, _ in inspect.getmembers(operator, inspect.isbuiltin)
-    if has_dunder(func_name)
-]
+DUNDER_METHODS = frozenset(
+    func_name for func_name in vars(operator) if has_dunder(func_name)
+)
+
+
+def count_parameters(func):
+    """Return the number of parameters of a builtin function.
+
+    Reads the text signature directly, e.g. "($module, a, b, /)", since
+    `inspect.signature` is comparatively slow for builtins and dominated the
+    time to import lazyfunc.
+    """
+    parameters = func.__text_signature__.strip("()").split(",")
+    return sum(
+        1 for parameter in parameters if parameter.strip() not in ("$module", "/")
+    )
 
 
 class Operator:
+    """An operation which can be applied between LazyFunc instances.
+
+    All properties of the operation are resolved once when the operator is
+    created, so that building and describing expressions only reads
+    attributes.
+
+    Attributes:
+        name: Name of the dunder method, e.g. `__add__`.
+        precedence: Precedence of the operation in Python expressions.
+        func: The function in the `operator` module applying the operation.
+        number_of_operands: Number of operands the operation takes.
+        has_reverse: Whether the operation has a reflected variant, e.g.
+            `__radd__`.
+        has_inplace_variant: Whether the operation has an in-place variant,
+            e.g. `__iadd__`.
+        template: The format of the operation as a list of literal strings and
+            operand indices, e.g. [0, " * ", 1] for `__mul__`.
+    """
+
+    __slots__ = (
+        "name",
+        "precedence",
+        "func",
+        "number_of_operands",
+        "has_reverse",
+        "has_inplace_variant",
+        "reverse_name",
+        "inplace_name",
+        "template",
+        "_format_string",
+    )
+
     def __init__(self, name, precedence, has_reverse=None):
         self.name = name
         self.precedence = precedence
-        self._has_reverse = has_reverse
-
-    @cached_property
-    def func(self):
-        return getattr(operator, self.name)
-
-    @property
-    def number_of_operands(self):
-        sig = inspect.signature(self.func)
-        return len(sig.parameters)
-
-    @property
-    def has_reverse(self):
-        if self._has_reverse is None:
-            return (
-                self.number_of_operands == 2
-            )  # most dyadic operators have reverse variants
-        else:
-            return self._has_reverse
-
-    @property
-    def has_inplace_variant(self):
-        inplace_name = insert(self.name, "i", 2)
-        return inplace_name in DUNDER_METHODS
+        self.func = getattr(operator, name)
+        self.number_of_operands = count_parameters(self.func)
+        if has_reverse is None:  # most dyadic operators have reverse variants
+            has_reverse = self.number_of_operands == 2
+        self.has_reverse = has_reverse
+        self.reverse_name = insert(name, "r", 2)
+        self.inplace_name = insert(name, "i", 2)
+        self.has_inplace_variant = self.inplace_name in DUNDER_METHODS
 
-    def format(self, *values):
         doc_template = (
             self.func.__doc__.removeprefix("Same as ")
             .removesuffix(".")
             .removesuffix(", for a and b sequences")  # concat
             .removesuffix(" (note reversed operands)")
         )  # contains
-        for i, (char, _) in enumerate(zip(ascii_lowercase, values)):
+        for i, char in enumerate(ascii_lowercase[: self.number_of_operands]):
             doc_template = doc_template.replace(char, f"{{{i}}}")
-        return doc_template.format(*values)
+        self._format_string = doc_template
+
+        self.template = []
+        for literal, field, _, _ in Formatter().parse(doc_template):
+            if literal:
+                self.template.append(literal)
+            if field is not None:
+                self.template.append(int(field))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name!r})"
+
+    def layout(self, n):
+        """Return the template of the operation, which takes n operands."""
+        return self.template
+
+    def format(self, *values):
+        return self._format_string.format(*values)
 
 
 # https://docs.python.org/3/reference/expressions.html#operator-precedence
@@ -83,3 +126,143 @@ operators = [
     Operator("__ne__", precedence=7, has_reverse=False),
     Operator("__eq__", precedence=7, has_reverse=False),
 ]
+
+
+class NaryOperator:
+    """An associative operation applied to any number of operands at once, for
+    expressions built from many terms with `LazyFunc.sum` or `LazyFunc.prod`.
+
+    Has the attributes of `Operator` which apply, with `number_of_operands`
+    set to None. Operands are combined from left to right with the binary
+    operator. When they are all arrays of the same shape and dtype, the result
+    of the first operation is updated in place by the others, rather than
+    allocating a new array for each of them.
+    """
+
+    __slots__ = (
+        "name",
+        "precedence",
+        "func",
+        "number_of_operands",
+        "has_reverse",
+        "has_inplace_variant",
+        "separator",
+        "_binary",
+        "_inplace",
+    )
+
+    def __init__(self, name, binary_name, separator, precedence):
+        self.name = name
+        self.precedence = precedence
+        self.number_of_operands = None
+        self.has_reverse = False
+        self.has_inplace_variant = False
+        self.separator = separator
+        self._binary = getattr(operator, binary_name)
+        self._inplace = getattr(operator, insert(binary_name, "i", 0))
+        self.func = self.apply
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name!r})"
+
+    def apply(self, *values):
+        np = sys.modules.get("numpy")  # arrays imply numpy is already imported
+        if np is not None and len(values) > 2:
+            first = values[0]
+            if type(first) is np.ndarray and all(
+                type(value) is np.ndarray
+                and value.shape == first.shape
+                and value.dtype == first.dtype
+                for value in values
+            ):
+                result = self._binary(first, values[1])
+                for value in values[2:]:
+                    result = self._inplace(result, value)
+                return result
+        return reduce(self._binary, values)
+
+    def layout(self, n):
+        """Return the template of the operation on n operands."""
+        template = [0]
+        for i in range(1, n):
+            template.extend([self.separator, i])
+        return template
+
+    def format(self, *values):
+        return self.separator.join(values)
+
+
+nary_operators = [
+    NaryOperator("sum", "add", " + ", precedence=12),
+    NaryOperator("prod", "mul", " * ", precedence=13),
+]
+
+
+class Composition:
+    """The application of a callable to the result of a LazyFunc, for nodes
+    built with `LazyFunc.of`.
+
+    Has the attributes of `Operator` which apply, for a single operand. Unlike
+    the other operators, each composition has its own instance, holding the
+    outer callable and the other arguments it is called with. Its operand is
+    written as a call argument, so it is never parenthesized.
+
+    Attributes:
+        outer: The callable applied to the result of the operand.
+        args: Positional arguments passed to outer after the result.
+        kwargs: Keyword arguments passed to outer.
+    """
+
+    __slots__ = (
+        "name",
+        "precedence",
+        "func",
+        "number_of_operands",
+        "has_reverse",
+        "has_inplace_variant",
+        "outer",
+        "args",
+        "kwargs",
+    )
+
+    def __init__(self, outer, args=(), kwargs=None):
+        self.name = "compose"
+        self.precedence = 17  # a call
+        self.number_of_operands = 1
+        self.has_reverse = False
+        self.has_inplace_variant = False
+        self.outer = outer
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs) if kwargs else {}
+        # a LazyFunc outer is evaluated even if the result is callable, rather
+        # than composed with it
+        self.func = self.bind(getattr(outer, "_apply", outer))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.outer!r})"
+
+    def bind(self, call):
+        """Return the function applying call to a value with the other arguments
+        of outer, in place of outer."""
+        if not (self.args or self.kwargs):  # called directly, without a frame
+            return call
+        args, kwargs = self.args, self.kwargs
+
+        def apply(value):
+            return call(value, *args, **kwargs)
+
+        return apply
+
+    def _outer_description(self):
+        description = callable_name(self.outer)
+        precedence = getattr(self.outer, "_precedence", None)
+        if precedence is not None and precedence < self.precedence:
+            description = add_parentheses(description)
+        return description
+
+    def layout(self, n):
+        """Return the template of the composition, e.g. ["f(", 0, ")"]."""
+        return [self._outer_description() + "(", 0, ")"]
+
+    def format(self, *values):
+        return f"{self._outer_description()}({values[0]})"
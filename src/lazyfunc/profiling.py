@@ -0,0 +1,227 @@
+"""Per-node profiling of LazyFunc evaluations.
+
+While a `Profile` is active, evaluation programs time every node they evaluate
+and record it under its path from the root of the expression: the descriptions
+of the node and of each of its parents. The nodes of LazyFuncs called by a leaf
+are recorded under the path of the leaf, and excluded from its self time. When
+no profile is active, evaluation only checks a context variable once per call.
+"""
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+active_profile = ContextVar("active_profile", default=None)
+# path of the leaf being evaluated, and the seconds spent in LazyFuncs it calls
+_current_leaf = ContextVar("current_leaf", default=((), None))
+
+
+class NodeProfile:
+    """Measurements accumulated for a node.
+
+    Attributes:
+        calls: Number of times the node was evaluated.
+        cumulative: Total seconds spent evaluating the node, including its
+            operands.
+        self: Total seconds spent evaluating the node, excluding its operands.
+        nbytes: Total size of the results of the node, taken from their
+            `nbytes` attribute if any, otherwise from `sys.getsizeof`.
+    """
+
+    __slots__ = ("calls", "cumulative", "self", "nbytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.cumulative = 0.0
+        self.self = 0.0
+        self.nbytes = 0
+
+    def add(self, other):
+        self.calls += other.calls
+        self.cumulative += other.cumulative
+        self.self += other.self
+        self.nbytes += other.nbytes
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({fields})"
+
+
+class Profile:
+    """Measurements of the LazyFuncs evaluated while the profile was active.
+
+    Attributes:
+        paths: `NodeProfile` of each node, by the tuple of descriptions from the
+            root of the evaluated expression to the node.
+    """
+
+    def __init__(self):
+        self.paths = {}
+        self._lock = threading.Lock()
+
+    @property
+    def nodes(self):
+        """`NodeProfile` of each node by description, summed over every path
+        the node was evaluated at."""
+        nodes = {}
+        with self._lock:
+            for path, node in self.paths.items():
+                nodes.setdefault(path[-1], NodeProfile()).add(node)
+        return nodes
+
+    def record(self, path, seconds, self_seconds, result):
+        nbytes = getattr(result, "nbytes", None)
+        if not isinstance(nbytes, int):
+            nbytes = sys.getsizeof(result)
+        with self._lock:
+            node = self.paths.get(path)
+            if node is None:
+                node = self.paths[path] = NodeProfile()
+            node.calls += 1
+            node.cumulative += seconds
+            node.self += self_seconds
+            node.nbytes += nbytes
+
+    def tree(self):
+        """Return the measurements as a table, with the nodes indented under
+        their parents."""
+        lines = [f"{'calls':>8} {'cumulative':>12} {'self':>12} {'bytes':>12}  node"]
+        with self._lock:
+            for path in sorted(self.paths):
+                node = self.paths[path]
+                lines.append(
+                    f"{node.calls:>8} {_format_seconds(node.cumulative):>12} "
+                    f"{_format_seconds(node.self):>12} {node.nbytes:>12}  "
+                    f"{'  ' * (len(path) - 1)}{path[-1]}"
+                )
+        return "\n".join(lines)
+
+    def to_json(self, **kwargs):
+        """Return the measurements as JSON: a list of root nodes, each with its
+        measurements, description and list of children.
+
+        Args:
+            kwargs: Passed to `json.dumps`.
+        """
+        roots = []
+        entries = {}
+        with self._lock:
+            for path in sorted(self.paths):
+                entry = {"description": path[-1], **self.paths[path].as_dict()}
+                entry["children"] = []
+                entries[path] = entry
+                parent = entries.get(path[:-1])
+                (parent["children"] if parent else roots).append(entry)
+        return json.dumps(roots, **kwargs)
+
+    def collapsed(self):
+        """Return the self time of each node in the collapsed stack format read
+        by flame graph tools, one `root;...;node microseconds` line per path."""
+        with self._lock:
+            return "\n".join(
+                f"{';'.join(part.replace(';', ',') for part in path)} "
+                f"{round(node.self * 1e6)}"
+                for path, node in sorted(self.paths.items())
+            )
+
+    def __str__(self):
+        return self.tree()
+
+
+@contextmanager
+def profile():
+    """Context manager profiling the LazyFuncs evaluated inside it, in the
+    current thread or asyncio task.
+
+    Calls of composed LazyFuncs and `evaluate` without options are profiled,
+    while compiled functions and evaluations sharing common sub-expressions,
+    using an executor or fusing array operations are not.
+
+    Examples:
+        >>> import lazyfunc
+        >>> @lazyfunc.LazyFunc
+        ... def spectrum(energy):
+        ...     return 2 * energy
+        >>> f = spectrum * 3 + 1
+        >>> with lazyfunc.profile() as p:
+        ...     f(1)
+        7
+        >>> p.nodes["spectrum"].calls
+        1
+        >>> print(p.collapsed())  # doctest: +SKIP
+        spectrum * 3 + 1 1
+        spectrum * 3 + 1;spectrum * 3 1
+        spectrum * 3 + 1;spectrum * 3;spectrum 2
+
+    Yields:
+        The `Profile` the measurements are recorded in.
+    """
+    profile = Profile()
+    token = active_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        active_profile.reset(token)
+
+
+def run_profiled(program, profile, args, kwargs, stats=None):
+    """Evaluate program like `Program.run`, recording the time spent in each
+    node in profile."""
+    instructions = program.instructions
+    prefix, outer_seconds = _current_leaf.get()
+    paths = [None] * len(instructions)
+    for i in range(len(instructions) - 1, -1, -1):
+        parent = instructions[i].parent
+        base = prefix if parent < 0 else paths[parent]
+        paths[i] = base + (instructions[i].node.description,)
+
+    starts = [0.0] * len(program.template)  # when each result started
+    seconds = [0.0] * len(program.template)
+    node_slots = {instruction.slot for instruction in instructions}
+
+    def evaluate_leaf(index, instruction, scope, values):
+        slot = instruction.slot
+        inner_seconds = [0.0]
+        token = _current_leaf.set((paths[index], inner_seconds))
+        try:
+            starts[slot] = time.perf_counter()
+            result = instruction.func(*args, **scope)
+            seconds[slot] = time.perf_counter() - starts[slot]
+        finally:
+            _current_leaf.reset(token)
+        profile.record(
+            paths[index], seconds[slot], seconds[slot] - inner_seconds[0], result
+        )
+        return result
+
+    def apply_operation(index, instruction, values):
+        slot = instruction.slot
+        result = instruction.func(
+            *[values[operand] for operand in instruction.operands]
+        )
+        end = time.perf_counter()
+        operands = [
+            operand for operand in instruction.operands if operand in node_slots
+        ]
+        starts[slot] = min(starts[operand] for operand in operands)
+        seconds[slot] = end - starts[slot]
+        self_seconds = seconds[slot] - sum(seconds[operand] for operand in operands)
+        profile.record(paths[index], seconds[slot], self_seconds, result)
+        return result
+
+    values = program.execute(args, kwargs, evaluate_leaf, apply_operation)
+    if outer_seconds is not None:
+        outer_seconds[0] += seconds[instructions[-1].slot]
+    if stats is not None:
+        stats.evaluations += len(instructions)
+    return values[-1]
+
+
+def _format_seconds(seconds):
+    return f"{seconds * 1e3:.3f} ms"
@@ -0,0 +1,315 @@
+"""Serialization of LazyFunc expression graphs.
+
+An expression is serialized as a graph: a list of nodes in post order, so that
+operands always come before the operations applied to them, with the root last.
+Nodes shared between several operations are stored once. Each node is a dict
+with either
+
+- "leaf": the wrapped callable, or its import path as "module:qualname" in the
+  JSON form. Functions decorated with LazyFunc at module level are always
+  stored by import path, with "dec" set, since the path imports the LazyFunc
+  wrapping them rather than the function itself,
+- "op": the name of the operator, and "args": its operands, each either the
+  index of an earlier node or {"c": constant}. Compositions also have "outer":
+  the index of an earlier node or {"f": callable}, and optionally "oargs" and
+  "okw" for the other arguments of the outer callable,
+
+and optionally "kw" for its kwargs, "desc" for a description given by the
+user, "vec" for vectorized leaves and "memo" for the arguments of `memoize`.
+
+Pickling a LazyFunc pickles its graph, in which leaf callables are pickled
+by reference as usual. Both forms are decoded through a cache keyed by a digest
+of the serialized graph, so that a worker process receiving the same model
+repeatedly only decodes it once. Each load still builds a new LazyFunc from the
+graph, since models are mutable.
+"""
+
+import importlib
+import json
+import pickle
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from lazyfunc.memoize import ResultCache
+from lazyfunc.operators import Composition, nary_operators, operators
+
+FORMAT_VERSION = 1
+MAX_CACHED_MODELS = 64
+
+_operators_by_name = {
+    operator.name: operator for operator in operators + nary_operators
+}
+_models = OrderedDict()  # digest: decoded graph
+_models_lock = threading.Lock()
+
+
+def to_graph(root, portable=False):
+    """Return the graph of the expression rooted at root.
+
+    Args:
+        root: The LazyFunc to serialize.
+        portable: If True, leaf callables are replaced by their import paths
+            and constants by JSON compatible values.
+    """
+    from lazyfunc.lazy_func import LazyFunc
+
+    index = {}  # id(node): position in nodes
+    decorated = {}  # id(func): import path if decorated with LazyFunc, or None
+    nodes = []
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in index:
+            continue
+        if node._operator is not None and not expanded:
+            stack.append((node, True))
+            stack.extend(
+                (operand, False)
+                for operand in reversed(node._operands)
+                if callable(operand)
+            )
+            outer = getattr(node._operator, "outer", None)
+            if isinstance(outer, LazyFunc):
+                stack.append((outer, False))
+            continue
+        if node._operator is None:
+            func = node._func
+            if id(func) not in decorated:
+                decorated[id(func)] = _decorated_path(func)
+            if decorated[id(func)] is not None:
+                entry = {"leaf": decorated[id(func)], "dec": True}
+            else:
+                entry = {"leaf": import_path(func) if portable else func}
+            if node.vectorized:
+                entry["vec"] = True
+        else:
+            entry = {
+                "op": node._operator.name,
+                "args": [
+                    (
+                        index[id(operand)]
+                        if callable(operand)
+                        else {"c": encode(operand) if portable else operand}
+                    )
+                    for operand in node._operands
+                ],
+            }
+            if node._operator.name == "compose":
+                entry.update(_encode_composition(node._operator, index, portable))
+        kwargs = node._kwargs
+        if kwargs:
+            entry["kw"] = {
+                name: encode(value) if portable else value
+                for name, value in kwargs.items()
+            }
+        if node._description is not None:
+            entry["desc"] = node._description
+        if node._cache is not None:
+            cache = node._cache
+            entry["memo"] = [cache.maxsize, cache.maxbytes, cache.arrays]
+        index[id(node)] = len(nodes)
+        nodes.append(entry)
+    return {"version": FORMAT_VERSION, "nodes": nodes}
+
+
+def from_graph(graph, portable=False):
+    """Return the LazyFunc built from a graph returned by `to_graph`."""
+    from lazyfunc.lazy_func import LazyFunc
+
+    if graph.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported graph version {graph.get('version')!r}")
+    nodes = []
+    for entry in graph["nodes"]:
+        kwargs = entry.get("kw", {})
+        if portable:
+            kwargs = {name: decode(value) for name, value in kwargs.items()}
+        if "leaf" in entry:
+            func = entry["leaf"]
+            if "dec" in entry:
+                func = resolve(func)._func
+            elif portable:
+                func = resolve(func)
+            node = LazyFunc(func, entry.get("desc"), **kwargs)
+            node.vectorized = entry.get("vec", False)
+        else:
+            operands = [
+                (
+                    nodes[arg]
+                    if isinstance(arg, int)
+                    else (decode(arg["c"]) if portable else arg["c"])
+                )
+                for arg in entry["args"]
+            ]
+            if entry["op"] == "compose":
+                operator = _decode_composition(entry, nodes, portable)
+            else:
+                operator = _operators_by_name[entry["op"]]
+            node = LazyFunc.from_operator(operator, *operands)
+            node._description = entry.get("desc")
+            if kwargs:
+                node._default_kwargs = dict(kwargs)
+        if "memo" in entry:
+            node._cache = ResultCache(*entry["memo"])
+            node._bind_fast_path()
+        nodes.append(node)
+    return nodes[-1]
+
+
+def _encode_composition(operator, index, portable):
+    from lazyfunc.lazy_func import LazyFunc
+
+    outer = operator.outer
+    if isinstance(outer, LazyFunc):
+        entry = {"outer": index[id(outer)]}
+    else:
+        entry = {"outer": {"f": import_path(outer) if portable else outer}}
+    if operator.args:
+        entry["oargs"] = [encode(arg) if portable else arg for arg in operator.args]
+    if operator.kwargs:
+        entry["okw"] = {
+            name: encode(value) if portable else value
+            for name, value in operator.kwargs.items()
+        }
+    return entry
+
+
+def _decode_composition(entry, nodes, portable):
+    outer = entry["outer"]
+    if isinstance(outer, int):
+        outer = nodes[outer]
+    else:
+        outer = resolve(outer["f"]) if portable else outer["f"]
+    args = entry.get("oargs", [])
+    kwargs = entry.get("okw", {})
+    if portable:
+        args = [decode(arg) for arg in args]
+        kwargs = {name: decode(value) for name, value in kwargs.items()}
+    return Composition(outer, args, kwargs)
+
+
+def dumps(root):
+    """Return the compact JSON form of the expression rooted at root."""
+    return json.dumps(to_graph(root, portable=True), separators=(",", ":"))
+
+
+def loads(text, cache=True):
+    """Return the LazyFunc serialized by `dumps`.
+
+    Args:
+        text: The JSON string.
+        cache: If True, reuse the graph decoded from the same text if any,
+            otherwise decode it again.
+    """
+    return _load(text.encode(), partial(json.loads, text), cache, portable=True)
+
+
+def load_pickled(payload):
+    """Return the LazyFunc from the pickled graph, used when unpickling."""
+    return _load(payload, partial(pickle.loads, payload), cache=True)
+
+
+def reduce(root):
+    """Return the value of `__reduce__` for root."""
+    return load_pickled, (pickle.dumps(to_graph(root)),)
+
+
+def _load(data, decode, cache, portable=False):
+    if not cache:
+        return from_graph(decode(), portable)
+    import hashlib  # deferred, since it is slow to import
+
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    with _models_lock:
+        graph = _models.get(digest)
+        if graph is not None:
+            _models.move_to_end(digest)
+    if graph is None:
+        graph = decode()
+        with _models_lock:
+            _models[digest] = graph
+            while len(_models) > MAX_CACHED_MODELS:
+                _models.popitem(last=False)
+    return from_graph(graph, portable)
+
+
+def import_path(func):
+    """Return the "module:qualname" path func can be imported from."""
+    module = getattr(func, "__module__", None)
+    qualname = getattr(func, "__qualname__", None)
+    if module is None or qualname is None or "<" in qualname:
+        raise ValueError(f"{func!r} cannot be referenced by an import path")
+    try:
+        found = resolve(f"{module}:{qualname}")
+    except (ImportError, AttributeError):
+        found = None
+    if found is not func and not _wraps(found, func):
+        raise ValueError(f"{func!r} is not importable as {module}:{qualname}")
+    return f"{module}:{qualname}"
+
+
+def _decorated_path(func):
+    """Return the import path of func if it imports the LazyFunc leaf wrapping
+    func, as for functions decorated with LazyFunc, otherwise None."""
+    try:
+        path = import_path(func)
+    except ValueError:
+        return None
+    return None if resolve(path) is func else path
+
+
+def _wraps(obj, func):
+    from lazyfunc.lazy_func import LazyFunc
+
+    return isinstance(obj, LazyFunc) and obj._operator is None and obj._func is func
+
+
+def by_reference(func):
+    """Return func, or a picklable stand-in calling it if it was decorated with
+    LazyFunc at module level, which pickle cannot reference by name."""
+    path = _decorated_path(func)
+    return func if path is None else partial(call_decorated, path)
+
+
+def call_decorated(path, /, *args, **kwargs):
+    """Call the function wrapped by the LazyFunc leaf imported from path."""
+    return resolve(path)._func(*args, **kwargs)
+
+
+def resolve(path):
+    """Return the object imported from a "module:qualname" path."""
+    module_name, _, qualname = path.partition(":")
+    obj = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        obj = getattr(obj, name)
+    return obj
+
+
+def encode(value):
+    """Return value as a JSON compatible value, tagging those which JSON cannot
+    represent directly."""
+    if value is None or type(value) in (bool, int, float, str):
+        return value
+    if type(value) is complex:
+        return {"complex": [value.real, value.imag]}
+    if type(value) in (list, tuple):
+        return {type(value).__name__: [encode(item) for item in value]}
+    if hasattr(value, "dtype") and hasattr(value, "tolist"):  # numpy values
+        return {"array": value.tolist(), "dtype": str(value.dtype)}
+    raise TypeError(f"cannot serialize {type(value).__name__} value {value!r}")
+
+
+def decode(value):
+    """Return the value encoded by `encode`."""
+    if not isinstance(value, dict):
+        return value
+    if "complex" in value:
+        return complex(*value["complex"])
+    if "list" in value:
+        return [decode(item) for item in value["list"]]
+    if "tuple" in value:
+        return tuple(decode(item) for item in value["tuple"])
+    import numpy as np
+
+    array = np.array(value["array"], dtype=value["dtype"])
+    return array if array.ndim else array[()]
@@ -0,0 +1,150 @@
+"""Simplification of LazyFunc expression trees.
+
+Expressions built programmatically often contain operations which do nothing,
+such as `f * 1` or `--f`, or constants which could be combined, such as
+`2 * (3 * f)`. `simplify` rebuilds the tree with these rewrites applied:
+
+- operations on constants only are folded into a constant,
+- numeric constants of nested additions or multiplications are combined,
+- integer identities (`f + 0`, `0 + f`, `f - 0`, `f * 1`, `1 * f`, `f ** 1`)
+  and unary plus are removed,
+- double negation is collapsed.
+
+The rewrites assume the leaves return numbers or arrays of numbers. They are
+not exact for every type: removing `f + 0` keeps bools as they are, and
+combining constants reassociates float operations, which may round results
+differently. `f / 1` is kept since it turns integers into floats, as are
+`f * 1.0` or `f + 0.0`, and combined constants are only dropped when they come
+out as an integer identity. Nodes which
+are memoized are left as they are, along with their operands, and nodes with
+kwargs set are only removed by wrapping their replacement in a leaf with the
+same kwargs.
+"""
+
+import numbers
+
+IDENTITIES = {  # operator name: (identity, whether it applies on the left)
+    "__add__": (0, True),
+    "__sub__": (0, False),
+    "__mul__": (1, True),
+    "__pow__": (1, False),
+}
+ASSOCIATIVE = ("__add__", "__mul__")
+
+
+def simplify(root):
+    """Return the simplified expression tree of root.
+
+    Sub-expressions which are unchanged are shared with the original tree, so
+    if nothing can be simplified root itself is returned.
+    """
+    replacements = {}  # id(node): simplified node
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in replacements:
+            continue
+        if node._operator is None or node._cache is not None:
+            replacements[id(node)] = node
+        elif expanded:
+            operands = [
+                replacements[id(operand)] if callable(operand) else operand
+                for operand in node._operands
+            ]
+            replacements[id(node)] = _simplify_node(node, operands)
+        else:  # simplify the operands before the node itself
+            stack.append((node, True))
+            stack.extend(
+                (operand, False) for operand in node._operands if callable(operand)
+            )
+    return replacements[id(root)]
+
+
+def _simplify_node(node, operands):
+    """Return the replacement of node, given its simplified operands."""
+    operator = node._operator
+    if not any(callable(operand) for operand in operands):
+        return operator.func(*operands)
+    rewrite = _rewrite(operator, operands)
+    if rewrite is not None:
+        replacement, is_new = rewrite
+    elif all(new is old for new, old in zip(operands, node._operands)):
+        return node
+    else:
+        replacement, is_new = type(node).from_operator(operator, *operands), True
+    kwargs = node._kwargs
+    if kwargs:
+        if not is_new:
+            # the replacement is shared with the original tree, so it is wrapped
+            # rather than given the kwargs of node
+            return type(node)(replacement, **kwargs)
+        replacement._default_kwargs = dict(kwargs)
+    return replacement
+
+
+def _rewrite(operator, operands):
+    """Apply the first applicable rewrite to the operation.
+
+    Returns:
+        A tuple of the replacement and whether it is a new node, or None if no
+        rewrite applies.
+    """
+    name = operator.name
+    if name == "__pos__":
+        return operands[0], False
+    if name == "__neg__":
+        (operand,) = operands
+        if _is_plain_operation(operand, "__neg__"):
+            return operand._operands[0], False
+        return None
+    if name in IDENTITIES:
+        identity, left = IDENTITIES[name]
+        x, c = operands
+        if _is_identity(c, identity):
+            return x, False
+        if left and _is_identity(x, identity):
+            return c, False
+    if name in ASSOCIATIVE:
+        return _combine_constants(operator, operands)
+    return None
+
+
+def _combine_constants(operator, operands):
+    """Rewrite `(y op c1) op c2` and its mirrored forms to `y op (c1 op c2)`."""
+    inner, c2 = operands if callable(operands[0]) else operands[::-1]
+    if not _is_number(c2) or not _is_plain_operation(inner, operator.name):
+        return None
+    y, c1 = inner._operands
+    constant_on_left = not callable(y)
+    if constant_on_left:
+        c1, y = y, c1
+    if not _is_number(c1):
+        return None
+    c = operator.func(c1, c2)
+    new_operands = (c, y) if constant_on_left else (y, c)
+    rewrite = _rewrite(operator, new_operands)  # the combined constant may vanish
+    if rewrite is not None:
+        return rewrite
+    return type(inner).from_operator(operator, *new_operands), True
+
+
+def _is_plain_operation(node, name):
+    """Whether node applies the named operator and can be merged into its
+    parent, as it is neither memoized nor has kwargs set."""
+    return (
+        callable(node)
+        and node._operator is not None
+        and node._operator.name == name
+        and node._cache is None
+        and not node._kwargs
+    )
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Number) and not callable(value)
+
+
+def _is_identity(value, identity):
+    """Whether value is the integer identity, as float or bool constants equal
+    to it still change the type of the result, e.g. `f * 1.0` of an integer."""
+    return type(value) is int and value == identity
@@ -0,0 +1,72 @@
+"""Chunked evaluation of LazyFuncs over large inputs.
+
+Arrays, including memory-mapped arrays, are split into chunks along their first
+axis, while other iterables are taken to yield chunks already. Each chunk is
+evaluated separately, so intermediate results are never larger than a chunk,
+and the results are either yielded or written into an output array.
+"""
+
+import os
+
+
+def iter_chunks(source, chunk_size):
+    """Yield the chunks of source: slices of chunk_size along the first axis
+    of arrays, or the items of other iterables."""
+    if hasattr(source, "shape") and hasattr(source, "__getitem__"):
+        for start in range(0, len(source), chunk_size):
+            yield source[start : start + chunk_size]
+    else:
+        yield from source
+
+
+def stream(func, source, chunk_size, kwargs):
+    """Yield func(chunk, **kwargs) for each chunk of source."""
+    for chunk in iter_chunks(source, chunk_size):
+        yield func(chunk, **kwargs)
+
+
+def write(func, source, chunk_size, kwargs, out):
+    """Write func(chunk, **kwargs) for each chunk of source into consecutive
+    rows of out, and return out.
+
+    If out is a path, a `.npy` file is created there, memory-mapped, with the
+    length of source and the dtype and trailing shape of the first result. The
+    length of other iterables than arrays is unknown until they are exhausted,
+    so they must be written into an existing array instead. Results which are
+    scalars, such as reductions of their chunk, cannot be written and raise a
+    ValueError.
+    """
+    import numpy as np
+
+    path = out if isinstance(out, (str, os.PathLike)) else None
+    if path is not None and not hasattr(source, "shape"):
+        raise ValueError(
+            "out can only be a path for array sources, pass an array of the "
+            f"length of the results as out for {type(source).__name__} sources"
+        )
+    start = 0
+    for result in stream(func, source, chunk_size, kwargs):
+        result = np.asarray(result)
+        if result.ndim == 0:
+            raise ValueError(
+                "results must have a row per item of their chunk to be written "
+                "into out, not be scalars"
+            )
+        if path is not None:
+            shape = source.shape[:1] + result.shape[1:]
+            out = np.lib.format.open_memmap(
+                path, mode="w+", dtype=result.dtype, shape=shape
+            )
+            path = None
+        stop = start + len(result)
+        if stop > len(out):
+            raise ValueError(f"out has {len(out)} rows, fewer than the results")
+        out[start:stop] = result
+        start = stop
+    if path is not None:
+        raise ValueError("cannot create out from an empty source")
+    if start != len(out):
+        raise ValueError(f"results have {start} rows, but out has {len(out)}")
+    if hasattr(out, "flush"):
+        out.flush()
+    return out
@@ -36,3 +36,13 @@ def test_combined_keywords():
         f(2, foo=1)
     with pytest.raises(TypeError):
         f(2, 2, foo=1)
+
+
+def test_routing_follows_swapped_callable():
+    g = LazyFunc(square)
+    f = g + 1
+    assert f(2, foo=1) == 6
+    g.func = cube
+    assert f(2, bar=1) == 10
+    with pytest.raises(TypeError):
+        f(2, foo=1)
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+
+from lazyfunc import EvaluationStats, LazyFunc
+
+DELAYS = {"gain": 0.1, "offset": 0.2, "efficiency": 0.3}
+
+
+class FakeCalibrationService:
+    """Local stand-in for a service serving calibration tables."""
+
+    def __init__(self):
+        self.requests = 0
+
+    async def fetch(self, name, energy):
+        self.requests += 1
+        await asyncio.sleep(DELAYS[name])
+        return {"gain": 2.0, "offset": 1.0, "efficiency": 0.5}[name] * energy
+
+
+@pytest.fixture
+def service():
+    return FakeCalibrationService()
+
+
+@pytest.fixture
+def model(service):
+    async def gain(energy):
+        return await service.fetch("gain", energy)
+
+    async def offset(energy):
+        return await service.fetch("offset", energy)
+
+    async def efficiency(energy, *, scale=1.0):
+        return scale * await service.fetch("efficiency", energy)
+
+    return (LazyFunc(gain) + LazyFunc(offset)) * LazyFunc(efficiency) / 2
+
+
+def timed(coroutine):
+    start = time.perf_counter()
+    result = asyncio.run(coroutine)
+    return result, time.perf_counter() - start
+
+
+def test_leaves_are_gathered(model, service):
+    stats = EvaluationStats()
+    result, seconds = timed(model.acall(2.0, scale=3.0, stats=stats))
+    assert result == (4.0 + 2.0) * (3.0 * 1.0) / 2
+    assert service.requests == 3
+    assert stats.evaluations == 6
+    slowest = max(DELAYS.values())
+    assert slowest <= seconds < slowest + 0.1 < sum(DELAYS.values())
+
+
+def test_sync_leaves_in_threads(model):
+    @LazyFunc
+    def blocking(energy):
+        time.sleep(0.2)
+        return energy
+
+    f = model + blocking
+    result, seconds = timed(f.acall(2.0, to_thread=True))
+    assert result == (4.0 + 2.0) * 1.0 / 2 + 2.0
+    assert seconds < 0.3 + 0.1
+    _, seconds = timed(f.acall(2.0))
+    assert seconds >= 0.2 + 0.3
+
+
+def test_kwargs_set_in_context(model):
+    async def evaluate():
+        with model.set_kwargs(scale=5.0):
+            return await model.acall(2.0)
+
+    assert asyncio.run(evaluate()) == (4.0 + 2.0) * 5.0 / 2
+
+
+def test_sync_call_raises(model):
+    with pytest.raises(TypeError, match="acall"):
+        model(2.0)
+    with pytest.raises(TypeError):
+        model.memoize(tree=True)
+
+
+def test_async_outer_callables():
+    async def halve(value):
+        await asyncio.sleep(0)
+        return value / 2
+
+    def double(energy, *, scale=1.0):
+        return scale * 2 * energy
+
+    for outer, expected in [(LazyFunc(halve), 18.0), (LazyFunc(halve) + 1, 21.0)]:
+        f = outer.of(double) * 3
+        with pytest.raises(TypeError, match="acall"):
+            f(4.0)
+        assert asyncio.run(f.acall(4.0, scale=1.5)) == expected
@@ -0,0 +1,104 @@
+import inspect
+
+import numpy as np
+import pytest
+
+from lazyfunc import LazyFunc
+
+calls = {}
+
+
+def counted(func):
+    def wrapper(*args, **kwargs):
+        calls[func.__name__] = calls.get(func.__name__, 0) + 1
+        return func(*args, **kwargs)
+
+    wrapper.__signature__ = inspect.signature(func)
+    wrapper.__name__ = func.__name__
+    return wrapper
+
+
+@counted
+def spectrum(energy, /, *, temperature):
+    return np.exp(-energy / temperature)
+
+
+@counted
+def transmission(energy):
+    return energy / 10
+
+
+@counted
+def gain(energy, *, temperature):
+    return 1 + temperature / 100
+
+
+temperatures = np.array([1.0, 2.0, 5.0, 10.0])
+energy = np.linspace(0, 10, 7)
+
+
+def expected(f, energy):
+    return np.stack([f(energy, temperature=t) for t in temperatures])
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_map_over_kwargs(vectorized):
+    f = LazyFunc(spectrum) * LazyFunc(transmission) / 50 + 1
+    f.operands[0].operands[0].operands[0].vectorized = vectorized
+    reference = expected(f, energy)
+    calls.clear()
+    result = f.map(kwargs_grid={"temperature": temperatures}, args=(energy,))
+    assert np.allclose(result, reference)
+    assert calls == {"spectrum": 1 if vectorized else 4, "transmission": 1}
+
+
+def test_scalar_leaf_broadcasts():
+    f = LazyFunc(gain) * LazyFunc(spectrum)
+    result = f.map(kwargs_grid={"temperature": temperatures}, args=(energy,))
+    assert result.shape == (4, 7)
+    assert np.allclose(result, expected(f, energy))
+    scalar = LazyFunc(gain) * 2
+    assert np.allclose(
+        scalar.map(kwargs_grid={"temperature": temperatures}, args=(energy,)),
+        expected(scalar, energy),
+    )
+
+
+def test_map_over_args():
+    f = LazyFunc(spectrum) + LazyFunc(transmission)
+    args_grid = [(energy * i,) for i in range(3)]
+    result = f.map(args_grid, temperature=2.0)
+    assert np.allclose(result, [f(*args, temperature=2.0) for args in args_grid])
+
+
+def test_unbatched_result():
+    f = LazyFunc(transmission) * 2
+    result = f.map(kwargs_grid={"temperature": temperatures}, args=(energy,))
+    assert np.allclose(result, np.stack([f(energy)] * 4))
+
+
+def test_grid_lengths_must_match():
+    f = LazyFunc(spectrum) * LazyFunc(gain)
+    with pytest.raises(ValueError):
+        f.map([(1.0,), (2.0,)], {"temperature": temperatures})
+
+
+def test_matmul_is_applied_per_grid_point():
+    matrix = np.arange(6.0).reshape(2, 3)
+    f = LazyFunc(lambda x, *, temperature: temperature * x) @ matrix.T
+    energies = np.ones((2, 3))
+    result = f.map(kwargs_grid={"temperature": temperatures}, args=(energies,))
+    assert result.shape == (4, 2, 2)
+    assert np.allclose(result, expected(f, energies))
+    g = LazyFunc(lambda x: matrix) @ LazyFunc(lambda x, *, temperature: temperature * x)
+    result = g.map(kwargs_grid={"temperature": temperatures}, args=(energy[:3],))
+    assert result.shape == (4, 2)
+    assert np.allclose(result, expected(g, energy[:3]))
+
+
+def test_empty_grid():
+    f = LazyFunc(spectrum) * LazyFunc(gain)
+    with pytest.raises(ValueError, match="empty grid"):
+        f.map(kwargs_grid={"temperature": []}, args=(energy,))
+    with pytest.raises(ValueError, match="empty grid"):
+        f.map([], temperature=1.0)
@@ -0,0 +1,89 @@
+import inspect
+
+import numpy as np
+import pytest
+
+from lazyfunc import LazyFunc
+
+
+@LazyFunc
+def spectrum(energy, /, *, temperature):
+    return np.exp(-energy / temperature)
+
+
+@LazyFunc
+def responsivity(energy, *, gain=0.25):
+    return gain * energy
+
+
+@LazyFunc
+def offset(energy, shift=1.0):
+    return energy + shift
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        lambda: spectrum * responsivity / 50,
+        lambda: -(3 ** (offset - 2)) + 1,
+        lambda: 10 - offset * -2.5,
+        lambda: (spectrum > 0.5) & (responsivity < 1),
+        lambda: -((offset + responsivity) ** 2) % 7,
+    ],
+)
+def test_compiled_matches_call(expression):
+    f = expression()
+    compiled = f.compile()
+    for energy in (0.5, np.linspace(0, 3, 4)):
+        assert np.allclose(
+            compiled(energy, temperature=2.0), f(energy, temperature=2.0)
+        )
+
+
+def test_keyword_arguments():
+    f = spectrum * responsivity.set_kwargs(gain=2.0) + offset
+    compiled = f.compile()
+    assert "temperature" in inspect.signature(compiled).parameters
+    assert compiled(1.0, temperature=3.0) == f(1.0, temperature=3.0)
+    assert compiled(1.0, temperature=3.0, gain=1.0) == f(1.0, temperature=3.0, gain=1.0)
+    assert compiled(1.0, temperature=3.0, shift=0) == f(1.0, temperature=3.0, shift=0)
+    with pytest.raises(TypeError):
+        compiled(1.0)
+    responsivity.__exit__(None, None, None)
+
+
+def test_recompiled_when_kwargs_change():
+    f = spectrum * 2
+    with f.set_kwargs(temperature=4.0):
+        compiled = f.compile()
+        assert f.compile() is compiled
+        assert compiled(1.0) == f(1.0)
+    assert f.compile() is not compiled
+    with pytest.raises(TypeError):
+        f.compile()(1.0)
+
+
+def test_deep_expression():
+    f = offset
+    for _ in range(2000):
+        f = f + offset
+    assert f.compile()(1.0) == f(1.0)
+
+
+def test_memoized_root_uses_its_cache():
+    calls = []
+
+    def counted(energy, *, scale=1.0):
+        calls.append(energy)
+        return scale * energy
+
+    f = (LazyFunc(counted) * 2 + 1).memoize()
+    compiled = f.compile()
+    assert compiled(1.0) == compiled(1.0) == f(1.0) == 3.0
+    assert compiled(1.0, scale=2.0) == f(1.0, scale=2.0) == 5.0
+    assert calls == [1.0, 1.0]
+    assert f.cache_info().hits == 3
+    f.unmemoize()
+    compiled = f.compile()
+    assert compiled(1.0) == compiled(1.0) == 3.0
+    assert len(calls) == 4
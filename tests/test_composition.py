@@ -0,0 +1,132 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from lazyfunc import LazyFunc
+from lazyfunc.evaluation import get_program
+
+
+def scaled(x, *, scale=1.0):
+    return scale * x
+
+
+def square(x):
+    return x * x
+
+
+def increment(x):
+    return x + 1
+
+
+def adder(x):
+    def add(y, *, scale=1):
+        return scale * (x + y)
+
+    return add
+
+
+def call_with_ten(func, *, scale=1):
+    return func(10, scale=scale)
+
+
+def test_routes_kwargs_to_inner():
+    f = LazyFunc(square).of(scaled)
+    assert f.description == "square(scaled)"
+    assert f(3) == 9
+    assert f(3, scale=2) == 36
+    assert list(f.parameters) == ["x", "scale"]
+
+
+def test_outer_args_and_kwargs():
+    f = LazyFunc(round)(LazyFunc(scaled), 2)
+    assert f(1.23456, scale=2) == 2.47
+    g = LazyFunc(min).of(scaled, key=abs)
+    assert g([3, -1, 2], scale=1) == -1
+
+
+def test_chain_is_flattened():
+    f, g, h = LazyFunc(square), LazyFunc(increment), LazyFunc(scaled)
+    chain = f(g(h))
+    assert chain.description == "square(increment(scaled))"
+    assert chain(2, scale=3) == 49
+    assert len(get_program(chain).instructions) == 3
+
+
+def test_descriptions_in_expressions():
+    f, g = LazyFunc(square), LazyFunc(increment)
+    assert (2 * f.of(g) + 1).description == "2 * square(increment) + 1"
+    assert (f + g).of(g + 1).description == "(square + increment)(increment + 1)"
+    assert (f + g).of(g + 1)(1) == 13
+
+
+def test_outer_kwargs_and_updates():
+    outer = LazyFunc(scaled, scale=10)
+    f = outer.of(increment)
+    assert f(1) == 20
+    with outer.set_kwargs(scale=100):
+        assert f(1) == 200
+    outer += 1  # rebinds outer, leaving the composition unchanged
+    assert f(1) == 20
+
+
+def test_callable_results_are_not_composed():
+    outer = LazyFunc(call_with_ten)
+    f = outer.of(adder)
+    # comparing a LazyFunc would build another one rather than fail
+    assert not callable(f(3)) and not callable(f.compile()(3))
+    assert f(3) == (outer + 0).of(adder)(3) == 13
+    assert f.compile()(3) == 13
+    with outer.set_kwargs(scale=2):
+        assert f(3) == f.compile()(3) == 26
+    outer.set_kwargs(scale=3)
+    assert f(3) == 39
+    assert outer.memoize().of(adder)(3) == 39
+
+
+def test_inner_without_signature():
+    assert LazyFunc(abs)(max)([1, -5]) == 1
+    f = LazyFunc(max).of(scaled)
+    assert f(np.array([1.0, -5.0]), scale=2) == 2.0
+    assert (LazyFunc(abs) + 1).of(min)([3, -4]) == 5
+
+
+def test_evaluation_modes():
+    h = LazyFunc(scaled)
+    f = LazyFunc(square).of(h) + LazyFunc(increment).of(h)
+    expected = f(3, scale=2)
+    assert expected == 43
+    for options in [{"cse": True}, {"fuse": True}, {"incremental": True}]:
+        assert f.evaluate(3, scale=2, **options) == expected
+    assert f.compile()(3, scale=2) == expected
+    assert f.grad("scale")(3, scale=2) == pytest.approx(2 * 3 * 6 + 3, rel=1e-6)
+
+
+def test_map_applies_outer_per_point():
+    f = LazyFunc(np.sum).of(scaled)
+    x = np.arange(4.0)
+    mapped = f.map(kwargs_grid={"scale": [1.0, 2.0, 3.0]}, args=(x,))
+    np.testing.assert_allclose(mapped, [6.0, 12.0, 18.0])
+
+
+def test_serialization():
+    f = LazyFunc(square).of(LazyFunc(np.sum).of(scaled))
+    loaded = pickle.loads(pickle.dumps(f))
+    assert loaded.description == f.description
+    assert loaded(np.arange(3.0), scale=2) == f(np.arange(3.0), scale=2)
+    loaded = LazyFunc.from_json(f.to_json(), cache=False)
+    assert loaded(np.arange(3.0), scale=2) == 36
+
+
+def test_digests_distinguish_outer_callables():
+    h = LazyFunc(scaled)
+    assert LazyFunc(square).of(h).digest() != LazyFunc(increment).of(h).digest()
+    assert LazyFunc(square).of(h).digest() == LazyFunc(square).of(h).digest()
+
+
+def test_deep_chain():
+    f = LazyFunc(increment)
+    chain = LazyFunc(scaled)
+    for _ in range(10_000):
+        chain = f.of(chain)
+    assert chain(0.0) == 10_000
@@ -0,0 +1,54 @@
+import numpy as np
+
+from lazyfunc import EvaluationStats, LazyFunc
+
+
+class CountingSpectrum:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, energy, /, temperature=1.0):
+        self.calls += 1
+        return np.exp(-energy / temperature)
+
+
+def transmission(energy):
+    return energy / 10
+
+
+def responsivity(energy):
+    return 0.25 * np.ones_like(energy)
+
+
+def test_shared_leaf_evaluated_once():
+    counter = CountingSpectrum()
+    spectrum = LazyFunc(counter, description="spectrum")
+    f = (spectrum * transmission) + (spectrum * responsivity)
+    x = np.linspace(0, 1, 5)
+    expected = f(x, temperature=2.0)
+    counter.calls = 0
+    stats = EvaluationStats()
+    assert np.allclose(f.evaluate(x, cse=True, stats=stats, temperature=2.0), expected)
+    assert counter.calls == 1
+    assert stats.saved == 1
+    assert stats.evaluations == 6
+
+
+def test_shared_subexpression():
+    counter = CountingSpectrum()
+    spectrum = LazyFunc(counter)
+    f = (spectrum * 2 + 1) / (spectrum * 2 + 1) + (spectrum * 3 + 1)
+    stats = EvaluationStats()
+    assert f.evaluate(0.5, cse=True, stats=stats) == f(0.5)
+    assert counter.calls == 1 + 3
+    assert stats.saved == 4  # spectrum twice, spectrum * 2 and spectrum * 2 + 1
+
+
+def test_different_kwargs_not_shared():
+    counter = CountingSpectrum()
+    hot = LazyFunc(counter, temperature=3.0)
+    cold = LazyFunc(counter)
+    f = hot + cold + cold
+    stats = EvaluationStats()
+    assert f.evaluate(1.0, cse=True, stats=stats) == f(1.0)
+    assert stats.saved == 1
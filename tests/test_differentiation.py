@@ -0,0 +1,122 @@
+import gc
+import math
+import weakref
+
+import numpy as np
+import pytest
+
+from lazyfunc import LazyFunc, differentiation
+
+
+def spectrum(energy, *, temperature):
+    return np.exp(-energy / temperature)
+
+
+def background(energy, *, temperature, slope=0.1):
+    return slope * energy * temperature
+
+
+def transmission(energy):
+    return 1 - np.exp(-energy)
+
+
+def numerical(f, energy, temperature, h=1e-6):
+    return (
+        f(energy, temperature=temperature + h) - f(energy, temperature=temperature - h)
+    ) / (2 * h)
+
+
+s, b, t = LazyFunc(spectrum), LazyFunc(background), LazyFunc(transmission)
+expressions = [
+    s + b,
+    s - 2 * b,
+    2 - s,
+    s * t * b,
+    s / b,
+    t / s,
+    3 / s,
+    -(s**2) + +b,
+    s**1.5 * t,
+    t**s,
+    s % 0.3,
+    LazyFunc.sum([s, b, t, s * b]),
+    LazyFunc.prod([s, t, b]),
+    LazyFunc(s * 2 + b, slope=0.3),
+]
+
+
+@pytest.mark.parametrize("f", expressions, ids=lambda f: f.description)
+def test_matches_finite_differences(f):
+    energy = np.linspace(0.5, 2, 4)
+    np.testing.assert_allclose(
+        f.grad("temperature")(energy, temperature=1.5),
+        numerical(f, energy, 1.5),
+        rtol=1e-5,
+        atol=1e-8,
+    )
+
+
+def test_registered_derivative():
+    calls = []
+
+    def spectrum_temperature(energy, *, temperature):
+        calls.append(temperature)
+        return energy / temperature**2 * np.exp(-energy / temperature)
+
+    leaf = LazyFunc(spectrum)
+    leaf.set_derivative("temperature", spectrum_temperature)
+    f = 2 * leaf * LazyFunc(transmission)
+    df = f.grad("temperature")
+    assert df.description == "2 * dspectrum/dtemperature * transmission"
+    np.testing.assert_allclose(df(1.0, temperature=2), numerical(f, 1.0, 2))
+    assert calls == [2]
+    # leaves wrapping the same function share the derivative
+    assert LazyFunc(spectrum).grad("temperature").description == (
+        "dspectrum/dtemperature"
+    )
+
+
+def test_registered_callables_are_not_kept_alive():
+    def local(energy, *, temperature):
+        return energy * temperature
+
+    LazyFunc(local).set_derivative("temperature", lambda energy, **_: energy)
+    assert LazyFunc(local).grad("temperature")(3.0, temperature=2.0) == 3.0
+    ref = weakref.ref(local)
+    del local
+    gc.collect()
+    assert ref() is None
+    LazyFunc(np.exp).set_derivative("x", np.exp)
+    assert differentiation._static_derivatives[np.exp] == {"x": np.exp}
+
+
+def test_independent_leaves():
+    f = LazyFunc(transmission) * 2
+    assert f.grad("temperature")(1.0) == 0
+    assert (s * t).grad("temperature").description.count("transmission") == 1
+
+
+def test_kwargs_of_leaves():
+    f = LazyFunc(spectrum, temperature=2.0) * 3
+    assert f.grad("temperature")(1.0) == pytest.approx(3 / 4 * math.exp(-0.5), rel=1e-6)
+    with pytest.raises(TypeError):
+        s.grad("temperature")(1.0)
+
+
+def test_cost():
+    calls = []
+
+    def counted(energy, *, temperature):
+        calls.append(temperature)
+        return energy * temperature
+
+    leaf = LazyFunc(counted)
+    f = leaf * s + 1
+    f.grad("temperature").evaluate(1.0, temperature=2, cse=True)
+    # once for the value shared with the expression, twice for the derivative
+    assert len(calls) == 3
+
+
+def test_set_derivative_on_operation():
+    with pytest.raises(TypeError):
+        (s + b).set_derivative("temperature", spectrum)
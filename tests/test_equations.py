@@ -56,3 +56,16 @@ def test_equation(equation):
     mf_str = "LazyFunc" + add_parentheses(equation_from_math_funcs)
     assert mf(None) == eval(equation)
     assert str(mf) == mf_str
+
+
+def test_description_is_lazy():
+    terms = [one, two, three] * 1000
+    f = terms[0]
+    for term in terms[1:]:
+        f = f + term
+    f = f * (one - 2)
+    assert f._description is None
+    expected = "(" + " + ".join(["one", "two", "three"] * 1000) + ") * (one - 2)"
+    assert f.description == expected
+    assert str(f) == f"LazyFunc({expected})"
+    assert f.operands[0]._description is None
@@ -0,0 +1,86 @@
+import sys
+
+import pytest
+
+from lazyfunc import LazyFunc
+from lazyfunc.evaluation import (
+    BINARY,
+    CONSTANT_LEFT,
+    CONSTANT_RIGHT,
+    LEAF,
+    UNARY,
+    get_program,
+)
+from lazyfunc.operators import operators
+
+
+@LazyFunc
+def identity(x):
+    return x
+
+
+@LazyFunc
+def scaled(x, *, scale=1):
+    return scale * x
+
+
+def test_expression_tree():
+    f = 10 - identity * 2
+    sub, mul = (
+        next(op for op in operators if op.name == n) for n in ("__sub__", "__mul__")
+    )
+    assert f.operator is sub
+    assert f.operands[0] == 10
+    assert f.operands[1].operator is mul
+    assert f.operands[1].operands == (identity, 2)
+    assert identity.is_leaf and identity.operands == ()
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    [
+        (lambda f: 10 - f, 7),
+        (lambda f: 2**f, 8),
+        (lambda f: 12 / f, 4),
+        (lambda f: 7 // f, 2),
+        (lambda f: 7 % f, 1),
+    ],
+)
+def test_reverse_operand_order(expression, expected):
+    assert expression(identity)(3) == expected
+
+
+def test_deep_expression():
+    depth = 5 * sys.getrecursionlimit()
+    f = identity
+    for _ in range(depth):
+        f = f + identity
+    assert f(1) == depth + 1
+
+
+def test_intermediate_defaults():
+    inner = scaled + identity
+    f = inner * scaled
+    with inner.set_kwargs(scale=3):
+        assert f(2) == (3 * 2 + 2) * 2
+        assert f(2, scale=5) == (5 * 2 + 2) * (5 * 2)
+
+
+def test_specialised_instructions():
+    f = -(10 - identity) * identity / 4
+    program = get_program(f)
+    kinds = [step[0] for step in program.steps]
+    assert kinds == [LEAF, CONSTANT_LEFT, UNARY, LEAF, BINARY, CONSTANT_RIGHT]
+    assert f(2) == -(10 - 2) * 2 / 4
+
+
+def test_programs_kept_across_changes_to_other_trees():
+    leaf = LazyFunc(abs)
+    f = leaf * 2 + 1
+    program = get_program(f)
+    (LazyFunc(abs) + 1).memoize()
+    LazyFunc(abs).func = round
+    assert get_program(f) is program
+    leaf.memoize()
+    assert get_program(f) is not program
+    assert f(-1) == 3
@@ -0,0 +1,74 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from lazyfunc import EvaluationStats, LazyFunc
+
+N = 100_000
+
+
+def make_leaf(scale):
+    @LazyFunc
+    def leaf(x):
+        return scale * np.ones(N)
+
+    return leaf
+
+
+def peak_bytes(func, *args, **kwargs):
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_matches_unfused():
+    a, b, c = make_leaf(1.0), make_leaf(2.0), make_leaf(3.0)
+    f = -(a * b * c / 50) + 2**a - (b > 1.5) * c
+    assert np.array_equal(f.evaluate(0, fuse=True), f(0))
+
+
+def test_peak_memory_independent_of_depth():
+    f = make_leaf(1.0)
+    for i in range(20):
+        f = f * make_leaf(i + 1.0) / 50
+    stats = EvaluationStats()
+    fused = peak_bytes(f.evaluate, 0, fuse=True, stats=stats)
+    unfused = peak_bytes(f, 0)
+    assert stats.evaluations == 61
+    assert fused < 3.5 * N * 8
+    assert unfused > 10 * N * 8
+
+
+def test_leaf_results_are_not_written_into():
+    x = np.arange(5.0)
+    identity = LazyFunc(lambda x: x)
+    f = identity * 2 + 1
+    assert np.array_equal(f.evaluate(x, fuse=True), 2 * x + 1)
+    assert np.array_equal(x, np.arange(5.0))
+
+
+def test_dtype_and_broadcasting():
+    ints = LazyFunc(lambda x: np.arange(6).reshape(2, 3))
+    column = LazyFunc(lambda x: np.arange(1.0, 3.0).reshape(2, 1))
+    f = ints * 2 // 3 / column + ints % 4
+    result = f.evaluate(0, fuse=True)
+    assert result.dtype == np.float64
+    assert np.array_equal(result, f(0))
+
+
+def test_scalars_and_other_operations_unchanged():
+    f = LazyFunc(lambda x: x + 1) * 3
+    assert f.evaluate(2, fuse=True) == 9
+    matrix = LazyFunc(lambda x: np.eye(2) * x)
+    g = matrix @ matrix + 1
+    assert np.array_equal(g.evaluate(2, fuse=True), g(2))
+
+
+def test_cannot_combine_with_cse():
+    f = make_leaf(1.0) * 2
+    with pytest.raises(ValueError):
+        f.evaluate(0, fuse=True, cse=True)
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from lazyfunc import LazyFunc, arguments
+
+
+def spectrum(energy):
+    return energy
+
+
+def background(energy, *, slope=1):
+    return slope * energy
+
+
+def build(first=spectrum, second=background):
+    return 2 * LazyFunc(first) + LazyFunc(second) ** 2 - 1
+
+
+def test_equal_structures():
+    assert build().digest() == build().digest()
+    assert hash(build()) == hash(build())
+    assert build().is_equal(build())
+
+
+def test_different_structures():
+    digests = {
+        build().digest(),
+        build(second=spectrum).digest(),
+        (2 * LazyFunc(spectrum) + LazyFunc(background) ** 2 - 2).digest(),
+        (2 * LazyFunc(spectrum) + LazyFunc(background) ** 2 - 1.0).digest(),
+        (2 * LazyFunc(spectrum) + LazyFunc(background) ** 2 + 1).digest(),
+        (2 * LazyFunc(spectrum) + LazyFunc(background, slope=2) ** 2 - 1).digest(),
+        (2 * LazyFunc(spectrum, "s") + LazyFunc(background) ** 2 - 1).digest(),
+    }
+    assert len(digests) == 7
+    with pytest.warns(UserWarning):
+        assert not build().is_equal(build(second=spectrum))
+
+
+def test_commutative():
+    f, g = LazyFunc(spectrum), LazyFunc(background)
+    assert (f + g * 2).digest() != (g * 2 + f).digest()
+    assert (f + g * 2).digest(commutative=True) == (2 * g + f).digest(commutative=True)
+    assert (f - g).digest(commutative=True) != (g - f).digest(commutative=True)
+    assert (f + g).is_equal(g + f, commutative=True)
+
+
+def test_array_constants_by_identity():
+    f = LazyFunc(spectrum)
+    a = np.ones(3)
+    assert (f * a).digest() == (f * a).digest()
+    assert (f * a).digest() != (f * np.ones(3)).digest()
+
+
+def test_dict_keys():
+    results = {build(): "first", build(second=spectrum): "second"}
+    assert results[build()] == "first"
+    assert results[build(second=spectrum)] == "second"
+    assert 2 * LazyFunc(spectrum) not in results
+
+
+def test_inplace_update_keeps_digest():
+    f = LazyFunc(spectrum)
+    expression = f * 2
+    before = expression.digest()
+    f += 1
+    assert expression.digest() == before
+    assert f.digest() == (LazyFunc(spectrum) + 1).digest()
+
+
+def test_deep_tree():
+    expression = LazyFunc(spectrum)
+    for i in range(10_000):
+        expression = expression + i
+    assert expression._digest is None  # hashed when first needed
+    assert len(expression.digest()) == 16
+    arguments.invalidate_trees(expression, swapped=True)  # as when swapping its func
+    assert len(expression.digest(commutative=True)) == 16
+
+
+def test_hash_is_stable_until_a_leaf_is_swapped():
+    f = LazyFunc(spectrum)
+    expression = 2 * f + 1
+    results = {expression: "cached"}
+    plain, commutative = expression.digest(), expression.digest(commutative=True)
+    (f * 3).memoize()
+    g = LazyFunc(spectrum)
+    g.func = background  # an unrelated swap recomputes the cached digests
+    assert results[expression] == "cached"
+    assert expression.digest(commutative=True) == commutative
+    assert expression.digest() == plain
+    f.func = background
+    assert hash(expression) != hash(plain)  # a dict key can no longer be found
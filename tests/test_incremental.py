@@ -0,0 +1,95 @@
+import math
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from lazyfunc import EvaluationStats, LazyFunc
+
+calls = Counter()
+
+
+@LazyFunc
+def spectrum(energy, *, temperature):
+    calls["spectrum"] += 1
+    return math.exp(-energy / temperature)
+
+
+@LazyFunc
+def transmission(energy):
+    calls["transmission"] += 1
+    return 1 - math.exp(-energy / 1e3)
+
+
+@LazyFunc
+def responsivity(energy, *, gain=1.0):
+    calls["responsivity"] += 1
+    return 0.25 * gain
+
+
+@pytest.fixture
+def model():
+    calls.clear()
+    return transmission * responsivity * spectrum / 50
+
+
+def test_only_dependent_path_is_recomputed(model):
+    reference = [model(10.0, temperature=t) for t in (100.0, 200.0, 300.0)]
+    calls.clear()
+    results = []
+    recomputed = []
+    for temperature in (100.0, 200.0, 300.0):
+        stats = EvaluationStats()
+        with model.set_kwargs(temperature=temperature):
+            results.append(model.evaluate(10.0, incremental=True, stats=stats))
+        recomputed.append(stats.evaluations)
+    assert results == reference
+    # spectrum and the three operations
+    assert recomputed == [6, 4, 4]
+    assert calls == {"spectrum": 3, "transmission": 1, "responsivity": 1}
+
+
+def test_changed_arguments(model):
+    model.evaluate(10.0, incremental=True, temperature=100.0)
+    stats = EvaluationStats()
+    model.evaluate(10.0, incremental=True, temperature=100.0, stats=stats)
+    assert (stats.evaluations, stats.saved) == (0, 6)
+    stats = EvaluationStats()
+    model.evaluate(10.0, incremental=True, temperature=100.0, gain=2.0, stats=stats)
+    assert stats.evaluations == 4
+    stats = EvaluationStats()
+    result = model.evaluate(20.0, incremental=True, temperature=100.0, stats=stats)
+    assert stats.evaluations == 6
+    assert result == model(20.0, temperature=100.0)
+
+
+def test_arrays_are_compared_by_identity():
+    @LazyFunc
+    def scaled(x, *, scale):
+        return scale * x
+
+    model = scaled + LazyFunc(np.sin)
+    x = np.linspace(0, 1, 5)
+    model.evaluate(x, incremental=True, scale=1.0)
+    stats = EvaluationStats()
+    result = model.evaluate(x, incremental=True, scale=2.0, stats=stats)
+    assert stats.evaluations == 2
+    assert np.array_equal(result, 2 * x + np.sin(x))
+    stats = EvaluationStats()
+    model.evaluate(x.copy(), incremental=True, scale=2.0, stats=stats)
+    assert stats.evaluations == 3
+
+
+def test_intermediate_results_are_not_kept():
+    x = np.ones(1_000_000)
+    model = LazyFunc(lambda x: x) * 2 * 3 * 4 * 5 + 1
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        result = model.evaluate(x, incremental=True)
+        kept = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    assert np.array_equal(result, np.full_like(x, 121.0))
+    assert kept < 2 * x.nbytes  # the root only, the leaf result being x itself
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from lazyfunc import LazyFunc
+from lazyfunc.arguments import kwargs_overrides
+
+
+@LazyFunc
+def spectrum(energy, *, temperature=1.0):
+    return energy / temperature
+
+
+@LazyFunc
+def transmission(energy):
+    return energy + 1
+
+
+model = spectrum * transmission + spectrum
+
+
+def model_frames():
+    return [frame for frame in kwargs_overrides.get() if frame[0] is model]
+
+
+def expected(energy, temperature):
+    return energy / temperature * (energy + 1) + energy / temperature
+
+
+def test_nested_contexts():
+    with model.set_kwargs(temperature=2.0):
+        assert model(1.0) == expected(1.0, 2.0)
+        with model.set_kwargs(temperature=4.0):
+            assert model(1.0) == expected(1.0, 4.0)
+        assert model(1.0) == expected(1.0, 2.0)
+        model.set_kwargs(temperature=8.0)
+        assert model(1.0) == expected(1.0, 8.0)
+    assert model(1.0) == expected(1.0, 1.0)
+    assert model_frames() == []
+
+
+def test_set_kwargs_outside_with_block_is_shared():
+    for temperature in range(1, 100):
+        model.set_kwargs(temperature=temperature)
+    assert model_frames() == []
+    assert model._shared_kwargs == {"temperature": 99}
+    with ThreadPoolExecutor(1) as executor:
+        assert executor.submit(model, 1.0).result() == expected(1.0, 99)
+        assert executor.submit(model.compile(), 1.0).result() == expected(1.0, 99)
+        with model.set_kwargs(temperature=2.0):
+            assert executor.submit(model, 1.0).result() == expected(1.0, 99)
+            assert model(1.0) == expected(1.0, 2.0)
+    assert model(1.0) == expected(1.0, 99)
+    model.__exit__(None, None, None)  # restores the initial kwargs
+    assert model(1.0) == model.compile()(1.0) == expected(1.0, 1.0)
+
+
+def test_with_blocks_do_not_leak_to_other_threads():
+    stop = threading.Event()
+
+    def block_loop():
+        while not stop.is_set():
+            with model.set_kwargs(temperature=2.0):
+                pass
+
+    thread = threading.Thread(target=block_loop)
+    thread.start()
+    try:
+        errors = sum(model(1.0) != expected(1.0, 1.0) for _ in range(20_000))
+    finally:
+        stop.set()
+        thread.join()
+    assert errors == 0
+
+
+def test_entering_keeps_shared_kwargs():
+    model.set_kwargs(temperature=5.0)
+    try:
+        with model, ThreadPoolExecutor(1) as executor:
+            assert executor.submit(model, 1.0).result() == expected(1.0, 5.0)
+        assert model(1.0) == expected(1.0, 5.0)
+    finally:
+        model.__exit__(None, None, None)
+    assert model(1.0) == expected(1.0, 1.0)
+
+
+def test_threads_are_isolated():
+    n_threads, n_calls = 16, 200
+    barrier = threading.Barrier(n_threads)
+
+    def worker(temperature):
+        barrier.wait()
+        errors = 0
+        for i in range(n_calls):
+            with model.set_kwargs(temperature=temperature):
+                energy = float(i)
+                errors += model(energy) != expected(energy, temperature)
+                errors += model.compile()(energy) != expected(energy, temperature)
+        return errors
+
+    with ThreadPoolExecutor(n_threads) as executor:
+        errors = list(executor.map(worker, [float(t) for t in range(1, 17)]))
+    assert errors == [0] * n_threads
+    assert model(1.0) == expected(1.0, 1.0)
+
+
+def test_tasks_are_isolated():
+    async def task(temperature):
+        with model.set_kwargs(temperature=temperature):
+            await asyncio.sleep(0)
+            return model(1.0)
+
+    async def main():
+        return await asyncio.gather(*(task(t) for t in (1.0, 2.0, 3.0)))
+
+    assert asyncio.run(main()) == [expected(1.0, t) for t in (1.0, 2.0, 3.0)]
@@ -1,3 +1,7 @@
+import gc
+import inspect
+import weakref
+
 import numpy as np
 import pytest
 
@@ -65,3 +69,99 @@ def test_equality():
         assert not (mf_single_parameter_function + mf_single_parameter_class).is_equal(
             mf_single_parameter_class + mf_single_parameter_function
         )
+
+
+def test_compact_nodes():
+    f = LazyFunc(single_parameter_function)
+    g = LazyFunc(single_parameter_function)
+    expression = f * 2 + g
+    assert not hasattr(expression, "__dict__")
+    assert f._default_kwargs is g._default_kwargs
+    # equal signatures are shared, including merged signatures equal to one of
+    # the operands
+    assert f.__signature__ is g.__signature__
+    assert expression.__signature__ is f.__signature__
+
+
+def test_leaf_functions_are_not_kept_alive():
+    def local(x):
+        return x
+
+    model = LazyFunc(local) * 2 + LazyFunc(np.sin)
+    assert model(0.0) == 0.0
+    reference = weakref.ref(local)
+    del model, local
+    gc.collect()
+    assert reference() is None
+
+
+def test_unhashable_default():
+    def with_list_default(x, *, items=[]):  # noqa: B006
+        return x + len(items)
+
+    f = LazyFunc(with_list_default) + LazyFunc(single_parameter_function)
+    assert list(f.__signature__.parameters) == ["x", "items"]
+    assert f(1, items=[0, 0]) == 1 + 2 + 1
+
+
+def test_signature_computed_once():
+    class Leaf:
+        signature_reads = 0
+
+        def __call__(self, x, *, scale=1):
+            return scale * x
+
+        @property
+        def __signature__(self):
+            Leaf.signature_reads += 1
+            return inspect.Signature(
+                [
+                    inspect.Parameter("x", inspect.Parameter.POSITIONAL_OR_KEYWORD),
+                    inspect.Parameter(
+                        "scale", inspect.Parameter.KEYWORD_ONLY, default=1
+                    ),
+                ]
+            )
+
+    leaf = LazyFunc(Leaf())
+    f = leaf
+    for i in range(100):
+        f = f + leaf * i
+    assert list(f.parameters) == ["x", "scale"]
+    assert f(1, scale=2) == 2 + 2 * sum(range(100))
+    assert Leaf.signature_reads == 1
+    assert f.__signature__ is leaf.__signature__
+
+
+def test_zero_argument_call():
+    f = LazyFunc(lambda: 3) * 2
+    assert f() == 6
+    assert LazyFunc(lambda *, scale=1: scale)(scale=2) == 2
+
+
+def test_of():
+    f = LazyFunc(single_parameter_function)
+    composed = f.of(SingleParameterClass())
+    assert composed.description == "single_parameter_function(SingleParameterClass)"
+    assert composed(3) == f(SingleParameterClass())(3) == 3
+
+
+def test_fast_path_follows_changes():
+    def scaled(x, *, scale=1):
+        return scale * x
+
+    f = LazyFunc(scaled)
+    assert f(2) == 2
+    with f.set_kwargs(scale=3):
+        assert f(2) == 6
+    f.set_kwargs(scale=4)
+    assert f(2) == 8
+    f.__exit__(None, None, None)
+    assert f(2) == 2
+    f.memoize()
+    assert f(2) == f(2) == 2
+    assert f.cache_info().hits == 1
+    f.unmemoize()
+    f.func = lambda x: -x
+    assert f(2) == -2
+    assert f.of(abs)(-2) == -2
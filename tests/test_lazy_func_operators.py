@@ -1,7 +1,8 @@
 import numpy as np
 import pytest
 
-from lazyfunc import LazyFunc
+from lazyfunc import LazyFunc, arguments
+from lazyfunc.lazy_func import LazyFuncMeta
 
 
 def single_parameter_function(x):
@@ -93,3 +94,61 @@ def test_radd():
     with pytest.raises(TypeError):
         foo_add_mf_f = "foo" + mf_f
         foo_add_mf_f(0)
+
+
+def test_iadd():
+    x = np.random.rand(4)
+    mf_f = LazyFunc(single_parameter_function)
+    original = mf_f
+    mf_f += 2
+    assert mf_f is not original
+    assert str(mf_f) == "LazyFunc(single_parameter_function + 2)"
+    assert np.allclose(mf_f(x), x + 2)
+    mf_f *= LazyFunc(SingleParameterClass())
+    assert (
+        str(mf_f) == "LazyFunc((single_parameter_function + 2) * SingleParameterClass)"
+    )
+    assert np.allclose(mf_f(x), (x + 2) * x)
+    assert str(original) == "LazyFunc(single_parameter_function)"
+
+
+def test_inplace_leaves_parents_unchanged():
+    x = np.random.rand(4)
+    mf_f = LazyFunc(single_parameter_function)
+    mf_g = LazyFunc(multi_parameter_function)
+    parent = 2 * mf_f
+    assert np.allclose(parent(x), 2 * x)
+    mf_f -= mf_g
+    assert str(parent) == "LazyFunc(2 * single_parameter_function)"
+    assert list(parent.__signature__.parameters) == ["x"]
+    assert np.allclose(parent(x), 2 * x)
+    assert np.allclose(mf_f(x, y=x), x - 2 * x)
+
+
+def test_inplace_with_self():
+    x = np.random.rand(4)
+    mf_f = LazyFunc(single_parameter_function)
+    mf_f += mf_f * 2
+    assert (
+        str(mf_f)
+        == "LazyFunc(single_parameter_function + single_parameter_function * 2)"
+    )
+    assert np.allclose(mf_f(x), 3 * x)
+
+
+def test_inplace_scales_linearly(monkeypatch):
+    merges = []
+    build_new_signature = LazyFuncMeta.build_new_signature
+
+    def counted(instances):
+        merges.append(instances)
+        return build_new_signature(instances)
+
+    monkeypatch.setattr(LazyFuncMeta, "build_new_signature", staticmethod(counted))
+    epoch = arguments._tree_epoch
+    f = LazyFunc(single_parameter_function)
+    for i in range(2000):
+        f += LazyFunc(multi_parameter_function) * i
+    assert len(merges) == 2 * 2000  # one per new node, none for parents
+    assert arguments._tree_epoch == epoch
+    assert f(1, y=2) == 1 + 3 * sum(range(2000))
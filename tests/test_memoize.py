@@ -0,0 +1,139 @@
+import inspect
+
+import numpy as np
+import pytest
+
+from lazyfunc import LazyFunc
+
+
+class Counter:
+    def __init__(self, func):
+        self.func = func
+        self.calls = 0
+        self.__signature__ = inspect.signature(func)
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.func(*args, **kwargs)
+
+
+@pytest.fixture
+def spectrum():
+    return Counter(lambda energy, *, temperature: np.exp(-energy / temperature))
+
+
+@pytest.fixture
+def transmission():
+    return Counter(lambda energy: energy / 10)
+
+
+@pytest.fixture
+def model(spectrum, transmission):
+    return LazyFunc(spectrum) * LazyFunc(transmission) + 1
+
+
+def test_memoized_root(model, spectrum):
+    model.memoize()
+    x = np.linspace(0, 1, 5)
+    first = model(x, temperature=2.0)
+    assert np.array_equal(model(x.copy(), temperature=2.0), first)
+    assert spectrum.calls == 1
+    model(x, temperature=3.0)
+    assert spectrum.calls == 2
+    info = model.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 2)
+
+
+def test_memoized_operand_skips_subtree(model, spectrum, transmission):
+    inner = model.operands[0].memoize()
+    f = model * 2
+    for temperature in [1.0, 2.0, 1.0, 2.0]:
+        assert f(0.5, temperature=temperature) == 2 * (
+            np.exp(-0.5 / temperature) * 0.05 + 1
+        )
+    assert spectrum.calls == transmission.calls == 2
+    assert inner.cache_info().hits == 2
+
+
+def test_memoized_tree(model, spectrum, transmission):
+    model.memoize(tree=True)
+    model(0.5, temperature=1.0)
+    model.operands[0].cache_clear()
+    model.cache_clear()
+    model(0.5, temperature=1.0)
+    assert spectrum.calls == transmission.calls == 1
+    model.unmemoize(tree=True)
+    assert model.cache_info() is None
+    model(0.5, temperature=1.0)
+    assert spectrum.calls == 2
+
+
+def test_eviction_by_count_and_bytes():
+    f = LazyFunc(lambda n: np.zeros(n)).memoize(maxsize=3)
+    for n in range(5):
+        f(n)
+    assert f.cache_info().evictions == 2
+    assert f.cache_info().currsize == 3
+
+    g = LazyFunc(lambda n: np.zeros(n)).memoize(maxsize=None, maxbytes=8 * 100)
+    g(50), g(50), g(40), g(30)
+    info = g.cache_info()
+    assert (info.hits, info.evictions, info.currsize, info.nbytes) == (1, 1, 2, 560)
+    g(200)  # larger than maxbytes, never cached
+    assert g.cache_info().currsize == 2
+
+
+@pytest.mark.parametrize("arrays, hits", [("content", 2), ("identity", 1)])
+def test_array_keys(arrays, hits):
+    f = LazyFunc(lambda x: x * 2).memoize(arrays=arrays)
+    x = np.arange(4)
+    f(x), f(x), f(x.copy())
+    assert f.cache_info().hits == hits
+
+
+def test_unhashable_arguments_are_not_cached():
+    f = LazyFunc(lambda x: sum(x)).memoize()
+    assert f([1, 2]) == f([1, 2]) == 3
+    assert f.cache_info().misses == 2
+
+
+def test_kwargs_set_below_memoized_node():
+    def leaf(energy, *, temperature=1):
+        return energy * temperature
+
+    a = LazyFunc(leaf)
+    memoized = (a * 2).memoize()
+    assert memoized(1) == 2
+    with a.set_kwargs(temperature=5):
+        assert memoized(1) == 10
+        assert (memoized + 1)(1) == 11  # memoized operand of another expression
+    assert memoized(1) == 2
+    a.set_kwargs(temperature=3)
+    assert memoized(1) == 6
+    a.__exit__(None, None, None)
+    assert memoized(1) == 2
+    assert memoized.cache_info().hits == 3
+
+
+def test_swapped_leaf_discards_results():
+    a = LazyFunc(lambda energy: energy)
+    memoized = (a * 2).memoize()
+    assert memoized(1) == 2
+    a.func = lambda energy: 10 * energy
+    assert memoized(1) == 20
+    assert memoized.cache_info().currsize == 1
+
+
+def test_changes_to_other_trees_keep_results():
+    a = LazyFunc(lambda energy: energy)
+    memoized = (a * 2).memoize()
+    memoized(1)
+    (LazyFunc(abs) + 1).memoize()
+    LazyFunc(abs).func = round
+    assert memoized(1) == 2
+    assert memoized.cache_info().misses == 1
+    outer = LazyFunc(abs)
+    composed = outer.of(a).memoize()
+    composed(-1)
+    outer.func = lambda value: 10 * value
+    assert composed(-1) == -10
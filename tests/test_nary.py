@@ -0,0 +1,88 @@
+import functools
+import operator
+import pickle
+
+import numpy as np
+import pytest
+
+from lazyfunc import LazyFunc
+
+
+def line(energy, *, index):
+    return index * energy
+
+
+def offset(energy, *, shift=0.5):
+    return energy + shift
+
+
+terms = [LazyFunc(line, index=i) for i in range(1, 6)] + [2, LazyFunc(offset)]
+
+
+def test_sum_matches_chain():
+    f = LazyFunc.sum(terms)
+    chain = functools.reduce(operator.add, terms)
+    assert len(f.operands) == len(terms)
+    assert f.description == chain.description
+    assert f(2.0) == chain(2.0)
+    assert f(2.0, shift=1) == chain(2.0, shift=1)
+    assert list(f.parameters) == list(chain.parameters)
+    energy = np.linspace(0, 1, 5)
+    np.testing.assert_allclose(f(energy), chain(energy))
+
+
+def test_prod_matches_chain():
+    f = LazyFunc.prod(terms)
+    chain = functools.reduce(operator.mul, terms)
+    assert f.description == chain.description
+    assert f(2.0) == chain(2.0)
+    energy = np.linspace(0, 1, 5)
+    np.testing.assert_allclose(f(energy), chain(energy))
+
+
+def test_broadcast_operands():
+    column = LazyFunc(lambda energy: energy[:, None])
+    f = LazyFunc.sum([column, LazyFunc(lambda energy: energy), 1])
+    energy = np.arange(3.0)
+    np.testing.assert_array_equal(f(energy), energy[:, None] + energy + 1)
+
+
+def test_nested_description():
+    f = 2 * LazyFunc.sum(terms[:2]) - LazyFunc.prod(terms[:2])
+    assert f.description == "2 * (line + line) - line * line"
+
+
+def test_evaluation_modes():
+    f = LazyFunc.sum(terms) * 2
+    expected = f(3.0)
+    for options in [{"cse": True}, {"fuse": True}, {"incremental": True}]:
+        assert f.evaluate(3.0, **options) == expected
+    assert f.compile()(3.0) == expected
+
+
+def test_serialization():
+    f = LazyFunc.sum(terms)
+    assert pickle.loads(pickle.dumps(f))(3.0) == f(3.0)
+
+
+def test_single_and_invalid_terms():
+    assert LazyFunc.sum([terms[0]]) is terms[0]
+    assert LazyFunc.prod([line])(2, index=3) == 6
+    with pytest.raises(ValueError):
+        LazyFunc.sum([1, 2])
+    with pytest.raises(ValueError):
+        LazyFunc.prod([])
+
+
+def test_commutative_digest():
+    a, b = terms[:2]
+    assert LazyFunc.sum([a, b]).digest(commutative=True) == (
+        LazyFunc.sum([b, a]).digest(commutative=True)
+    )
+
+
+def test_many_terms():
+    many = [LazyFunc(line, index=i) for i in range(20_000)]
+    f = LazyFunc.sum(many)
+    assert f(1.0) == sum(range(20_000))
+    assert LazyFunc.sum(many[:1000]).compile()(1.0) == sum(range(1000))
@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from lazyfunc import EvaluationStats, LazyFunc
+
+DELAY = 0.2
+
+
+def slow_spectrum(energy, *, temperature):
+    time.sleep(DELAY)
+    return np.exp(-energy / temperature)
+
+
+def slow_transmission(energy):
+    time.sleep(DELAY)
+    return energy / 10
+
+
+def slow_responsivity(energy):
+    time.sleep(DELAY)
+    return 0.25
+
+
+threads = []
+
+
+def cheap(energy):
+    threads.append(threading.current_thread())
+    return 1.0
+
+
+@pytest.fixture
+def model():
+    return (
+        LazyFunc(slow_spectrum)
+        * LazyFunc(slow_transmission)
+        * LazyFunc(slow_responsivity)
+        + LazyFunc(cheap)
+    ) / 50
+
+
+def test_leaves_run_concurrently(model):
+    stats = EvaluationStats()
+    with ThreadPoolExecutor(4) as executor:
+        start = time.perf_counter()
+        result = model.evaluate(2.0, executor=executor, stats=stats, temperature=3.0)
+        elapsed = time.perf_counter() - start
+    assert result == model(2.0, temperature=3.0)
+    assert elapsed < 2 * DELAY
+    assert sum(stats.timings.values()) > 3 * DELAY
+    assert set(stats.timings) == {
+        "slow_spectrum",
+        "slow_transmission",
+        "slow_responsivity",
+        "cheap",
+    }
+
+
+def test_cheap_leaves_run_inline(model):
+    threads.clear()
+    with ThreadPoolExecutor(4) as executor:
+        for _ in range(2):
+            model.evaluate(2.0, executor=executor, threshold=DELAY / 2, temperature=1)
+    assert threads[0] is not threading.current_thread()
+    assert threads[1] is threading.current_thread()
+
+
+def test_kwargs_context_in_threads(model):
+    with ThreadPoolExecutor(4) as executor, model.set_kwargs(temperature=3.0):
+        assert model.evaluate(2.0, executor=executor) == model(2.0)
+
+
+def test_process_pool():
+    f = LazyFunc(slow_transmission) + LazyFunc(slow_responsivity)
+    with ProcessPoolExecutor(2) as executor:
+        assert f.evaluate(np.arange(3.0), executor=executor).tolist() == [
+            0.25,
+            0.35,
+            0.45,
+        ]
+
+
+def test_cse_and_executor_exclusive(model):
+    with ThreadPoolExecutor(1) as executor, pytest.raises(ValueError):
+        model.evaluate(1.0, cse=True, executor=executor, temperature=1.0)
@@ -0,0 +1,71 @@
+import json
+import time
+
+import numpy as np
+
+import lazyfunc
+from lazyfunc import LazyFunc
+
+DELAY = 0.05
+
+
+@LazyFunc
+def slow(x):
+    time.sleep(DELAY)
+    return np.full(10, x, dtype=float)
+
+
+@LazyFunc
+def fast(x):
+    return x
+
+
+def test_counts_and_times():
+    f = slow * 2 + fast
+    with lazyfunc.profile() as p:
+        f(1)
+        f(2)
+    nodes = p.nodes
+    assert set(nodes) == {"slow * 2 + fast", "slow * 2", "slow", "fast"}
+    assert all(node.calls == 2 for node in nodes.values())
+    assert nodes["slow"].self >= 2 * DELAY
+    assert nodes["slow * 2"].cumulative >= nodes["slow"].cumulative
+    assert nodes["slow * 2"].self < DELAY
+    assert nodes["slow * 2 + fast"].nbytes == 2 * 80
+    root = p.paths[("slow * 2 + fast",)]
+    assert root.cumulative >= sum(
+        p.paths[("slow * 2 + fast", child)].cumulative for child in ("slow * 2", "fast")
+    )
+
+
+def test_nested_lazyfuncs_are_recorded_under_their_leaf():
+    wrapped = LazyFunc(slow * 2, description="wrapped")
+    f = wrapped + fast
+    with lazyfunc.profile() as p:
+        f(1)
+    assert ("wrapped + fast", "wrapped", "slow * 2", "slow") in p.paths
+    assert p.paths[("wrapped + fast", "wrapped")].self < DELAY
+
+
+def test_exports():
+    f = slow * 2 + fast
+    with lazyfunc.profile() as p:
+        f(1)
+    (root,) = json.loads(p.to_json())
+    assert root["description"] == "slow * 2 + fast"
+    assert [child["description"] for child in root["children"]] == ["fast", "slow * 2"]
+    assert root["children"][1]["children"][0]["calls"] == 1
+    lines = p.collapsed().splitlines()
+    assert len(lines) == 4
+    assert lines[-1].startswith("slow * 2 + fast;slow * 2;slow ")
+    assert int(lines[-1].split()[-1]) >= DELAY * 1e6
+    tree = p.tree().splitlines()
+    assert tree[-1].endswith("    slow")
+
+
+def test_not_recorded_outside_profile():
+    f = fast * 2
+    with lazyfunc.profile() as p:
+        pass
+    f(1)
+    assert p.paths == {}
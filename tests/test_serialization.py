@@ -0,0 +1,130 @@
+import copy
+import math
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from lazyfunc import LazyFunc, serialization
+
+
+def spectrum(energy, *, temperature=300.0):
+    return math.exp(-energy / temperature)
+
+
+def transmission(energy):
+    return 1 - math.exp(-energy / 1e3)
+
+
+@LazyFunc
+def decorated(energy, *, scale=2.0):
+    return scale * energy
+
+
+@pytest.fixture
+def model():
+    s = LazyFunc(spectrum, description="S", temperature=500.0)
+    t = LazyFunc(transmission)
+    return (s * t / 50 + s).set_kwargs(temperature=400.0)
+
+
+def test_pickle_round_trip(model):
+    loaded = pickle.loads(pickle.dumps(model))
+    assert loaded is not model
+    assert loaded.description == model.description == "S * transmission / 50 + S"
+    assert loaded(100.0) == model(100.0)
+    assert loaded(100.0, temperature=200.0) == model(100.0, temperature=200.0)
+    # the shared leaf is still shared
+    assert loaded.operands[0].operands[0].operands[0] is loaded.operands[1]
+
+
+def test_json_round_trip(model):
+    loaded = LazyFunc.from_json(model.to_json(), cache=False)
+    assert loaded.description == model.description
+    assert loaded(100.0) == model(100.0)
+
+
+def test_json_values():
+    f = LazyFunc(transmission)
+    constants = [2, 0.5, 1j, None, "a", (1, 2), [3.0], np.arange(3), np.float32(2)]
+    for constant in constants:
+        graph = (f + constant).to_json()
+        _, loaded = LazyFunc.from_json(graph, cache=False).operands
+        assert type(loaded) is type(constant)
+        assert np.array_equal(loaded, constant)
+    with pytest.raises(TypeError):
+        (f + {1: 2}).to_json()
+
+
+def test_memoized_and_vectorized_nodes():
+    f = LazyFunc(transmission)
+    f.vectorized = True
+    model = (f * 2).memoize(maxsize=3)
+    loaded = pickle.loads(pickle.dumps(model))
+    assert loaded.operands[0].vectorized
+    assert loaded.cache_info().maxsize == 3
+    assert loaded(1.0) == model(1.0)
+
+
+def test_unimportable_leaves():
+    with pytest.raises(ValueError):
+        LazyFunc(lambda x: x).to_json()
+
+    def local(x):
+        return x
+
+    with pytest.raises(ValueError):
+        (LazyFunc(local) * 2).to_json()
+
+
+def test_loaded_graphs_are_cached(model):
+    serialization._models.clear()
+    data, text = pickle.dumps(model), model.to_json()
+    assert pickle.loads(data)(10.0) == pickle.loads(data)(10.0) == model(10.0)
+    assert LazyFunc.from_json(text)(10.0) == LazyFunc.from_json(text)(10.0)
+    assert len(serialization._models) == 2
+    assert LazyFunc.from_json(text, cache=False)(10.0) == model(10.0)
+    assert len(serialization._models) == 2
+
+
+def test_loaded_models_are_independent(model):
+    data = pickle.dumps(model)
+    first, second = pickle.loads(data), pickle.loads(data)
+    assert first is not second
+    first.set_kwargs(temperature=100.0)
+    first.memoize()
+    assert second._shared_kwargs is None
+    assert second(10.0) == model(10.0) != first(10.0)
+    assert second._cache is None
+
+
+def test_deepcopy(model):
+    first, second = copy.deepcopy(model), copy.deepcopy(model)
+    assert first is not second
+    assert first(10.0) == model(10.0)
+
+
+def test_process_pool():
+    # executors pickle in a background thread, which does not see kwargs set in
+    # the context of this one
+    s = LazyFunc(spectrum, description="S", temperature=500.0)
+    model = s * LazyFunc(transmission) / 50 + s
+    energies = [1.0, 10.0, 100.0]
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(model, energies))
+    assert results == [model(energy) for energy in energies]
+
+
+def test_decorated_leaves():
+    # the module attribute is the LazyFunc, not the function it wraps
+    model = decorated * LazyFunc(transmission) + LazyFunc(decorated.func, scale=3.0)
+    expected = model(10.0)
+    loaded = pickle.loads(pickle.dumps(model))
+    assert loaded(10.0) == expected
+    assert loaded.operands[0].operands[0].func is decorated.func
+    loaded = LazyFunc.from_json(model.to_json(), cache=False)
+    assert loaded(10.0) == expected
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        assert list(executor.map(model, [10.0])) == [expected]
+        assert model.evaluate(10.0, executor=executor) == expected
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from lazyfunc import LazyFunc
+
+
+@LazyFunc
+def f(x):
+    return x + 1
+
+
+@LazyFunc
+def g(x, *, scale=1):
+    return scale * x
+
+
+def same(x):
+    return x
+
+
+X = np.linspace(-2, 2, 9)
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    [
+        (f * 1, "f"),
+        (1 * f + 0, "f"),
+        (0 + f - 0, "f"),
+        (f / 1, "f / 1"),
+        (f**1, "f"),
+        (+f, "f"),
+        (-(-f), "f"),
+        (-(-(-f)), "-f"),
+        (2 * (3 * f), "6 * f"),
+        ((f * 2) * 3, "f * 6"),
+        ((f + 2) + 3 + g, "f + 5 + g"),
+        ((f * 0.5) * 2, "f * 1.0"),
+        ((f * 2) * 0.5, "f * 1.0"),
+        ((f + 2) - 2, "f + 2 - 2"),
+        (f + 0.5 + -0.5, "f + 0.0"),
+        ((f + 2) + -2, "f"),
+        (f * 1.0, "f * 1.0"),
+        (f + 0.0, "f + 0.0"),
+        (f**1.0, "f ** 1.0"),
+        (f * True, "f * True"),
+        (f * 1 + g * 1, "f + g"),
+        (f - g, "f - g"),
+        ((f - 2) - 3, "f - 2 - 3"),
+    ],
+)
+def test_simplify(expression, expected):
+    simplified = expression.simplify()
+    assert simplified.description == expected
+    assert np.allclose(simplified(X), expression(X))
+    assert np.array_equal(expression.compile()(X), expression(X))
+
+
+@pytest.mark.parametrize(
+    "expression, argument",
+    [
+        (f / 1, 3),
+        (LazyFunc(same) + 0, True),
+        (1 * LazyFunc(same), True),
+        ((f + 0.1) + 0.2, 1.0),
+        (LazyFunc(same) * 1.0, 3),
+        (LazyFunc(same) + 0.0, 3),
+        (LazyFunc(same) ** 1.0, 3),
+        (LazyFunc(same) + False, True),
+        ((LazyFunc(same) * 2) * 0.5, 3),
+    ],
+)
+def test_compile_is_exact(expression, argument):
+    result, compiled = expression(argument), expression.compile()(argument)
+    assert type(compiled) is type(result)
+    assert compiled == result
+
+
+def test_unchanged_expression_is_returned():
+    expression = f * g + 2
+    assert expression.simplify() is expression
+
+
+def test_original_is_not_modified():
+    inner = 3 * f
+    expression = 2 * inner
+    assert expression.simplify().description == "6 * f"
+    assert expression.operands == (2, inner)
+    assert inner.description == "3 * f"
+
+
+def test_kwargs_are_kept():
+    expression = (g * 1).set_kwargs(scale=3)
+    simplified = expression.simplify()
+    assert simplified(2) == expression(2) == 6
+    expression = (2 * (3 * g)).set_kwargs(scale=3)
+    simplified = expression.simplify()
+    assert simplified.description == "6 * g"
+    assert simplified(2) == expression(2) == 36
+
+
+def test_nodes_with_kwargs_are_not_merged():
+    inner = (3 * g).set_kwargs(scale=2)
+    expression = 2 * inner
+    assert expression.simplify() is expression
+    assert expression(1) == 12
+
+
+def test_memoized_nodes_are_kept():
+    inner = (f * 1).memoize()
+    expression = inner * 1
+    simplified = expression.simplify()
+    assert simplified is inner
+    assert simplified(1) == 2
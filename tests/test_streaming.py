@@ -0,0 +1,104 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from lazyfunc import LazyFunc
+
+
+@LazyFunc
+def spectrum(energy, *, temperature):
+    return np.exp(-energy / temperature)
+
+
+@LazyFunc
+def background(energy, *, slope=0.1):
+    return slope * energy
+
+
+model = 3 * spectrum + background
+
+
+@pytest.fixture
+def energy(tmp_path):
+    energy = np.lib.format.open_memmap(
+        tmp_path / "energy.npy", mode="w+", dtype=float, shape=(10_000,)
+    )
+    energy[:] = np.linspace(0, 100, len(energy))
+    return energy
+
+
+def test_stream_memmap(energy):
+    expected = model(np.asarray(energy), temperature=5)
+    chunks = list(model.stream(energy, chunk_size=3000, temperature=5))
+    assert [len(chunk) for chunk in chunks] == [3000, 3000, 3000, 1000]
+    np.testing.assert_allclose(np.concatenate(chunks), expected)
+
+
+def test_stream_generator(energy):
+    expected = model(np.asarray(energy), temperature=5)
+    source = (energy[i : i + 999] for i in range(0, len(energy), 999))
+    chunks = list(model.stream(source, temperature=5))
+    np.testing.assert_allclose(np.concatenate(chunks), expected)
+
+
+def test_stream_into_memmap(energy, tmp_path):
+    expected = model(np.asarray(energy), temperature=5, slope=2)
+    with model.set_kwargs(temperature=5):
+        out = model.stream(energy, 4096, out=tmp_path / "out.npy", slope=2)
+    assert isinstance(out, np.memmap)
+    np.testing.assert_allclose(out, expected)
+    np.testing.assert_allclose(np.load(tmp_path / "out.npy"), expected)
+
+
+def test_stream_kwargs_resolved_when_called(energy):
+    with model.set_kwargs(temperature=5):
+        chunks = model.stream(energy, 5000)
+    np.testing.assert_allclose(
+        np.concatenate(list(chunks)), model(np.asarray(energy), temperature=5)
+    )
+
+
+def test_stream_out_length_mismatch(energy):
+    with pytest.raises(ValueError):
+        model.stream(energy, 3000, out=np.empty(100), temperature=5)
+    with pytest.raises(ValueError):
+        model.stream(energy, 3000, out=np.empty(20_000), temperature=5)
+
+
+def test_stream_scalar_results(energy, tmp_path):
+    total = LazyFunc(np.sum).of(model)
+    sums = list(total.stream(energy, 3000, temperature=5))
+    assert len(sums) == 4
+    path = tmp_path / "out.npy"
+    with pytest.raises(ValueError, match="scalars"):
+        total.stream(energy, 3000, out=path, temperature=5)
+    assert not path.exists()
+    with pytest.raises(ValueError, match="scalars"):
+        total.stream(energy, 3000, out=np.empty(4), temperature=5)
+
+
+def test_stream_iterable_into_path(energy, tmp_path):
+    path = tmp_path / "out.npy"
+    source = (energy[i : i + 999] for i in range(0, len(energy), 999))
+    with pytest.raises(ValueError, match="array sources"):
+        model.stream(source, out=path, temperature=5)
+    assert len(next(source)) == 999  # checked before consuming the source
+    with pytest.raises(ValueError, match="array sources"):
+        model.stream(list(source), out=path, temperature=5)
+    assert not path.exists()
+
+
+def test_stream_memory_bounded_by_chunk_size(energy, tmp_path):
+    out = np.lib.format.open_memmap(
+        tmp_path / "out.npy", mode="w+", dtype=float, shape=energy.shape
+    )
+    chunk_size = 500
+    tracemalloc.start()
+    try:
+        model.stream(energy, chunk_size, out=out, temperature=5)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 10 * chunk_size * energy.itemsize
+    np.testing.assert_allclose(out, model(np.asarray(energy), temperature=5))